@@ -1,9 +1,15 @@
 import logging
 import signal
 import sys
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+
+from helpers import EmbeddingClient, Metrics
+from services.memory import MemoryWriteQueue, VectorStoreRegistry
+from services.neo4j import Neo4jService
 
 
 signal.signal(signal.SIGINT, sys.exit)  # Ctrl+C
@@ -15,8 +21,21 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Replay unwritten long-term memories on start, release process-wide resources when the server stops."""
+    MemoryWriteQueue.start()
+    yield
+    logger.info("Shutting down shared services...")
+    MemoryWriteQueue.shutdown()
+    VectorStoreRegistry.shutdown()
+    await EmbeddingClient.aclose()
+    await Neo4jService.aclose()
+
+
 # Define the FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,3 +45,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    """Prometheus scrape endpoint: node/tool/LLM/Neo4j/embedding latency, tokens and cache counters."""
+    return PlainTextResponse(Metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/map/changes")
+def map_changes(since: int | None = None, epoch: str | None = None) -> dict:
+    """GeoJSON map features changed since the client's last `version` (all of them when `since` is omitted or the `epoch` changed)."""
+    return Neo4jService.get_map_changes(since_version=since, epoch=epoch)
+
+
+@app.get("/map/features")
+def map_features(south: float, west: float, north: float, east: float) -> dict:
+    """GeoJSON of the located nodes (and their relationships) inside the client's viewport."""
+    nodes, edges = Neo4jService.get_map_features_sync(bbox=(south, west, north, east))
+    return {"nodes": nodes, "edges": edges}
+
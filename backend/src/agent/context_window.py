@@ -0,0 +1,150 @@
+"""
+Token-budgeted context window for the assistant LLM.
+
+The conversation history sent to the model is kept under a per-model token budget.
+When it overflows, the oldest turns are folded into a rolling summary (stored in the
+agent state) until the window is back under a low watermark, so summarization runs
+once every few turns instead of on every call. An AIMessage with tool calls and its
+ToolMessages are always kept or dropped together.
+"""
+
+import json
+import logging
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, SystemMessage, ToolMessage
+
+from agent.prompts import SUMMARY_PROMPT
+from config import Settings
+
+logger = logging.getLogger(__name__)
+
+
+class ContextWindow:
+    """Builds the LLM input within a token budget and maintains the rolling summary."""
+
+    def __init__(
+        self,
+        llm: BaseChatModel,
+        budget: int,
+        low_watermark: float = Settings.CONTEXT_LOW_WATERMARK,
+        summarize: bool = bool(int(Settings.CONTEXT_SUMMARIZE)),
+        chars_per_token: float = Settings.CONTEXT_CHARS_PER_TOKEN,
+    ):
+        self.llm = llm
+        self.budget = budget
+        self.low_watermark = low_watermark
+        self.summarize = summarize
+        self.chars_per_token = chars_per_token
+
+    # --------------------------
+    # TOKENS
+    # --------------------------
+    def estimate_tokens(self, text: str) -> int:
+        return int(len(text) / self.chars_per_token) + 1
+
+    def message_tokens(self, message: AnyMessage) -> int:
+        content = message.content
+        if not isinstance(content, str):
+            content = json.dumps(content, default=str)
+        tokens = self.estimate_tokens(content) + 4  # role and separators
+        if isinstance(message, AIMessage) and message.tool_calls:
+            tokens += self.estimate_tokens(json.dumps(message.tool_calls, default=str))
+        return tokens
+
+    # --------------------------
+    # WINDOW
+    # --------------------------
+    @staticmethod
+    def _units(messages: list[AnyMessage]) -> list[list[AnyMessage]]:
+        """Group messages into units that can be dropped atomically (tool calls stay with their results)."""
+        units: list[list[AnyMessage]] = []
+        for message in messages:
+            if isinstance(message, ToolMessage) and units:
+                units[-1].append(message)
+            else:
+                units.append([message])
+        return units
+
+    @staticmethod
+    def _with_summary(prompt: str, summary: str) -> str:
+        if summary:
+            prompt += f"\n\n## Summary of the earlier conversation\n{summary}\n"
+        return prompt
+
+    def build(self, system_prompt: str, state: dict, dynamic_prompt: str | None = None) -> tuple[list[AnyMessage], dict]:
+        """Return (LLM input, state update) for the current state.
+
+        The summary is appended to `dynamic_prompt` when given (sent as a last system message, so the
+        system prompt and the history stay a stable prefix), otherwise to the system prompt.
+
+        The state update is empty unless older turns were trimmed this call, in which case it holds
+        the new `context_summary` and the number of leading messages now outside the window.
+        """
+        messages = state.get("messages", [])
+        summary = state.get("context_summary", "")
+        trimmed = min(state.get("trimmed_messages", 0), len(messages))
+
+        system_tokens = self.estimate_tokens(system_prompt + (dynamic_prompt or ""))
+        message_tokens = [self.message_tokens(m) for m in messages]
+        full_tokens = system_tokens + sum(message_tokens)  # what the call would cost without windowing
+
+        window = messages[trimmed:]
+        window_tokens = system_tokens + self.estimate_tokens(summary) + sum(message_tokens[trimmed:])
+        update = {}
+
+        if window_tokens > self.budget:
+            target = self.budget * self.low_watermark
+            units = self._units(window)
+            # The current turn (from the latest user message on) is never trimmed
+            keep = max((i for i, unit in enumerate(units) if isinstance(unit[0], HumanMessage)), default=len(units) - 1)
+            dropped: list[AnyMessage] = []
+            # Drop the oldest units until under the low watermark, then until the window starts with a user message
+            while keep > 0 and (window_tokens > target or not isinstance(units[0][0], HumanMessage)):
+                keep -= 1
+                unit = units.pop(0)
+                dropped += unit
+                window_tokens -= sum(self.message_tokens(m) for m in unit)
+
+            if dropped:
+                if self.summarize:
+                    summary = self._summarize(summary, dropped)
+                trimmed += len(dropped)
+                window = [m for unit in units for m in unit]
+                window_tokens = system_tokens + self.estimate_tokens(summary) + sum(message_tokens[trimmed:])
+                update = {"context_summary": summary, "trimmed_messages": trimmed}
+
+        if trimmed:
+            logger.info(
+                f"Context window: {window_tokens} of {full_tokens} estimated tokens "
+                f"({full_tokens - window_tokens} saved, {trimmed} messages outside the window)"
+            )
+        if dynamic_prompt is None:
+            return [SystemMessage(content=self._with_summary(system_prompt, summary))] + window, update
+        return (
+            [SystemMessage(content=system_prompt)] + window + [SystemMessage(content=self._with_summary(dynamic_prompt, summary))],
+            update,
+        )
+
+    def _summarize(self, summary: str, dropped: list[AnyMessage]) -> str:
+        """Fold the dropped messages into the rolling summary. Keeps the old summary on failure."""
+        lines = []
+        for message in dropped:
+            content = message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+            if isinstance(message, AIMessage) and message.tool_calls:
+                content += " " + ", ".join(f"[called {call['name']}({json.dumps(call['args'])})]" for call in message.tool_calls)
+            if content.strip():
+                lines.append(f"{message.type}: {content.strip()}")
+        if not lines:
+            return summary
+
+        prompt = SUMMARY_PROMPT.format(summary=summary or "None", conversation="\n".join(lines))
+        try:
+            response = self.llm.invoke(
+                [SystemMessage(content=prompt)], config={"tags": ["nostream"], "metadata": {"run_name": "summary"}}
+            )
+        except Exception as e:
+            logger.error(f"Context summarization failed, older turns dropped without summary: {e}")
+            return summary
+        content = response.content if isinstance(response.content, str) else json.dumps(response.content, default=str)
+        return content.strip() or summary
@@ -1,23 +1,41 @@
+import functools
 import logging
 import re
-import sqlite3
 import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import copy_context
 
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.messages import (
     AIMessage,
+    HumanMessage,
     SystemMessage,
     ToolMessage,
+    message_chunk_to_message,
 )
 from langchain_ollama import ChatOllama
 from langchain_openai import ChatOpenAI
 from langchain_google_vertexai import ChatVertexAI
 from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.config import get_stream_writer
 from langgraph.graph import START, StateGraph
 from langgraph.prebuilt import ToolNode, tools_condition
 
-from agent.prompts import JUDGE_PROMPT, SYSTEM_PROMPT
+from agent.context_window import ContextWindow
+from agent.prompts import (
+    JUDGE_PROMPT,
+    PARALLEL_TOOL_RULES,
+    SERIAL_TOOL_RULES,
+    SHORT_TERM_MEMORY_PROMPT,
+    SYSTEM_PROMPT,
+    SYSTEM_PROMPT_STATIC,
+)
+from agent.safety_preclassifier import SafetyPreclassifier
 from agent.state import AgentState
+from agent.verdict_cache import VerdictCache
 from agent.tools import (
     get_list_of_tasks,
     add_task,
@@ -25,6 +43,7 @@ from agent.tools import (
     add_symptom,
     get_list_of_symptoms,
     get_social_data,
+    get_people_nearby,
     get_diagnosis,
     get_treatment,
     save_short_term_memory,
@@ -32,6 +51,9 @@ from agent.tools import (
     save_long_term_memory,
 )
 from config.settings import Settings
+from helpers import Metrics, MetricsCallbackHandler
+from helpers.metrics import LOG_METRICS
+from services.memory.sqlite_checkpointer import PooledSqliteSaver
 from services.neo4j import Neo4jService
 
 
@@ -43,6 +65,52 @@ logger.setLevel(logging.DEBUG)
 # LLM
 # --------------------------
 ENABLE_JUDGE = bool(int(Settings.ENABLE_JUDGE))
+JUDGE_SPECULATIVE = bool(int(Settings.JUDGE_SPECULATIVE))
+# A speculative generation is cancelled between streamed tokens. OpenAI and Vertex AI are built with
+# disable_streaming (below), so their .stream() is a single blocking call: only Ollama can be cancelled.
+if JUDGE_SPECULATIVE and Settings.MODEL_SERVER != "OLLAMA":
+    logger.warning(f"JUDGE_SPECULATIVE needs a streaming model server, {Settings.MODEL_SERVER} does not stream: ignored.")
+    JUDGE_SPECULATIVE = False
+JUDGE_STREAMING = bool(int(Settings.JUDGE_STREAMING))
+# No client handles the "approved_chunk" / "retract_chunks" stream events yet, so a streamed answer
+# would never be shown (nor retracted when a later chunk is blocked). Refused until a client does.
+if JUDGE_STREAMING:
+    logger.warning("JUDGE_STREAMING is not supported by any client yet: ignored, the full answer is judged instead.")
+    JUDGE_STREAMING = False
+JUDGE_CHUNK_MIN_CHARS = Settings.JUDGE_CHUNK_MIN_CHARS
+JUDGE_CACHE_ENABLED = bool(int(Settings.JUDGE_CACHE_ENABLED))
+JUDGE_PRECLASSIFIER = bool(int(Settings.JUDGE_PRECLASSIFIER))
+
+# Verdicts of already judged content, shared by every judge call of the process
+verdict_cache = VerdictCache() if JUDGE_CACHE_ENABLED else None
+# Local tier that passes obviously benign content before it reaches the LLM judge
+preclassifier = SafetyPreclassifier() if JUDGE_PRECLASSIFIER else None
+
+BLOCKED_MESSAGE = "⚠️ Content blocked due to safety concerns."
+
+# Workers for the speculative judge + assistant execution
+_SPECULATIVE_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="speculative")
+# Workers judging streamed chunks while the assistant keeps generating
+_JUDGE_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="chunk-judge")
+
+# Sentence or paragraph boundary: the text before it forms a complete chunk
+_CHUNK_BOUNDARY = re.compile(r"(?<=[.!?:;])\s+|\n{2,}")
+
+
+OLLAMA_NUM_CTX = 16000
+
+# Keep the system prompt (and the bound tool schemas) a byte-identical prefix across turns so the
+# server-side prompt cache is reused; the dynamic memory block goes after the history instead.
+# Gemini only accepts a leading system instruction, so Vertex AI keeps the single system prompt.
+PROMPT_STABLE_PREFIX = bool(int(Settings.PROMPT_STABLE_PREFIX)) and Settings.MODEL_SERVER != "VERTEXAI"
+
+# Prompt token budget of the assistant per model server (input only, leaving room for the answer)
+CONTEXT_BUDGETS = {"OLLAMA": OLLAMA_NUM_CTX - 4000, "OPENAI": 100000, "VERTEXAI": 100000}
+CONTEXT_TOKEN_BUDGET = Settings.CONTEXT_TOKEN_BUDGET or CONTEXT_BUDGETS.get(Settings.MODEL_SERVER, 12000)
+
+
+# Latency and token usage of every LLM call (assistant, judge, summary, cypher)
+metrics_callback = MetricsCallbackHandler()
 
 
 if Settings.MODEL_SERVER == "OLLAMA":
@@ -50,12 +118,13 @@ if Settings.MODEL_SERVER == "OLLAMA":
     llm = ChatOllama(
         model=Settings.MODEL_NAME,
         temperature=0,
-        num_ctx=16000,
+        num_ctx=OLLAMA_NUM_CTX,
+        keep_alive=Settings.OLLAMA_KEEP_ALIVE,
         n_seq_max=1,
         extract_reasoning=False,
         reasoning=False,
         verbose=False,
-        callbacks=[],
+        callbacks=[metrics_callback],
     )
 
 if Settings.MODEL_SERVER == "OPENAI":
@@ -64,8 +133,11 @@ if Settings.MODEL_SERVER == "OPENAI":
         model=Settings.MODEL_NAME,
         api_key=Settings.OPENAI_API_KEY,
         temperature=0,
+        callbacks=[metrics_callback],
         streaming=False,
-        stream=False
+        # Streaming mode needs .stream() to yield real token chunks
+        disable_streaming=not JUDGE_STREAMING,
+        **({} if JUDGE_STREAMING else {"stream": False}),
     )
 
 if Settings.MODEL_SERVER == "VERTEXAI":
@@ -76,9 +148,11 @@ if Settings.MODEL_SERVER == "VERTEXAI":
         max_tokens=None,
         max_retries=6,
         stop=None,
-        disable_streaming=True,
+        callbacks=[metrics_callback],
+        # Streaming mode needs .stream() to yield real token chunks
+        disable_streaming=not JUDGE_STREAMING,
         streaming=False,
-        stream=False
+        **({} if JUDGE_STREAMING else {"stream": False}),
     )
 # --------------------------
 # Neo4J LLM Configuration
@@ -98,6 +172,8 @@ tools = [
     get_list_of_symptoms,
     get_diagnosis,
     get_treatment,
+    get_social_data,
+    get_people_nearby,
 ]
 
 memory_tools = [
@@ -108,20 +184,124 @@ memory_tools = [
 
 tools = tools + memory_tools
 
+# Independent tool calls of one message run concurrently (ToolNode runs all the calls of a message at once)
+PARALLEL_TOOL_CALLS = bool(int(Settings.PARALLEL_TOOL_CALLS))
+if PARALLEL_TOOL_CALLS:
+    SYSTEM_PROMPT_STATIC = SYSTEM_PROMPT_STATIC.replace(SERIAL_TOOL_RULES, PARALLEL_TOOL_RULES)
+    SYSTEM_PROMPT = SYSTEM_PROMPT.replace(SERIAL_TOOL_RULES, PARALLEL_TOOL_RULES)
+
+# Time every tool call
+for _tool in tools:
+    if _tool.func is not None:
+        _tool.func = Metrics.timed("tool", _tool.name)(_tool.func)
+    if _tool.coroutine is not None:
+        _tool.coroutine = Metrics.timed("tool", _tool.name)(_tool.coroutine)
+
 # --------------------------
 # MEMORY
 # --------------------------
 def create_memory_checkpointer(memory_db_path: str | None = None) -> SqliteSaver | None:
-    """Create memory checkpointer."""
-    if memory_db_path is None:
+    """Create memory checkpointer (WAL, single writer + reader pool, periodic pruning)."""
+    if not memory_db_path:
         return
-    conn = sqlite3.connect(database=memory_db_path, check_same_thread=False)
-    return SqliteSaver(conn)
+    return PooledSqliteSaver(db_path=memory_db_path)
 
 
 checkpointer = create_memory_checkpointer(
-    memory_db_path=None
-)  # TODO: Pending to implement to an specific file
+    memory_db_path=Settings.CHECKPOINT_DB_PATH
+)  # Empty CHECKPOINT_DB_PATH disables checkpointing
+
+
+def _content_text(content) -> str:
+    """Text of a message content, which may be a string or a list of text blocks."""
+    if isinstance(content, str):
+        return content
+    text = ""
+    for item in content or []:
+        if isinstance(item, dict):
+            if item.get("type") == "text":
+                text += item.get("text", "")
+        elif isinstance(item, str):
+            text += item
+    return text
+
+
+# Ollama prompt evaluation totals (tokens not served from the prompt cache, and their time)
+_prompt_eval_stats = {"calls": 0, "prompt_eval_count": 0, "prompt_eval_ms": 0.0, "estimated_prompt_tokens": 0}
+
+
+def record_prompt_eval(ai_message, estimated_prompt_tokens: int) -> None:
+    """Log Ollama's prompt_eval_count/prompt_eval_duration for a response.
+
+    Ollama only evaluates the prompt tokens that are not already in its cache, so a
+    prompt_eval_count well below the prompt size means the prefix was reused.
+    """
+    metadata = getattr(ai_message, "response_metadata", None) or {}
+    if "prompt_eval_count" not in metadata:
+        return
+    count = metadata.get("prompt_eval_count") or 0
+    duration_ms = (metadata.get("prompt_eval_duration") or 0) / 1e6
+    _prompt_eval_stats["calls"] += 1
+    _prompt_eval_stats["prompt_eval_count"] += count
+    _prompt_eval_stats["prompt_eval_ms"] += duration_ms
+    _prompt_eval_stats["estimated_prompt_tokens"] += estimated_prompt_tokens
+    logger.info(
+        f"Ollama prompt eval: {count} tokens evaluated in {duration_ms:.0f} ms "
+        f"(~{estimated_prompt_tokens} prompt tokens, ~{max(estimated_prompt_tokens - count, 0)} reused from cache)"
+    )
+
+
+def get_prompt_eval_stats() -> dict:
+    """Accumulated Ollama prompt evaluation counters of the assistant calls."""
+    return dict(_prompt_eval_stats)
+
+
+def instrumented(name: str, node):
+    """Time a graph node and copy the metrics recorded during the turn into the state."""
+    @functools.wraps(node)
+    def wrapper(state: AgentState):
+        started = time.perf_counter()
+        update = node(state)
+        if not LOG_METRICS:
+            return update
+        Metrics.observe("node", name, time.perf_counter() - started)
+        return {**(update or {}), **_turn_metrics_update(state, Metrics.drain())}
+
+    return wrapper
+
+
+def _turn_metrics_update(state: AgentState, records: list[dict]) -> dict:
+    """State update adding the records to the current turn (which starts at the latest user message)."""
+    turn = next((m.id for m in reversed(state.get("messages", [])) if isinstance(m, HumanMessage)), None)
+    turn_metrics = state.get("turn_metrics") or {}
+    if turn_metrics.get("turn") != turn:
+        turn_metrics = {"turn": turn, "records": [], "input_tokens": 0, "output_tokens": 0, "cache_hits": 0}
+
+    input_tokens = sum(r.get("input_tokens", 0) for r in records)
+    output_tokens = sum(r.get("output_tokens", 0) for r in records)
+    turn_metrics = {
+        **turn_metrics,
+        "records": turn_metrics["records"] + records,
+        "input_tokens": turn_metrics["input_tokens"] + input_tokens,
+        "output_tokens": turn_metrics["output_tokens"] + output_tokens,
+        "cache_hits": turn_metrics["cache_hits"] + sum(r.get("hits", 0) for r in records),
+    }
+    return {"turn_metrics": turn_metrics, "token_usage": {"input_tokens": input_tokens, "output_tokens": output_tokens}}
+
+
+def get_judge_cache_stats() -> dict:
+    """Hit/miss counters of the judge verdict cache, including the judge calls it avoided."""
+    return verdict_cache.get_stats() if verdict_cache is not None else {}
+
+
+def get_preclassifier_stats() -> dict:
+    """Local pass / escalation counters of the pre-classifier, and its shadow agreement rate."""
+    return preclassifier.get_stats() if preclassifier is not None else {}
+
+
+Metrics.register_collector("judge_cache", get_judge_cache_stats)
+Metrics.register_collector("judge_preclassifier", get_preclassifier_stats)
+Metrics.register_collector("ollama_prompt_eval", get_prompt_eval_stats)
 
 
 # --------------------------
@@ -140,6 +320,9 @@ class Agent:
         # Bind the LLM with tools
         self.llm_with_tools = llm.bind_tools(tools)
 
+        # Keeps the history sent to the LLM within the token budget
+        self.context_window = ContextWindow(llm, budget=CONTEXT_TOKEN_BUDGET)
+
     # --------------------------
     # BUILD & COMPILE GRAPH
     # --------------------------
@@ -148,23 +331,33 @@ class Agent:
         builder = StateGraph(AgentState)
 
         if ENABLE_JUDGE:
-            builder.add_node("LLM_assistant", self.LLM_node)
-            builder.add_node("judge", self.judge_node)
-            builder.add_node("judge_final", self.judge_node)
+            builder.add_node("LLM_assistant", instrumented("LLM_assistant", self.LLM_node))
+            builder.add_node("judge_final", instrumented("judge_final", self.judge_node))
             builder.add_node("tools", ToolNode(tools, handle_tool_errors=False))
 
-            builder.add_edge(START, "judge")
-            # First judge: Check if the user request is safe to be processed by the LLM
-            builder.add_conditional_edges(
-                "judge",
-                self.judge_condition,
-                path_map={"blocked": "__end__", "safe": "LLM_assistant"},
-            )
+            if JUDGE_SPECULATIVE:
+                # First judge and first LLM call run concurrently; the LLM result is discarded if the judge blocks
+                builder.add_node("judge", instrumented("judge", self.speculative_judge_node))
+                builder.add_edge(START, "judge")
+                builder.add_conditional_edges(
+                    "judge",
+                    self.speculative_condition,
+                    path_map={"blocked": "__end__", "tools": "tools", "judge": "judge_final", "end": "__end__"},
+                )
+            else:
+                builder.add_node("judge", instrumented("judge", self.judge_node))
+                builder.add_edge(START, "judge")
+                # First judge: Check if the user request is safe to be processed by the LLM
+                builder.add_conditional_edges(
+                    "judge",
+                    self.judge_condition,
+                    path_map={"blocked": "__end__", "safe": "LLM_assistant"},
+                )
             # Conditional edge to decide if the LLM needs tools or the response can be sent directly to the final judge
             builder.add_conditional_edges(
                 "LLM_assistant",
                 self.llm_condition,
-                path_map={"tools": "tools", "judge": "judge_final"},
+                path_map={"tools": "tools", "judge": "judge_final", "end": "__end__"},
             )
             # Final judge: Check if the LLM response is safe to be sent to the user
             builder.add_conditional_edges(
@@ -176,7 +369,7 @@ class Agent:
             builder.add_edge("tools", "LLM_assistant")
 
         else:
-            builder.add_node("LLM_assistant", self.LLM_node)
+            builder.add_node("LLM_assistant", instrumented("LLM_assistant", self.LLM_node))
             builder.add_node("tools", ToolNode(tools, handle_tool_errors=False))
 
             builder.add_edge(START, "LLM_assistant")
@@ -220,32 +413,98 @@ class Agent:
             if hasattr(last_message, "tool_calls") and last_message.tool_calls:
                 return "tools"
 
+            # Streamed responses are judged chunk by chunk and need no final judge
+            if isinstance(last_message, AIMessage) and last_message.response_metadata.get("safety_judged"):
+                return "end"
+
         # Default to judge for safety evaluation
         return "judge"
 
+    def speculative_condition(self, state: AgentState):
+        """Route after the speculative judge: stop if blocked, otherwise route like after the LLM."""
+        if self.judge_condition(state) == "blocked":
+            return "blocked"
+        return self.llm_condition(state)
+
     # --------------------------
     # NODES
     # --------------------------
 
+    # Speculative Judge Node
+    def speculative_judge_node(self, state: AgentState):
+        """Run the input judge and the LLM assistant concurrently.
+
+        The LLM result is only released when the judge approves the user input, so the
+        blocking semantics are the same as running judge -> LLM_assistant sequentially,
+        minus one serial LLM round trip.
+        """
+        # Each task gets its own copy of the context so callbacks/tracing keep working in the worker threads
+        cancel = threading.Event()
+        judge_future = _SPECULATIVE_POOL.submit(copy_context().run, self.judge_node, state)
+        llm_future = _SPECULATIVE_POOL.submit(copy_context().run, self._assistant_step, state, judge_future, cancel)
+
+        judge_update = judge_future.result()
+        if judge_update:
+            # Input blocked: stop the speculative generation at its next chunk (or before it starts)
+            cancel.set()
+            llm_future.cancel()
+            logger.info("Speculative LLM response discarded: input blocked by judge.")
+            return judge_update
+
+        return llm_future.result()
+
+
     # LLM Assistant Node
     def LLM_node(self, state: AgentState):
         """LLM Assistant Node that handles the LLM interactions."""
-        # TODO: wait for long-term memory implementation to filter messages
-        # messages_list = self.filtermessages(None, state["messages"])
-        messages_list = state["messages"]
+        return self._assistant_step(state)
+
+    def _assistant_step(self, state: AgentState, release_gate: Future | None = None, cancel: threading.Event | None = None):
+        """Run the assistant LLM on the current state.
 
-        # Build LLM input with the system prompt and the last messages
+        Args:
+            state: Current agent state
+            release_gate: Future of the input judge when running speculatively. Streamed chunks are
+                only released once it resolved to an empty (safe) update.
+            cancel: Set when the speculative result is discarded. The LLM is then streamed and
+                generation stops at the next chunk.
+        """
+        # Build LLM input with the system prompt and the messages that fit in the token budget
+        # (older turns are folded into the rolling summary)
         short_term_memories = state.get("short_term_memories", []) # short_term_memories is a list of dicts
-        llm_input = [
-            SystemMessage(content=SYSTEM_PROMPT.format(short_term_memories_str=str("Empty" if not short_term_memories else "\n" + "\n".join(f"- {json.dumps(mem)}" for mem in short_term_memories)))),
-        ] + messages_list
+        short_term_memories_str = str("Empty" if not short_term_memories else "\n" + "\n".join(f"- {json.dumps(mem)}" for mem in short_term_memories))
+        if PROMPT_STABLE_PREFIX:
+            llm_input, context_update = self.context_window.build(
+                SYSTEM_PROMPT_STATIC, state,
+                dynamic_prompt=SHORT_TERM_MEMORY_PROMPT.format(short_term_memories_str=short_term_memories_str),
+            )
+        else:
+            system_prompt = SYSTEM_PROMPT.format(short_term_memories_str=short_term_memories_str)
+            llm_input, context_update = self.context_window.build(system_prompt, state)
+
+        return {**self._invoke_assistant(llm_input, release_gate, cancel), **context_update}
+
+    def _invoke_assistant(self, llm_input: list, release_gate: Future | None = None, cancel: threading.Event | None = None):
+        """Invoke the assistant LLM and route its response (pending judge, tool calls or final)."""
+        estimated_prompt_tokens = sum(self.context_window.message_tokens(m) for m in llm_input)
+
+        if ENABLE_JUDGE and JUDGE_STREAMING:
+            # Stream the response and judge it chunk by chunk, releasing approved chunks immediately
+            return self._stream_with_chunk_judging(llm_input, release_gate=release_gate, cancel=cancel, estimated_prompt_tokens=estimated_prompt_tokens)
 
         if ENABLE_JUDGE:
             # Invoke the LLM with tools in background thread so that the response is not printed until the judge approves it
-            ai_message = self.llm_with_tools.invoke(
-                llm_input,
-                config={"tags": ["nostream"], "metadata": {"run_name": "main"}},
-            )
+            if cancel is not None:
+                ai_message = self._invoke_cancellable(llm_input, cancel)
+                if ai_message is None:
+                    # The speculative caller discards this result
+                    return {}
+            else:
+                ai_message = self.llm_with_tools.invoke(
+                    llm_input,
+                    config={"tags": ["nostream"], "metadata": {"run_name": "main"}},
+                )
+            record_prompt_eval(ai_message, estimated_prompt_tokens)
 
             # Check if the response has text content (to be checked by judge)
             has_content = False
@@ -282,8 +541,115 @@ class Agent:
             ai_message = self.llm_with_tools.invoke(
                 llm_input, config={"metadata": {"run_name": "main"}}
             )
+            record_prompt_eval(ai_message, estimated_prompt_tokens)
             return {"messages": [ai_message]}
 
+    def _invoke_cancellable(self, llm_input: list, cancel: threading.Event) -> AIMessage | None:
+        """Like llm_with_tools.invoke, but streamed so generation stops once `cancel` is set (returns None then)."""
+        full_message = None
+        for chunk in self.llm_with_tools.stream(
+            llm_input,
+            config={"tags": ["nostream"], "metadata": {"run_name": "main"}},
+        ):
+            if cancel.is_set():
+                # Leaving the stream closes the request, which stops the generation server side
+                logger.info("Speculative LLM generation cancelled.")
+                return None
+            full_message = chunk if full_message is None else full_message + chunk
+        return message_chunk_to_message(full_message) if full_message is not None else AIMessage(content="")
+
+    def _stream_with_chunk_judging(self, llm_input: list, release_gate: Future | None = None, cancel: threading.Event | None = None, estimated_prompt_tokens: int = 0):
+        """Stream the assistant response and judge it in sentence/paragraph chunks.
+
+        Every completed chunk is sent to the judge while generation continues. Approved chunks
+        are released in order to the client through the custom stream ("approved_chunk" events).
+        If any chunk is unsafe, generation stops, a "retract_chunks" event tells the client to
+        drop the chunks it already received, and the response is replaced with the blocked
+        message, as judge_final would do. The returned message is marked as already judged so
+        judge_final does not evaluate it again.
+        """
+        try:
+            writer = get_stream_writer()
+        except Exception:
+            # Outside of a graph run (e.g. direct calls): nothing to release to
+            def writer(_):
+                return None
+
+        full_message = None
+        buffer = ""
+        pending = deque()  # (chunk text, verdict future), in generation order
+        released = []
+        blocked = False
+        gate_blocked = False
+
+        def release_ready(wait: bool = False) -> None:
+            """Release judged chunks in order, stopping at the first one still being judged."""
+            nonlocal blocked, gate_blocked
+            # Speculative run: nothing leaves before the input judge approved the user message
+            if release_gate is not None:
+                if not (wait or release_gate.done()):
+                    return
+                if release_gate.result():
+                    gate_blocked = True
+                    return
+            while pending and (wait or pending[0][1].done()):
+                text, verdict = pending.popleft()
+                if not verdict.result():
+                    blocked = True
+                    pending.clear()
+                    return
+                released.append(text)
+                writer({"type": "approved_chunk", "index": len(released) - 1, "content": text})
+
+        def submit(text: str) -> None:
+            if text.strip():
+                pending.append((text, _JUDGE_POOL.submit(copy_context().run, self._evaluate_content_safety, text)))
+
+        started_at = time.perf_counter()
+        for chunk in self.llm_with_tools.stream(
+            llm_input,
+            config={"tags": ["nostream"], "metadata": {"run_name": "main"}},
+        ):
+            if cancel is not None and cancel.is_set():
+                gate_blocked = True
+                break
+            if full_message is None:
+                logger.info(f"Assistant time to first token: {(time.perf_counter() - started_at) * 1000:.0f} ms")
+            full_message = chunk if full_message is None else full_message + chunk
+            buffer += _content_text(chunk.content)
+
+            # Cut the buffer into complete chunks of at least JUDGE_CHUNK_MIN_CHARS
+            while True:
+                boundary = next((m for m in _CHUNK_BOUNDARY.finditer(buffer) if m.start() >= JUDGE_CHUNK_MIN_CHARS), None)
+                if boundary is None:
+                    break
+                submit(buffer[: boundary.end()])
+                buffer = buffer[boundary.end():]
+
+            release_ready()
+            if blocked or gate_blocked:
+                break
+
+        if not (blocked or gate_blocked):
+            submit(buffer)
+            release_ready(wait=True)
+
+        if gate_blocked:
+            # The speculative caller discards this result
+            return {}
+
+        if blocked:
+            if released:
+                writer({"type": "retract_chunks", "count": len(released)})
+            writer({"type": "blocked", "content": BLOCKED_MESSAGE})
+            return {"messages": [AIMessage(content=BLOCKED_MESSAGE, response_metadata={"safety_judged": True})]}
+
+        ai_message = message_chunk_to_message(full_message) if full_message is not None else AIMessage(content="")
+        record_prompt_eval(ai_message, estimated_prompt_tokens)
+        # Already judged chunk by chunk (tool calls carry no text to judge)
+        ai_message.response_metadata["safety_judged"] = True
+        return {"messages": [ai_message]}
+
     def _evaluate_content_safety(self, message) -> bool:
         """Evaluate if a message's content is safe using the judge LLM.
 
@@ -314,6 +680,20 @@ class Agent:
             if not evaluation_text or not evaluation_text.strip():
                 return True
 
+            # Reuse the verdict if this content was already judged (before the pre-classifier: a hit costs less)
+            embedding = None
+            if verdict_cache is not None:
+                cached_verdict, embedding = verdict_cache.lookup(evaluation_text)
+                if cached_verdict is not None:
+                    logger.info(f"LLM JUDGE (cached): {'SAFE' if cached_verdict else 'UNSAFE'}. Message: {evaluation_text}")
+                    return cached_verdict
+
+            # Local tier: obviously benign content does not need the LLM judge
+            local_verdict = preclassifier.classify(evaluation_text) if preclassifier is not None else None
+            if local_verdict is not None and not preclassifier.shadow:
+                logger.info(f"LOCAL JUDGE: SAFE. Message: {evaluation_text}")
+                return local_verdict
+
             # Create evaluation message. The message is the judge prompt with the content of the message to be evaluated.
             # The message type is either "user" or "assistant".
 
@@ -343,17 +723,23 @@ class Agent:
             safe_match = re.search(r"\bSAFE\b", evaluation_response, re.IGNORECASE)
             unsafe_match = re.search(r"\bUNSAFE\b", evaluation_response, re.IGNORECASE)
 
-            # If UNSAFE is found, return False
+            # If UNSAFE is found, the content is not safe
             if unsafe_match:
-                return False
-            # If SAFE is found, return True
+                is_safe = False
+            # If SAFE is found, the content is safe
             elif safe_match:
-                return True
+                is_safe = True
             # If neither is found clearly, default to SAFE (allow content through)
             else:
                 logger.warning(f"[WARNING] Could not parse safety evaluation. Defaulting to SAFE. Response: {evaluation_response}")
                 return True
 
+            if verdict_cache is not None:
+                verdict_cache.store(evaluation_text, is_safe, embedding)
+            if preclassifier is not None:
+                preclassifier.record_shadow(local_verdict, is_safe)
+            return is_safe
+
         except Exception as e:
             # Log error and fail safe (allow content through)
             logger.error(f"[ERROR] Content safety evaluation failed: {e}")
@@ -362,7 +748,7 @@ class Agent:
     # Judge Node
     def judge_node(self, state: AgentState):
         """Judge Node - Evaluates message content for safety."""
-        blocked_message = "⚠️ Content blocked due to safety concerns."
+        blocked_message = BLOCKED_MESSAGE
 
         # CASE 1: Check if we have a pending response to evaluate.
         # A message in pending_response is a response from the LLM that needs to be evaluated by the judge.
@@ -0,0 +1,113 @@
+"""
+Local pre-classifier in front of the LLM safety judge.
+
+Content is passed as SAFE locally only when the embedding classifier finds it clearly
+closer to the benign exemplars than to the unsafe ones, and it mentions none of the
+escalation keywords. Keywords can only escalate: a keyword miss alone proves nothing
+(paraphrases, tickers, misspellings), so without embeddings everything goes to the LLM judge.
+
+In shadow mode (the default) the local verdict is only recorded: the LLM judge still decides,
+and the agreement rate between both is logged so the margin can be tuned before going live.
+"""
+
+import logging
+import re
+import threading
+from typing import Optional
+
+import numpy as np
+
+from config import Settings
+from helpers import helper_ollama
+
+logger = logging.getLogger(__name__)
+
+# Exemplars for the embedding classifier, matching the policy in JUDGE_PROMPT
+UNSAFE_EXEMPLARS = [
+    "What do you think about Apple Company?",
+    "Tell me about the latest iPhone released by Apple.",
+    "Should I buy Apple stock?",
+    "Tim Cook announced new products in Cupertino.",
+    "My MacBook from Apple stopped working.",
+]
+SAFE_EXEMPLARS = [
+    "Hello, how are you today?",
+    "Can you add a task to take my medication at 9am?",
+    "I have had a headache and some dizziness since yesterday.",
+    "Who are my friends that live near me?",
+    "An apple a day keeps the doctor away, so I eat fruit every morning.",
+]
+
+
+class SafetyPreclassifier:
+    """Nearest-centroid classifier over embeddings, with a keyword matcher that forces escalation."""
+
+    def __init__(
+        self,
+        keywords: str = Settings.JUDGE_ESCALATE_KEYWORDS,
+        use_embeddings: bool = bool(int(Settings.JUDGE_PRECLASSIFIER_EMBEDDINGS)),
+        margin: float = Settings.JUDGE_PRECLASSIFIER_MARGIN,
+        shadow: bool = bool(int(Settings.JUDGE_PRECLASSIFIER_SHADOW)),
+    ):
+        terms = [re.escape(k.strip()) for k in keywords.split(",") if k.strip()]
+        self._keywords = re.compile(r"\b(" + "|".join(terms) + r")\b", re.IGNORECASE) if terms else None
+        self.use_embeddings = use_embeddings
+        self.margin = margin
+        self.shadow = shadow
+        self._centroids: Optional[tuple[np.ndarray, np.ndarray]] = None
+        self._lock = threading.Lock()
+        self.stats = {"local_safe": 0, "escalated": 0, "shadow_agree": 0, "shadow_disagree": 0}
+
+    @staticmethod
+    def _centroid(texts: list[str]) -> np.ndarray:
+        vecs = np.asarray(helper_ollama.create_embeddings(input_texts=texts), dtype="float32")
+        vecs /= np.linalg.norm(vecs, axis=1, keepdims=True).clip(min=1e-12)
+        centroid = vecs.mean(axis=0)
+        return centroid / (np.linalg.norm(centroid) or 1.0)
+
+    def _embedding_margin(self, text: str) -> Optional[float]:
+        """How much closer the text is to the benign centroid than to the unsafe one (None if unavailable)."""
+        try:
+            if self._centroids is None:
+                self._centroids = (self._centroid(UNSAFE_EXEMPLARS), self._centroid(SAFE_EXEMPLARS))
+            unsafe, safe = self._centroids
+            vec = np.asarray(helper_ollama.create_embedding(input_text=text), dtype="float32")
+            vec /= np.linalg.norm(vec) or 1.0
+        except Exception as e:
+            logger.warning(f"Pre-classifier embeddings unavailable, escalating: {e}")
+            return None
+        return float(vec @ safe - vec @ unsafe)
+
+    def classify(self, text: str) -> Optional[bool]:
+        """Return True when the content is confidently benign, None when it must go to the LLM judge."""
+        verdict: Optional[bool] = None
+        if self.use_embeddings and not (self._keywords is not None and self._keywords.search(text)):
+            margin = self._embedding_margin(text)
+            if margin is not None and margin >= self.margin:
+                verdict = True
+
+        with self._lock:
+            self.stats["local_safe" if verdict else "escalated"] += 1
+        return verdict
+
+    def record_shadow(self, local_verdict: Optional[bool], llm_verdict: bool) -> None:
+        """Compare a local SAFE decision with the LLM verdict for the same content (shadow mode)."""
+        if not self.shadow or local_verdict is None:
+            return
+        with self._lock:
+            self.stats["shadow_agree" if local_verdict == llm_verdict else "shadow_disagree"] += 1
+            compared = self.stats["shadow_agree"] + self.stats["shadow_disagree"]
+            rate = self.stats["shadow_agree"] / compared
+        level = logging.INFO if local_verdict == llm_verdict else logging.WARNING
+        logger.log(level, f"Pre-classifier shadow: local=SAFE llm={'SAFE' if llm_verdict else 'UNSAFE'} "
+                          f"(agreement {rate:.1%} over {compared})")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            compared = self.stats["shadow_agree"] + self.stats["shadow_disagree"]
+            total = self.stats["local_safe"] + self.stats["escalated"]
+            return {
+                **self.stats,
+                "local_pass_rate": self.stats["local_safe"] / total if total else 0.0,
+                "shadow_agreement_rate": self.stats["shadow_agree"] / compared if compared else None,
+            }
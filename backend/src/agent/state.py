@@ -27,6 +27,15 @@ def add_memories(left, right):
         right = []
     return left + right
 
+def add_token_usage(left, right):
+    """Sum token usage."""
+    left = left or {}
+    right = right or {}
+    return {
+        "input_tokens": left.get("input_tokens", 0) + right.get("input_tokens", 0),
+        "output_tokens": left.get("output_tokens", 0) + right.get("output_tokens", 0),
+    }
+
 
 
 # --------------------------
@@ -47,3 +56,7 @@ class AgentState(TypedDict, total=False):
     pending_response: AnyMessage  # Buffer for LLM response before safety verification
     short_term_memories: Annotated[list[dict], add_memories]
     long_term_memories: Annotated[list[dict], add_memories]
+    context_summary: str  # Rolling summary of the turns outside the context window
+    trimmed_messages: int  # Number of leading messages outside the context window
+    token_usage: Annotated[TokenUsage, add_token_usage]  # LLM tokens of the whole conversation
+    turn_metrics: dict  # Timings, tokens and cache hits of the current turn
@@ -4,6 +4,7 @@ from .check_current_time import check_current_time
 from .add_symptom import add_symptom
 from .get_list_of_symptoms import get_list_of_symptoms
 from .get_social_data import get_social_data
+from .get_people_nearby import get_people_nearby
 from .get_diagnosis import get_diagnosis
 from .get_treatment import get_treatment
 from .save_short_term_memory import save_short_term_memory
@@ -17,8 +18,9 @@ __all__ = [
     "add_task",
     "check_current_time",
     "add_symptom",
-    "get_list_of_symptoms"
+    "get_list_of_symptoms",
     "get_social_data",
+    "get_people_nearby",
     "get_diagnosis",
     "get_treatment",
     
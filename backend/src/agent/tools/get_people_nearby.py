@@ -0,0 +1,45 @@
+import json
+import logging
+from typing import Annotated
+
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import InjectedToolCallId, tool
+from langgraph.types import Command
+
+from services.neo4j import Neo4jService
+
+logger = logging.getLogger(__name__)
+
+@tool
+def get_people_nearby(
+    name: str,
+    tool_call_id: Annotated[str, InjectedToolCallId],
+    radius_m: float = 1000,
+) -> Command:
+    """
+    Find the people located near a person of the social graph, closest first.
+
+    input: name of the person, radius in meters (default 1000)
+    output: people within the radius with their distance in meters.
+    """
+    try:
+        person = Neo4jService.locate("Person", name)
+        if person is None:
+            content = f"No located person named {name!r} was found."
+        else:
+            # One more than the limit: the person is the closest result to itself
+            people = [
+                {"name": p["name"], "distance_m": round(p["distance_m"])}
+                for p in Neo4jService.nearby("Person", person["lat"], person["lon"], radius_m, limit=11)
+                if p["id"] != person["id"]
+            ][:10]
+            content = json.dumps({"person": person["name"], "radius_m": radius_m, "nearby": people})
+    except Exception as e:
+        content = f"There was an error in get_people_nearby tool: {e}"
+
+    tool_message = ToolMessage(content, tool_call_id=tool_call_id)
+    logger.info("Tool: get_people_nearby.")
+    return Command(update={
+        "messages": [tool_message],
+        "tools_used": ["get_people_nearby"]
+    }, goto="LLM_assistant")
@@ -2,15 +2,14 @@ import logging
 import json
 from typing import Annotated
 from langchain_core.messages import ToolMessage
-from langchain_core.tools import InjectedToolCallId, tool
+from langchain_core.tools import InjectedToolCallId, StructuredTool
 from langgraph.types import Command
 from termcolor import colored
 from services.neo4j import Neo4jService
 
 logger = logging.getLogger(__name__)
 
-@tool
-def get_social_data(
+def _get_social_data(
     question: str, tool_call_id: Annotated[str, InjectedToolCallId]
 ) -> Command:
     """Obtain current social data by querying a knowledge graph database.
@@ -21,15 +20,35 @@ def get_social_data(
     try:
         print(colored("Executing cypher query synchronously...", "blue"))
 
-        # Use direct execution to completely bypass any streaming mechanisms
-        response = json.dumps(Neo4jService.get_cypher_chain().invoke(question))
+        # Use direct execution to completely bypass any streaming mechanisms.
+        # Similar questions reuse the cached Cypher instead of generating it again.
+        response = json.dumps(Neo4jService.query_social_data(question))
 
         print(colored(f"CypherChain response completed: {response[:100]}...", "green"))
 
     except Exception as e:
         print(colored(f"Error in cypher execution: {e}", "red"))
-        response = f"There was an error in get_battlefield_data tool: {e}"
+        response = f"There was an error in get_social_data tool: {e}"
 
+    return _social_data_command(response, tool_call_id)
+
+
+async def _aget_social_data(
+    question: str, tool_call_id: Annotated[str, InjectedToolCallId]
+) -> Command:
+    """Async variant: embedding, Cypher generation and Neo4j query are awaited."""
+    try:
+        response = json.dumps(await Neo4jService.aquery_social_data(question))
+        print(colored(f"CypherChain response completed: {response[:100]}...", "green"))
+
+    except Exception as e:
+        print(colored(f"Error in cypher execution: {e}", "red"))
+        response = f"There was an error in get_social_data tool: {e}"
+
+    return _social_data_command(response, tool_call_id)
+
+
+def _social_data_command(response: str, tool_call_id: str) -> Command:
     # Return the COMPLETE result as a tool message
     tool_message = ToolMessage(response, tool_call_id=tool_call_id)
 
@@ -40,3 +59,8 @@ def get_social_data(
     
     logger.info("Tool: get_social_data")
     return Command(update=update, goto="LLM_assistant")
+
+
+get_social_data = StructuredTool.from_function(
+    func=_get_social_data, coroutine=_aget_social_data, name="get_social_data"
+)
@@ -1,19 +1,21 @@
 
+import asyncio
 import logging
 from typing import Annotated
 
 from langchain_core.messages import ToolMessage
-from langchain_core.tools import InjectedToolCallId, tool
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import InjectedToolCallId, StructuredTool
 from langgraph.types import Command
 
-from services.memory.chromadb_store import ChromaVectorMemoryStore
+from services.memory import MemoryWriteQueue, VectorStoreRegistry
 
 logger = logging.getLogger(__name__)
 
-@tool
-def retrieve_long_term_memory(
+def _retrieve_long_term_memory(
     query: str,
-    tool_call_id: Annotated[str, InjectedToolCallId]
+    tool_call_id: Annotated[str, InjectedToolCallId],
+    config: RunnableConfig
 ) -> Command:
     """
     Retrieve memories from Long Term Memory Vector Database based on a query
@@ -32,8 +34,12 @@ def retrieve_long_term_memory(
     """
     try:
         logger.info("Tool: retrieve_long_term_memory.")
+        # Read-your-writes: memories this thread saved in the background are committed first
+        thread_id = _thread_id(config)
+        committed = MemoryWriteQueue.wait_for(thread_id, collection_name="agent_memories")
+
         # Perform actual vector store retrieval
-        vector_store = ChromaVectorMemoryStore(collection_name="agent_memories", reset_on_init=False)
+        vector_store = VectorStoreRegistry.get_store(collection_name="agent_memories")
         
         results = vector_store.retrieve(
             query=query,
@@ -42,35 +48,89 @@ def retrieve_long_term_memory(
             alpha_similarity=1.0,
             num_results=5
         )
-        
-        formatted_results = []
-        if results:
-            content = f"Retrieved {len(results)} memories for query: {query}\n\n"
-            for i, memory_content in enumerate(results, 1):
-                # memory_content is a string, not a dict
-                content += f"{i}. {memory_content}\n"
-                # Format as dict for state storage
-                formatted_results.append({
-                    "content": memory_content,
-                    "metadata": {}
-                })
-        else:
-            content = f"No memories found for query: {query}"
-        
-        tool_message = ToolMessage(content, tool_call_id=tool_call_id)
-        
-        return Command(update={
-            "messages": [tool_message],
-            "long_term_memories": formatted_results,
-            "tools_used": ["retrieve_long_term_memory"]
-        })
+        if not committed:
+            results = _with_pending(results, thread_id)
+        return _retrieved_memories_command(query, results, tool_call_id)
         
     except Exception as e:
-        content = f"Error retrieving memories: {str(e)}"
-        tool_message = ToolMessage(content, tool_call_id=tool_call_id)
-        
-        return Command(update={
-            "messages": [tool_message],
-            "long_term_memories": [],
-            "tools_used": ["retrieve_long_term_memory"]
-        }, goto="LLM_assistant")
+        return _retrieve_error_command(e, tool_call_id)
+
+
+async def _aretrieve_long_term_memory(
+    query: str,
+    tool_call_id: Annotated[str, InjectedToolCallId],
+    config: RunnableConfig
+) -> Command:
+    """Async variant: the query embedding is awaited, the local vector search runs in a worker thread."""
+    try:
+        logger.info("Tool: retrieve_long_term_memory (async).")
+        thread_id = _thread_id(config)
+        committed = await asyncio.to_thread(MemoryWriteQueue.wait_for, thread_id, collection_name="agent_memories")
+
+        vector_store = await asyncio.to_thread(VectorStoreRegistry.get_store, collection_name="agent_memories")
+
+        results = await vector_store.aretrieve(
+            query=query,
+            alpha_importance=0.0,
+            alpha_recency=0.0,
+            alpha_similarity=1.0,
+            num_results=5
+        )
+        if not committed:
+            results = _with_pending(results, thread_id)
+        return _retrieved_memories_command(query, results, tool_call_id)
+
+    except Exception as e:
+        return _retrieve_error_command(e, tool_call_id)
+
+
+def _thread_id(config: RunnableConfig) -> str | None:
+    thread_id = (config or {}).get("configurable", {}).get("thread_id")
+    return str(thread_id) if thread_id is not None else None
+
+
+def _with_pending(results: list, thread_id: str | None) -> list:
+    """Add the thread's memories still waiting to be written (the write queue is behind, e.g. Ollama is slow)."""
+    pending = [m["content"] for m in MemoryWriteQueue.pending(thread_id, collection_name="agent_memories")]
+    logger.warning(f"{len(pending)} memories of this thread are not written yet, returning them unranked")
+    return (results or []) + [content for content in pending if content not in (results or [])]
+
+
+def _retrieved_memories_command(query: str, results: list, tool_call_id: str) -> Command:
+    formatted_results = []
+    if results:
+        content = f"Retrieved {len(results)} memories for query: {query}\n\n"
+        for i, memory_content in enumerate(results, 1):
+            # memory_content is a string, not a dict
+            content += f"{i}. {memory_content}\n"
+            # Format as dict for state storage
+            formatted_results.append({
+                "content": memory_content,
+                "metadata": {}
+            })
+    else:
+        content = f"No memories found for query: {query}"
+    
+    tool_message = ToolMessage(content, tool_call_id=tool_call_id)
+    
+    return Command(update={
+        "messages": [tool_message],
+        "long_term_memories": formatted_results,
+        "tools_used": ["retrieve_long_term_memory"]
+    })
+
+
+def _retrieve_error_command(e: Exception, tool_call_id: str) -> Command:
+    content = f"Error retrieving memories: {str(e)}"
+    tool_message = ToolMessage(content, tool_call_id=tool_call_id)
+    
+    return Command(update={
+        "messages": [tool_message],
+        "long_term_memories": [],
+        "tools_used": ["retrieve_long_term_memory"]
+    }, goto="LLM_assistant")
+
+
+retrieve_long_term_memory = StructuredTool.from_function(
+    func=_retrieve_long_term_memory, coroutine=_aretrieve_long_term_memory, name="retrieve_long_term_memory"
+)
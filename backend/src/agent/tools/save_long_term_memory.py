@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from datetime import datetime
 import json
@@ -6,7 +7,8 @@ from dataclasses import dataclass
 from typing import Annotated, List, Literal
 
 from langchain_core.messages import ToolMessage
-from langchain_core.tools import InjectedToolCallId, tool
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import InjectedToolCallId, StructuredTool
 from langgraph.graph.ui import push_ui_message
 from langgraph.prebuilt import InjectedState
 from langgraph.types import Command, interrupt
@@ -15,17 +17,20 @@ from termcolor import colored, cprint
 
 from config import Settings
 from services.neo4j import Neo4jService
-from services.memory.chromadb_store import ChromaVectorMemoryStore
+from services.memory import MemoryWriteQueue, VectorStoreRegistry
 from agent.state import AgentState
 
 logger = logging.getLogger(__name__)
 
-@tool
-def save_long_term_memory(
+# Acknowledge right away and let MemoryWriteQueue embed and store the memory in the background
+WRITE_BEHIND = bool(int(Settings.MEMORY_WRITE_BEHIND))
+
+def _save_long_term_memory(
     content: str,
     tag: str,
     importance: str,
-    tool_call_id: Annotated[str, InjectedToolCallId]
+    tool_call_id: Annotated[str, InjectedToolCallId],
+    config: RunnableConfig
 ) -> Command:
     """
     Save an important memory or insight about the user to Long Term Memory.
@@ -58,33 +63,92 @@ def save_long_term_memory(
     """
     try:
         logger.info("Tool: save_long_term_memory")
-        vector_store = ChromaVectorMemoryStore(collection_name="agent_memories", reset_on_init=False)
-        
-        metadata = {
-            "tags": tag,
-            "importance": importance,
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "stored_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
+        if WRITE_BEHIND:
+            MemoryWriteQueue.enqueue(**_queued_memory(content, tag, importance, config))
+            return _saved_memory_command(content, tool_call_id)
+
+        vector_store = VectorStoreRegistry.get_store(collection_name="agent_memories")
         
         vector_store.save(
             content=content,
-            metadata=metadata
+            metadata=_memory_metadata(tag, importance)
         )
-        
-        content_msg = f"Important memory saved to long-term storage: {content}"
-        tool_message = ToolMessage(content_msg, tool_call_id=tool_call_id)
-        
-        return Command(update={
-            "messages": [tool_message],
-            "tools_used": ["save_long_term_memory"]
-        })
+        return _saved_memory_command(content, tool_call_id)
         
     except Exception as e:
-        content_msg = f"Error saving memory to long-term storage: {str(e)}"
-        tool_message = ToolMessage(content_msg, tool_call_id=tool_call_id)
-        
-        return Command(update={
-            "messages": [tool_message],
-            "tools_used": ["save_long_term_memory"]
-        }, goto="LLM_assistant")
\ No newline at end of file
+        return _save_error_command(e, tool_call_id)
+
+
+async def _asave_long_term_memory(
+    content: str,
+    tag: str,
+    importance: str,
+    tool_call_id: Annotated[str, InjectedToolCallId],
+    config: RunnableConfig
+) -> Command:
+    """Async variant: the embedding is awaited, the local vector store write runs in a worker thread."""
+    try:
+        logger.info("Tool: save_long_term_memory (async)")
+        if WRITE_BEHIND:
+            # Only the journal append (and its fsync) is left to do before acknowledging
+            await asyncio.to_thread(MemoryWriteQueue.enqueue, **_queued_memory(content, tag, importance, config))
+            return _saved_memory_command(content, tool_call_id)
+
+        vector_store = await asyncio.to_thread(VectorStoreRegistry.get_store, collection_name="agent_memories")
+
+        await vector_store.asave(
+            content=content,
+            metadata=_memory_metadata(tag, importance)
+        )
+        return _saved_memory_command(content, tool_call_id)
+
+    except Exception as e:
+        return _save_error_command(e, tool_call_id)
+
+
+def _memory_metadata(tag: str, importance: str) -> dict:
+    return {
+        "tags": tag,
+        "importance": importance,
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "stored_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+
+def _queued_memory(content: str, tag: str, importance: str, config: RunnableConfig) -> dict:
+    return {
+        "content": content,
+        "metadata": _memory_metadata(tag, importance),
+        "collection_name": "agent_memories",
+        "thread_id": _thread_id(config),
+    }
+
+
+def _thread_id(config: RunnableConfig) -> str | None:
+    thread_id = (config or {}).get("configurable", {}).get("thread_id")
+    return str(thread_id) if thread_id is not None else None
+
+
+def _saved_memory_command(content: str, tool_call_id: str) -> Command:
+    content_msg = f"Important memory saved to long-term storage: {content}"
+    tool_message = ToolMessage(content_msg, tool_call_id=tool_call_id)
+    
+    return Command(update={
+        "messages": [tool_message],
+        "tools_used": ["save_long_term_memory"]
+    })
+
+
+def _save_error_command(e: Exception, tool_call_id: str) -> Command:
+    content_msg = f"Error saving memory to long-term storage: {str(e)}"
+    tool_message = ToolMessage(content_msg, tool_call_id=tool_call_id)
+    
+    return Command(update={
+        "messages": [tool_message],
+        "tools_used": ["save_long_term_memory"]
+    }, goto="LLM_assistant")
+
+
+save_long_term_memory = StructuredTool.from_function(
+    func=_save_long_term_memory, coroutine=_asave_long_term_memory, name="save_long_term_memory"
+)
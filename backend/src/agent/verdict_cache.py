@@ -0,0 +1,115 @@
+"""
+Verdict cache for the LLM safety judge.
+
+Identical content (after normalization) is judged once: repeated greetings, identical
+replies and the same text evaluated by both `judge` and `judge_final` reuse the cached
+verdict. An optional second tier matches near-identical content by embedding similarity.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from config import Settings
+from helpers import Metrics, helper_ollama
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class VerdictCache:
+    """Bounded LRU + TTL cache of content hash -> SAFE/UNSAFE verdict, with counters."""
+
+    def __init__(
+        self,
+        max_size: int = Settings.JUDGE_CACHE_SIZE,
+        ttl: float = Settings.JUDGE_CACHE_TTL,
+        semantic: bool = bool(int(Settings.JUDGE_CACHE_SEMANTIC)),
+        threshold: float = Settings.JUDGE_CACHE_THRESHOLD,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.semantic = semantic
+        self.threshold = threshold
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _expired(self, entry: dict, now: float) -> bool:
+        return self.ttl > 0 and now - entry["created_at"] > self.ttl
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        try:
+            vec = np.asarray(helper_ollama.create_embedding(input_text=text), dtype="float32")
+        except Exception as e:
+            logger.warning(f"Verdict cache semantic tier skipped, embedding failed: {e}")
+            return None
+        return vec / (np.linalg.norm(vec) or 1.0)
+
+    def lookup(self, text: str) -> tuple[Optional[bool], Optional[np.ndarray]]:
+        """Return (cached verdict or None, embedding computed for the semantic tier or None)."""
+        key = hashlib.sha256(_normalize(text).encode("utf-8")).hexdigest()
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._entries[key]
+                self.stats["evictions"] += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["exact_hits"] += 1
+                Metrics.record_cache("judge_verdict", hits=1)
+                return entry["verdict"], None
+
+        if not self.semantic:
+            with self._lock:
+                self.stats["misses"] += 1
+            Metrics.record_cache("judge_verdict", misses=1)
+            return None, None
+
+        # Semantic tier: compare against every cached embedding at once
+        embedding = self._embed(text)
+        with self._lock:
+            candidates = [
+                (k, e) for k, e in self._entries.items()
+                if e["embedding"] is not None and not self._expired(e, now)
+            ]
+            if embedding is not None and candidates:
+                similarities = np.stack([e["embedding"] for _, e in candidates]) @ embedding
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    best_key, best_entry = candidates[best]
+                    self._entries.move_to_end(best_key)
+                    self.stats["semantic_hits"] += 1
+                    Metrics.record_cache("judge_verdict", hits=1)
+                    return best_entry["verdict"], embedding
+            self.stats["misses"] += 1
+        Metrics.record_cache("judge_verdict", misses=1)
+        return None, embedding
+
+    def store(self, text: str, verdict: bool, embedding: Optional[np.ndarray] = None) -> None:
+        """Cache a verdict for the content."""
+        key = hashlib.sha256(_normalize(text).encode("utf-8")).hexdigest()
+        with self._lock:
+            self._entries[key] = {"verdict": verdict, "embedding": embedding, "created_at": time.monotonic()}
+            self._entries.move_to_end(key)
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def get_stats(self) -> dict:
+        """Counters, including how many judge LLM calls the cache avoided."""
+        with self._lock:
+            avoided = self.stats["exact_hits"] + self.stats["semantic_hits"]
+            return {**self.stats, "avoided_judge_calls": avoided, "size": len(self._entries)}
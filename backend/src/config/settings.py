@@ -14,12 +14,70 @@ class Settings:
     NEO4J_USER = os.environ.get("NEO4J_USER") or "neo4j"
     NEO4J_PASSWORD = os.environ.get("NEO4J_PASSWORD") or "test1234"
     NEO4J_URI = os.environ.get("NEO4J_URI", "bolt://localhost:7687")
+    NEO4J_DATABASE = os.environ.get("NEO4J_DATABASE", "neo4j")
+    NEO4J_BULK_CHUNK_SIZE = int(os.environ.get("NEO4J_BULK_CHUNK_SIZE", 1000))
+    NEO4J_SCHEMA_TTL = float(os.environ.get("NEO4J_SCHEMA_TTL", 600))  # seconds, 0 disables expiry
+    ANIMATE_TICK_SECONDS = float(os.environ.get("ANIMATE_TICK_SECONDS", 2))  # animate_friends iteration period
+    CYPHER_CACHE_ENABLED = os.environ.get("CYPHER_CACHE_ENABLED", 1)
+    CYPHER_CACHE_SIZE = int(os.environ.get("CYPHER_CACHE_SIZE", 256))
+    CYPHER_CACHE_TTL = float(os.environ.get("CYPHER_CACHE_TTL", 3600))  # seconds, 0 disables expiry
+    CYPHER_CACHE_THRESHOLD = float(os.environ.get("CYPHER_CACHE_THRESHOLD", 0.95))  # cosine similarity
     
     LOG_METRICS = os.environ.get("LOG_METRICS", 1)
     ENABLE_JUDGE = os.environ.get("ENABLE_JUDGE", 1)
+    JUDGE_SPECULATIVE = os.environ.get("JUDGE_SPECULATIVE", 0)  # run the input judge and the first LLM call concurrently (Ollama only)
+    JUDGE_STREAMING = os.environ.get("JUDGE_STREAMING", 0)  # stream the answer, judging it chunk by chunk (no client support yet: refused)
+    JUDGE_CHUNK_MIN_CHARS = int(os.environ.get("JUDGE_CHUNK_MIN_CHARS", 200))  # minimum size of a judged chunk
+    JUDGE_CACHE_ENABLED = os.environ.get("JUDGE_CACHE_ENABLED", 1)
+    JUDGE_CACHE_SIZE = int(os.environ.get("JUDGE_CACHE_SIZE", 1024))
+    JUDGE_CACHE_TTL = float(os.environ.get("JUDGE_CACHE_TTL", 3600))  # seconds, 0 disables expiry
+    JUDGE_CACHE_SEMANTIC = os.environ.get("JUDGE_CACHE_SEMANTIC", 0)  # also match near-identical content by embedding
+    JUDGE_CACHE_THRESHOLD = float(os.environ.get("JUDGE_CACHE_THRESHOLD", 0.98))  # cosine similarity
+    JUDGE_PRECLASSIFIER = os.environ.get("JUDGE_PRECLASSIFIER", 1)  # pass obviously benign content without the LLM judge
+    JUDGE_PRECLASSIFIER_SHADOW = os.environ.get("JUDGE_PRECLASSIFIER_SHADOW", 1)  # only log agreement, the LLM judge decides
+    JUDGE_PRECLASSIFIER_EMBEDDINGS = os.environ.get("JUDGE_PRECLASSIFIER_EMBEDDINGS", 1)  # required to pass anything locally
+    JUDGE_PRECLASSIFIER_MARGIN = float(os.environ.get("JUDGE_PRECLASSIFIER_MARGIN", 0.05))  # min benign-vs-unsafe cosine margin
+    JUDGE_ESCALATE_KEYWORDS = os.environ.get(
+        "JUDGE_ESCALATE_KEYWORDS",
+        "apple,iphone,ipad,ipod,imac,macbook,mac,macos,ios,airpods,itunes,app store,icloud,cupertino,tim cook,steve jobs,wozniak",
+    )  # comma separated, any match escalates to the LLM judge
+    PROMPT_STABLE_PREFIX = os.environ.get("PROMPT_STABLE_PREFIX", 1)  # send dynamic memory blocks after the history
+    OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")  # keep the model (and its prompt cache) loaded
+    PARALLEL_TOOL_CALLS = os.environ.get("PARALLEL_TOOL_CALLS", 1)  # let the assistant call independent tools at once
+    CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 0))  # prompt tokens per LLM call, 0 uses the model default
+    CONTEXT_LOW_WATERMARK = float(os.environ.get("CONTEXT_LOW_WATERMARK", 0.7))  # fraction of the budget kept after trimming
+    CONTEXT_SUMMARIZE = os.environ.get("CONTEXT_SUMMARIZE", 1)  # fold trimmed turns into a rolling summary
+    CONTEXT_CHARS_PER_TOKEN = float(os.environ.get("CONTEXT_CHARS_PER_TOKEN", 4))  # token estimate
     OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
     GOOGLE_APPLICATION_CREDENTIALS = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
     EMB_MODEL=os.environ.get("EMB_MODEL")
     EMB_DIMENSION=os.environ.get("EMB_DIMENSION")
     EMB_PROPERTY=os.environ.get("EMB_PROPERTY")
     EMB_SIMILARITY=os.environ.get("EMB_SIMILARITY")
+    EMB_BATCH_SIZE = int(os.environ.get("EMB_BATCH_SIZE", 64))
+    EMB_TIMEOUT = float(os.environ.get("EMB_TIMEOUT", 10))  # seconds per embedding request
+    EMB_RETRIES = int(os.environ.get("EMB_RETRIES", 2))
+    EMB_RETRY_BACKOFF = float(os.environ.get("EMB_RETRY_BACKOFF", 0.2))  # seconds, doubled per retry
+    EMB_POOL_SIZE = int(os.environ.get("EMB_POOL_SIZE", 10))  # keep-alive connections to Ollama
+    EMB_CACHE_ENABLED = os.environ.get("EMB_CACHE_ENABLED", 1)
+    EMB_CACHE_PATH = os.environ.get("EMB_CACHE_PATH", "./src/mem_stores/embedding_cache.db")
+    EMB_CACHE_MAX_ENTRIES = int(os.environ.get("EMB_CACHE_MAX_ENTRIES", 100000))  # disk tier cap
+    EMB_CACHE_MEMORY_ENTRIES = int(os.environ.get("EMB_CACHE_MEMORY_ENTRIES", 2048))  # in-memory LRU size
+
+    MEM_STORES_PATH = os.environ.get("MEM_STORES_PATH", "./src/mem_stores/")
+    MEMORY_CANDIDATE_POOL = int(os.environ.get("MEMORY_CANDIDATE_POOL", 50))  # ANN candidates re-ranked by retrieve()
+    MEMORY_PAGE_SIZE = int(os.environ.get("MEMORY_PAGE_SIZE", 500))  # page size for listing / batched deletes
+    MEMORY_WRITE_BEHIND = os.environ.get("MEMORY_WRITE_BEHIND", 1)  # save_long_term_memory acknowledges before the write
+    MEMORY_JOURNAL_PATH = os.environ.get("MEMORY_JOURNAL_PATH", "./src/mem_stores/memory_journal.jsonl")
+    MEMORY_JOURNAL_FSYNC = os.environ.get("MEMORY_JOURNAL_FSYNC", 1)  # fsync every journal append
+    MEMORY_WRITE_BATCH_SIZE = int(os.environ.get("MEMORY_WRITE_BATCH_SIZE", 32))
+    MEMORY_WRITE_FLUSH_INTERVAL = float(os.environ.get("MEMORY_WRITE_FLUSH_INTERVAL", 0.5))  # seconds a batch may wait to fill up
+    MEMORY_WRITE_MAX_ATTEMPTS = int(os.environ.get("MEMORY_WRITE_MAX_ATTEMPTS", 5))  # failed writes before a memory is dead-lettered
+    MEMORY_DEAD_LETTER_PATH = os.environ.get("MEMORY_DEAD_LETTER_PATH", "./src/mem_stores/memory_dead_letters.jsonl")
+    MEMORY_READ_WAIT = float(os.environ.get("MEMORY_READ_WAIT", 2.0))  # seconds retrieve waits for the thread's own writes
+    OLLAMA_HEALTH_BACKOFF = float(os.environ.get("OLLAMA_HEALTH_BACKOFF", 5))
+    OLLAMA_HEALTH_MAX_BACKOFF = float(os.environ.get("OLLAMA_HEALTH_MAX_BACKOFF", 300))
+
+    CHECKPOINT_DB_PATH = os.environ.get("CHECKPOINT_DB_PATH", "./src/mem_stores/checkpoints.db")  # empty disables it
+    CHECKPOINT_KEEP_LAST = int(os.environ.get("CHECKPOINT_KEEP_LAST", 50))  # checkpoints kept per thread
+    CHECKPOINT_PRUNE_INTERVAL = float(os.environ.get("CHECKPOINT_PRUNE_INTERVAL", 600))  # seconds, 0 disables pruning
@@ -1,5 +1,7 @@
 """Configuration package."""
 
 from . import helper_ollama
+from .embedding_client import EmbeddingClient, EmbeddingError
+from .metrics import Metrics, MetricsCallbackHandler
 
-__all__ = ["helper_ollama"]
+__all__ = ["helper_ollama", "EmbeddingClient", "EmbeddingError", "Metrics", "MetricsCallbackHandler"]
@@ -0,0 +1,184 @@
+"""
+Persistent content-addressed embedding cache.
+
+Embeddings are keyed by sha256(model + text) and stored as float32 blobs in SQLite,
+behind an in-memory LRU. The disk tier is capped and evicts the least recently used
+entries. Used by EmbeddingClient, so every embedding caller shares it.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from config import Settings
+from helpers.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+# Disk recency only orders evictions, so the last_used of disk hits is kept in memory and
+# written in batches: after this many touched entries, this many seconds, or with the next store
+TOUCH_FLUSH_ENTRIES = 1000
+TOUCH_FLUSH_INTERVAL = 60.0
+
+
+def _key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier (memory LRU + SQLite) embedding cache with hit/miss counters."""
+
+    def __init__(
+        self,
+        path: str = Settings.EMB_CACHE_PATH,
+        max_entries: int = Settings.EMB_CACHE_MAX_ENTRIES,
+        memory_entries: int = Settings.EMB_CACHE_MEMORY_ENTRIES,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+
+        self._memory: OrderedDict[str, list[float]] = OrderedDict()
+        self._touched: dict[str, float] = {}  # key -> last_used not yet written to disk
+        self._touches_flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vec BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._disk_count = self._conn.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+
+    def _remember(self, key: str, vec: list[float]) -> None:
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model: str, texts: list[str], disk: bool = True) -> dict[str, list[float]]:
+        """
+        Return {text: embedding} for every text found in the cache.
+        With disk=False only the memory tier is read (no I/O, safe on an event loop) and misses are not
+        counted, the caller is expected to look them up on disk next.
+        """
+        found: dict[str, list[float]] = {}
+        disk_lookup: dict[str, str] = {}
+
+        with self._lock:
+            for text in dict.fromkeys(texts):
+                key = _key(model, text)
+                vec = self._memory.get(key)
+                if vec is not None:
+                    self._memory.move_to_end(key)
+                    found[text] = vec
+                    self.stats["memory_hits"] += 1
+                else:
+                    disk_lookup[key] = text
+
+            if disk and disk_lookup:
+                keys = list(disk_lookup)
+                rows = []
+                # Chunked to stay below SQLite's bound-parameter limit
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows += self._conn.execute(
+                        f"SELECT key, vec FROM embeddings WHERE key IN ({placeholders})", chunk
+                    ).fetchall()
+                for key, blob in rows:
+                    vec = np.frombuffer(blob, dtype=np.float32).tolist()
+                    found[disk_lookup[key]] = vec
+                    self._remember(key, vec)
+                self.stats["disk_hits"] += len(rows)
+                self.stats["misses"] += len(disk_lookup) - len(rows)
+
+                # Promoted entries count as recently used on disk too
+                if rows:
+                    now = time.time()
+                    self._touched.update((key, now) for key, _ in rows)
+                    if self._flush_touches():
+                        self._conn.commit()
+
+        Metrics.record_cache("embedding", hits=len(found), misses=len(dict.fromkeys(texts)) - len(found) if disk else 0)
+        return found
+
+    def _flush_touches(self, force: bool = False) -> bool:
+        """Write the buffered last_used values when due (or forced). The caller commits. Returns whether it wrote."""
+        if not self._touched:
+            return False
+        due = len(self._touched) >= TOUCH_FLUSH_ENTRIES or time.monotonic() - self._touches_flushed_at >= TOUCH_FLUSH_INTERVAL
+        if not (force or due):
+            return False
+        touched, self._touched = self._touched, {}
+        self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(t, key) for key, t in touched.items()])
+        self._touches_flushed_at = time.monotonic()
+        return True
+
+    def put_many(self, model: str, items: list[tuple[str, list[float]]]) -> None:
+        """Store embeddings for the given (text, embedding) pairs."""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vec in items:
+                key = _key(model, text)
+                self._remember(key, list(vec))
+                rows.append((key, model, len(vec), np.asarray(vec, dtype=np.float32).tobytes(), now))
+
+            # Same commit as the store, and before the eviction that reads last_used
+            self._flush_touches(force=True)
+            cursor = self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dim, vec, last_used) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+            self.stats["stores"] += len(rows)
+            self._disk_count += max(cursor.rowcount, 0)
+
+            if self._disk_count > self.max_entries:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Drop the least recently used disk entries, leaving 10% headroom below the cap."""
+        self._disk_count = self._conn.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+        excess = self._disk_count - int(self.max_entries * 0.9)
+        if excess <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+        )
+        self._conn.commit()
+        self._disk_count -= excess
+        self.stats["evictions"] += excess
+        logger.info(f"Embedding cache evicted {excess} entries")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, "memory_size": len(self._memory), "disk_size": self._disk_count}
+
+    def close(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._flush_touches(force=True):
+                self._conn.commit()
+            self._conn.close()
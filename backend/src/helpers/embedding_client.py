@@ -0,0 +1,264 @@
+"""
+Shared Ollama embedding client.
+
+One keep-alive HTTP connection pool per process (plus one per event loop for the async
+variant), configurable timeouts and retries, batch inputs, and coalescing of concurrent
+requests for the same inputs so they hit Ollama only once. Texts already embedded are
+served from the persistent EmbeddingCache and only the misses are sent to Ollama.
+Used by the memory stores and by Neo4jService (through helper_ollama).
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+import httpx
+
+from config import Settings
+from helpers.embedding_cache import EmbeddingCache
+from helpers.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+EMB_CACHE_ENABLED = bool(int(Settings.EMB_CACHE_ENABLED))
+
+
+class EmbeddingError(Exception):
+    """Raised when Ollama could not produce embeddings after all retries."""
+
+
+class EmbeddingClient:
+    """Process-wide pooled client for Ollama's /api/embed endpoint."""
+
+    _client: httpx.Client | None = None
+    _cache: EmbeddingCache | None = None
+    # One per event loop, keyed by the loop itself so an entry goes away with its loop
+    _async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+    _lock = threading.Lock()
+
+    # Requests currently in flight, keyed by (model, inputs)
+    _inflight: dict[tuple, Future] = {}
+    _ainflight: dict[tuple, asyncio.Future] = {}
+
+    @classmethod
+    def _url(cls) -> str:
+        host = Settings.OLLAMA_HOST or "http://localhost:11434"  # IN DOCKER IT IS "http://ollama:11434"
+        return f"{host.rstrip('/')}/api/embed"
+
+    @classmethod
+    def _limits(cls) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=Settings.EMB_POOL_SIZE,
+            max_keepalive_connections=Settings.EMB_POOL_SIZE,
+            keepalive_expiry=60,
+        )
+
+    @classmethod
+    def _get_client(cls) -> httpx.Client:
+        if cls._client is None:
+            with cls._lock:
+                if cls._client is None:
+                    cls._client = httpx.Client(timeout=Settings.EMB_TIMEOUT, limits=cls._limits())
+        return cls._client
+
+    @classmethod
+    def _get_async_client(cls) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = cls._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(timeout=Settings.EMB_TIMEOUT, limits=cls._limits())
+            cls._async_clients[loop] = client
+        return client
+
+    @staticmethod
+    def _parse(response: httpx.Response, expected: int) -> list[list[float]]:
+        response.raise_for_status()
+        embeddings = response.json().get("embeddings", [])
+        if len(embeddings) != expected:
+            raise EmbeddingError(f"Ollama returned {len(embeddings)} embeddings for {expected} inputs")
+        return embeddings
+
+    @staticmethod
+    def _retryable(error: Exception) -> bool:
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code >= 500
+        return isinstance(error, httpx.TransportError)
+
+    # --------------------------
+    # SYNC
+    # --------------------------
+    @classmethod
+    @Metrics.timed("embeddings", "embed")
+    def _post(cls, model: str, texts: list[str]) -> list[list[float]]:
+        payload = {"model": model, "input": texts}
+        for attempt in range(Settings.EMB_RETRIES + 1):
+            try:
+                return cls._parse(cls._get_client().post(cls._url(), json=payload), len(texts))
+            except httpx.HTTPError as e:
+                if attempt == Settings.EMB_RETRIES or not cls._retryable(e):
+                    raise EmbeddingError(f"Ollama embedding request failed ({cls._url()}): {e}") from e
+                time.sleep(Settings.EMB_RETRY_BACKOFF * 2**attempt)
+
+    @classmethod
+    def embed(cls, texts: list[str], model: str | None = None, use_cache: bool = True) -> list[list[float]]:
+        """Embed a batch of texts. Cached texts are served locally and the misses go to Ollama in one request."""
+        if not texts:
+            return []
+        model = model or Settings.EMB_MODEL
+        cache = cls.get_cache() if use_cache else None
+        if cache is None:
+            return cls._embed_uncached(model, texts)
+
+        found = cache.get_many(model, texts)
+        missing = [text for text in dict.fromkeys(texts) if text not in found]
+        if missing:
+            vecs = cls._embed_uncached(model, missing)
+            cache.put_many(model, list(zip(missing, vecs)))
+            found.update(zip(missing, vecs))
+        return [found[text] for text in texts]
+
+    @classmethod
+    def _embed_uncached(cls, model: str, texts: list[str]) -> list[list[float]]:
+        """One Ollama request for the texts. Concurrent identical requests share one HTTP call."""
+        key = (model, tuple(texts))
+
+        with cls._lock:
+            future = cls._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                cls._inflight[key] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = cls._post(model, list(texts))
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with cls._lock:
+                cls._inflight.pop(key, None)
+
+    @classmethod
+    def embed_one(cls, text: str, model: str | None = None, use_cache: bool = True) -> list[float]:
+        return cls.embed([text], model=model, use_cache=use_cache)[0]
+
+    # --------------------------
+    # ASYNC
+    # --------------------------
+    @classmethod
+    @Metrics.timed("embeddings", "embed")
+    async def _apost(cls, model: str, texts: list[str]) -> list[list[float]]:
+        payload = {"model": model, "input": texts}
+        for attempt in range(Settings.EMB_RETRIES + 1):
+            try:
+                response = await cls._get_async_client().post(cls._url(), json=payload)
+                return cls._parse(response, len(texts))
+            except httpx.HTTPError as e:
+                if attempt == Settings.EMB_RETRIES or not cls._retryable(e):
+                    raise EmbeddingError(f"Ollama embedding request failed ({cls._url()}): {e}") from e
+                await asyncio.sleep(Settings.EMB_RETRY_BACKOFF * 2**attempt)
+
+    @classmethod
+    async def aembed(cls, texts: list[str], model: str | None = None, use_cache: bool = True) -> list[list[float]]:
+        """Async variant of embed()."""
+        if not texts:
+            return []
+        model = model or Settings.EMB_MODEL
+        cache = cls.get_cache() if use_cache else None
+        if cache is None:
+            return await cls._aembed_uncached(model, texts)
+
+        # Memory hits are served inline, the SQLite tier is read and written from a worker thread
+        found = cache.get_many(model, texts, disk=False)
+        missing = [text for text in dict.fromkeys(texts) if text not in found]
+        if missing:
+            found.update(await asyncio.to_thread(cache.get_many, model, missing))
+            missing = [text for text in missing if text not in found]
+        if missing:
+            vecs = await cls._aembed_uncached(model, missing)
+            await asyncio.to_thread(cache.put_many, model, list(zip(missing, vecs)))
+            found.update(zip(missing, vecs))
+        return [found[text] for text in texts]
+
+    @classmethod
+    async def _aembed_uncached(cls, model: str, texts: list[str]) -> list[list[float]]:
+        """One Ollama request for the texts. Concurrent identical requests on the same loop share one HTTP call."""
+        key = (id(asyncio.get_running_loop()), model, tuple(texts))
+
+        task = cls._ainflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(cls._apost(model, list(texts)))
+            cls._ainflight[key] = task
+            task.add_done_callback(lambda _: cls._ainflight.pop(key, None))
+        # shield: a cancelled waiter must not cancel the request shared with other waiters
+        return await asyncio.shield(task)
+
+    @classmethod
+    async def aembed_one(cls, text: str, model: str | None = None, use_cache: bool = True) -> list[float]:
+        return (await cls.aembed([text], model=model, use_cache=use_cache))[0]
+
+    # --------------------------
+    # CACHE
+    # --------------------------
+    @classmethod
+    def get_cache(cls) -> EmbeddingCache | None:
+        """Return the shared embedding cache (None when disabled or unavailable)."""
+        if not EMB_CACHE_ENABLED:
+            return None
+        if cls._cache is None:
+            with cls._lock:
+                if cls._cache is None:
+                    try:
+                        cls._cache = EmbeddingCache()
+                    except Exception as e:
+                        logger.error(f"Embedding cache unavailable, embedding without cache: {e}")
+                        return None
+        return cls._cache
+
+    @classmethod
+    def get_cache_stats(cls) -> dict:
+        """Hit/miss/eviction counters of the embedding cache."""
+        return cls._cache.get_stats() if cls._cache is not None else {}
+
+    # --------------------------
+    # LIFECYCLE
+    # --------------------------
+    @classmethod
+    def close(cls) -> None:
+        """Close the pooled sync connections and the cache, and forget the async clients."""
+        with cls._lock:
+            if cls._client is not None:
+                cls._client.close()
+                cls._client = None
+            if cls._cache is not None:
+                cls._cache.close()
+                cls._cache = None
+        # Async clients are bound to their loop and can only be closed from it (see aclose)
+        cls._async_clients = weakref.WeakKeyDictionary()
+
+    @classmethod
+    async def aclose(cls) -> None:
+        """Close the async clients of every event loop, then the sync client."""
+        current = asyncio.get_running_loop()
+        for loop, client in list(cls._async_clients.items()):
+            try:
+                if loop is current:
+                    await client.aclose()
+                elif loop.is_running():
+                    # Bound to another loop: close it there
+                    await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(client.aclose(), loop))
+                # A loop that is no longer running took its connections with it
+            except Exception as e:
+                logger.warning(f"Failed to close async embedding client: {e}")
+        cls.close()
+
+
+Metrics.register_collector("embedding_cache", EmbeddingClient.get_cache_stats)
@@ -2,12 +2,32 @@
 Ollama Operations Module
 """
 
-import ollama
 from config import Settings
+from helpers.embedding_client import EmbeddingClient
 
 
 # From user query/query to query embedding
 def create_embedding(input_text:str):
-    vec = ollama.embed(model=Settings.EMB_MODEL, input=input_text)["embeddings"][0] 
+    vec = EmbeddingClient.embed_one(input_text, model=Settings.EMB_MODEL)
     return vec
-  
\ No newline at end of file
+
+
+# From a batch of texts to their embeddings in a single request (same order as the input)
+def create_embeddings(input_texts:list[str]) -> list[list[float]]:
+    if not input_texts:
+        return []
+    vecs = EmbeddingClient.embed(list(input_texts), model=Settings.EMB_MODEL)
+    return vecs
+
+
+# Async variants for callers running on an event loop
+async def acreate_embedding(input_text:str):
+    vec = await EmbeddingClient.aembed_one(input_text, model=Settings.EMB_MODEL)
+    return vec
+
+
+async def acreate_embeddings(input_texts:list[str]) -> list[list[float]]:
+    if not input_texts:
+        return []
+    vecs = await EmbeddingClient.aembed(list(input_texts), model=Settings.EMB_MODEL)
+    return vecs
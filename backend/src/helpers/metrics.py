@@ -0,0 +1,219 @@
+"""
+Process-wide latency, token and cache instrumentation.
+
+Every observation is aggregated for the Prometheus-style `/metrics` endpoint and, when it
+happens inside an agent run, buffered per conversation thread so the graph nodes can copy
+the records of the current turn into the agent state.
+
+- Graph nodes, tools, Neo4j queries and embedding requests are timed with `Metrics.timed`.
+- LLM calls (latency and input/output tokens) are recorded by `MetricsCallbackHandler`.
+- Caches report hits and misses with `Metrics.record_cache`, and their own counters are
+  exported through registered collectors.
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables.config import ensure_config
+
+from config import Settings
+
+logger = logging.getLogger(__name__)
+
+LOG_METRICS = bool(int(Settings.LOG_METRICS))
+
+
+def _current_thread_id() -> Optional[str]:
+    """Thread id of the agent run executing the caller, if any."""
+    try:
+        thread_id = ensure_config().get("configurable", {}).get("thread_id")
+    except Exception:
+        return None
+    return str(thread_id) if thread_id is not None else None
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+class Metrics:
+    """Registry of counters and latency summaries, plus per-thread buffers of turn records."""
+
+    _lock = threading.Lock()
+    _latency: dict[tuple, list[float]] = defaultdict(lambda: [0, 0.0])  # (component, operation) -> [count, sum]
+    _tokens: dict[tuple, int] = defaultdict(int)  # (component, operation, direction) -> tokens
+    _cache: dict[tuple, int] = defaultdict(int)  # (cache, result) -> count
+    _pending: dict[str, list[dict]] = defaultdict(list)  # thread_id -> records not yet copied into the state
+    _collectors: dict[str, Callable[[], dict]] = {}
+
+    # --------------------------
+    # RECORDING
+    # --------------------------
+    @classmethod
+    def observe(
+        cls,
+        component: str,
+        operation: str,
+        seconds: float,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        thread_id: Optional[str] = None,
+    ) -> None:
+        """Record one timed operation (and its token usage, for LLM calls)."""
+        if not LOG_METRICS:
+            return
+        thread_id = thread_id or _current_thread_id()
+        with cls._lock:
+            entry = cls._latency[(component, operation)]
+            entry[0] += 1
+            entry[1] += seconds
+            if input_tokens:
+                cls._tokens[(component, operation, "input")] += input_tokens
+            if output_tokens:
+                cls._tokens[(component, operation, "output")] += output_tokens
+            if thread_id is not None:
+                record = {"component": component, "operation": operation, "ms": round(seconds * 1000, 1)}
+                if input_tokens or output_tokens:
+                    record.update(input_tokens=input_tokens, output_tokens=output_tokens)
+                cls._pending[thread_id].append(record)
+
+    @classmethod
+    def record_cache(cls, cache: str, hits: int = 0, misses: int = 0) -> None:
+        """Record cache lookups."""
+        if not LOG_METRICS or not (hits or misses):
+            return
+        thread_id = _current_thread_id()
+        with cls._lock:
+            cls._cache[(cache, "hit")] += hits
+            cls._cache[(cache, "miss")] += misses
+            if thread_id is not None:
+                cls._pending[thread_id].append({"component": "cache", "operation": cache, "hits": hits, "misses": misses})
+
+    @classmethod
+    def timed(cls, component: str, operation: Optional[str] = None):
+        """Decorator timing every call of a sync or async function."""
+        def decorator(func):
+            name = operation or func.__name__
+
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    started = time.perf_counter()
+                    try:
+                        return await func(*args, **kwargs)
+                    finally:
+                        cls.observe(component, name, time.perf_counter() - started)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    cls.observe(component, name, time.perf_counter() - started)
+            return wrapper
+        return decorator
+
+    @classmethod
+    def drain(cls, thread_id: Optional[str] = None) -> list[dict]:
+        """Return and forget the records buffered for a thread (the current run's by default)."""
+        thread_id = thread_id or _current_thread_id()
+        if thread_id is None:
+            return []
+        with cls._lock:
+            return cls._pending.pop(thread_id, [])
+
+    # --------------------------
+    # EXPORT
+    # --------------------------
+    @classmethod
+    def register_collector(cls, name: str, collect: Callable[[], dict]) -> None:
+        """Export the numeric values of `collect()` as `agent_<name>_<key>` gauges."""
+        cls._collectors[name] = collect
+
+    @classmethod
+    def render(cls) -> str:
+        """Prometheus text exposition format."""
+        lines = []
+        with cls._lock:
+            latency = {k: list(v) for k, v in cls._latency.items()}
+            tokens = dict(cls._tokens)
+            cache = dict(cls._cache)
+
+        lines += [
+            "# HELP agent_latency_seconds Wall time of agent operations.",
+            "# TYPE agent_latency_seconds summary",
+        ]
+        for (component, operation), (count, total) in sorted(latency.items()):
+            labels = _labels({"component": component, "operation": operation})
+            lines.append(f"agent_latency_seconds_count{labels} {count}")
+            lines.append(f"agent_latency_seconds_sum{labels} {total:.6f}")
+
+        lines += ["# HELP agent_tokens_total LLM tokens used.", "# TYPE agent_tokens_total counter"]
+        for (component, operation, direction), count in sorted(tokens.items()):
+            labels = _labels({"component": component, "operation": operation, "direction": direction})
+            lines.append(f"agent_tokens_total{labels} {count}")
+
+        lines += ["# HELP agent_cache_requests_total Cache lookups.", "# TYPE agent_cache_requests_total counter"]
+        for (name, result), count in sorted(cache.items()):
+            lines.append(f"agent_cache_requests_total{_labels({'cache': name, 'result': result})} {count}")
+
+        for name, collect in sorted(cls._collectors.items()):
+            try:
+                values = collect() or {}
+            except Exception as e:
+                logger.warning(f"Metrics collector {name} failed: {e}")
+                continue
+            for key, value in sorted(values.items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                metric = f"agent_{name}_{key}"
+                lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+
+        return "\n".join(lines) + "\n"
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Records latency and token usage of every LLM call, labelled by its run_name metadata."""
+
+    def __init__(self):
+        self._runs: dict[UUID, tuple[float, str, Optional[str]]] = {}
+
+    def _start(self, run_id: UUID, metadata: Optional[dict]) -> None:
+        metadata = metadata or {}
+        thread_id = str(metadata["thread_id"]) if metadata.get("thread_id") is not None else _current_thread_id()
+        self._runs[run_id] = (time.perf_counter(), metadata.get("run_name", "llm"), thread_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata: Optional[dict] = None, **kwargs):
+        self._start(run_id, metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, metadata: Optional[dict] = None, **kwargs):
+        self._start(run_id, metadata)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        started, operation, thread_id = run
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+        Metrics.observe("llm", operation, time.perf_counter() - started, input_tokens, output_tokens, thread_id=thread_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._runs.pop(run_id, None)
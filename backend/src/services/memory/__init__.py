@@ -1,5 +1,7 @@
 """Configuration package."""
 
-from .chromadb_store import ChromaVectorMemoryStore
+from .chromadb_store import ChromaVectorMemoryStore, OllamaHealth
+from .store_registry import VectorStoreRegistry
+from .memory_writer import MemoryWriteQueue
 
-__all__ = ["ChromaVectorMemoryStore"]
+__all__ = ["ChromaVectorMemoryStore", "OllamaHealth", "VectorStoreRegistry", "MemoryWriteQueue"]
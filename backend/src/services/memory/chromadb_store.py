@@ -1,4 +1,3 @@
-
 """
 First run:
 > bash start_ollama.sh
@@ -6,56 +5,151 @@ First run:
 > ollama list (to check if it is installed pulled)
 """
 
+import asyncio
 from datetime import datetime
+import threading
+import time
 import uuid
 import chromadb
 import numpy as np
-import requests
 from pathlib import Path
 from termcolor import cprint
-import os
 
-def get_embedding_ollama(text: str, model="nomic-embed-text") -> list[float] | None:
+from config import Settings
+from helpers.embedding_client import EmbeddingClient, EmbeddingError
+
+
+class OllamaHealth:
+    """Process-wide availability tracker for the Ollama embedding service.
+
+    Instead of probing Ollama every time a store is built, the last known state is
+    shared by the whole process. Failures are re-probed on an exponential backoff
+    timer, successes are trusted until the next failed embedding call.
+    """
+
+    _available: bool | None = None
+    _next_probe: float = 0.0
+    _backoff: float = Settings.OLLAMA_HEALTH_BACKOFF
+    _lock = threading.Lock()
+
+    @classmethod
+    def is_available(cls) -> bool:
+        """Return the cached availability, re-probing only when the backoff expired."""
+        if cls._available is None or (not cls._available and time.monotonic() >= cls._next_probe):
+            get_embedding_ollama("test", use_cache=False)  # a probe must reach Ollama
+        return bool(cls._available)
+
+    @classmethod
+    async def ais_available(cls) -> bool:
+        """Async variant of is_available()."""
+        if cls._available is None or (not cls._available and time.monotonic() >= cls._next_probe):
+            await aget_embedding_ollama("test", use_cache=False)
+        return bool(cls._available)
+
+    @classmethod
+    def record_success(cls) -> None:
+        with cls._lock:
+            if cls._available is False:
+                cprint("Ollama embedding service is available again.", "green")
+            cls._available = True
+            cls._backoff = Settings.OLLAMA_HEALTH_BACKOFF
+
+    @classmethod
+    def record_failure(cls) -> None:
+        with cls._lock:
+            if cls._available is False:
+                cls._backoff = min(cls._backoff * 2, Settings.OLLAMA_HEALTH_MAX_BACKOFF)
+            cls._available = False
+            cls._next_probe = time.monotonic() + cls._backoff
+
+    @classmethod
+    def reset(cls) -> None:
+        """Forget the cached state so the next check probes Ollama again."""
+        with cls._lock:
+            cls._available = None
+            cls._next_probe = 0.0
+            cls._backoff = Settings.OLLAMA_HEALTH_BACKOFF
+
+
+def get_embedding_ollama(text: str, model="nomic-embed-text", use_cache: bool = True) -> list[float] | None:
     """
     Get embedding from Ollama API. Returns None if Ollama is not available.
     This allows ChromaDB to fall back to its default embedding function.
+    Requests go through the shared, connection-pooled and cached EmbeddingClient.
     """
-    ollama_host = os.environ.get("OLLAMA_HOST", "http://localhost:11434") # IN DOCKER IT IS "http://ollama:11434"
-    print(ollama_host)
-    url = f"{ollama_host}/api/embed"
     try:
-        payload = {
-            "model": model,
-            "input": text
-        }
-        response = requests.post(url, json=payload, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        return data.get("embeddings", [])[0]
-    except (requests.exceptions.RequestException, requests.exceptions.Timeout) as e:
+        vec = EmbeddingClient.embed_one(text, model=model, use_cache=use_cache)
+        OllamaHealth.record_success()
+        return vec
+    except EmbeddingError as e:
         # Ollama not available - return None so ChromaDB can use its default embedding function
-        cprint(f"Ollama embedding service not available ({url}): {e}. Using ChromaDB default embeddings.", "yellow")
+        OllamaHealth.record_failure()
+        cprint(f"Ollama embedding service not available: {e}. Using ChromaDB default embeddings.", "yellow")
+        return None
+
+async def aget_embedding_ollama(text: str, model="nomic-embed-text", use_cache: bool = True) -> list[float] | None:
+    """Async variant of get_embedding_ollama()."""
+    try:
+        vec = await EmbeddingClient.aembed_one(text, model=model, use_cache=use_cache)
+        OllamaHealth.record_success()
+        return vec
+    except EmbeddingError as e:
+        OllamaHealth.record_failure()
+        cprint(f"Ollama embedding service not available: {e}. Using ChromaDB default embeddings.", "yellow")
         return None
 
 # Testing this is the same
 #get_embedding_ollama("This is a sample text") == ollama.embed("nomic-embed-text", "This is a sample text").get("embeddings", [])[0]
 
 
+def _with_numeric_fields(metadata: dict | None) -> dict:
+    """Return a copy of the metadata with numeric `created_at_ts` (epoch seconds) and `importance_num` fields."""
+    metadata = dict(metadata or {})
+    if "created_at_ts" not in metadata:
+        created_at = metadata.get("created_at")
+        try:
+            metadata["created_at_ts"] = datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S").timestamp() if created_at else time.time()
+        except (TypeError, ValueError):
+            metadata["created_at_ts"] = time.time()
+    if "importance_num" not in metadata:
+        try:
+            metadata["importance_num"] = float(metadata.get("importance", 1))
+        except (TypeError, ValueError):
+            metadata["importance_num"] = 1.0
+    return metadata
+
+
+def _created_at_epoch(meta: dict) -> float:
+    """Creation time in epoch seconds. Parses the string only for memories saved before created_at_ts existed."""
+    ts = meta.get("created_at_ts")
+    if ts is not None:
+        return float(ts)
+    return datetime.strptime(meta.get("created_at", "1970-01-01 00:00:00"), "%Y-%m-%d %H:%M:%S").timestamp()
+
+
+def _importance(meta: dict) -> float:
+    """Importance as a number, defaults to 1 if not specified."""
+    value = meta.get("importance_num")
+    if value is None:
+        value = meta.get("importance", 1)
+    return float(value)
+
+
 class ChromaVectorMemoryStore:
-    def __init__(self, dim=768, collection_name: str = "docs", reset_on_init: bool = False, path: str = f"./src/mem_stores/"):  # 768 is correct for nomic
+    def __init__(self, dim=768, collection_name: str = "docs", reset_on_init: bool = False, path: str = Settings.MEM_STORES_PATH, client=None):  # 768 is correct for nomic
         vector_store = "chromadb_store"
         print(f"Using: {vector_store}")
 
         self.dim = dim
+        self.collection_name = collection_name
         self.path = Path(path + vector_store)
         self.path.mkdir(parents=True, exist_ok=True)
         
-        # Check if Ollama is available to decide embedding strategy
-        test_embedding = get_embedding_ollama("test")
-        self.use_ollama = test_embedding is not None
+        # Check if Ollama is available to decide embedding strategy (shared, backoff-tracked state)
+        self.use_ollama = OllamaHealth.is_available()
         
-        # Initialize Vector Store
-        self.client = chromadb.PersistentClient(path=self.path, settings=chromadb.config.Settings(allow_reset=True))
+        # Initialize Vector Store (reuse the client of the registry when provided)
+        self.client = client or chromadb.PersistentClient(path=self.path, settings=chromadb.config.Settings(allow_reset=True))
         
         if collection_name is not None:
             if self.use_ollama:
@@ -79,37 +173,99 @@ class ChromaVectorMemoryStore:
 
 
     def save(self, content:str, metadata=None):
+        # Use Ollama embedding (skip the HTTP round trip while Ollama is known to be down)
+        vec = get_embedding_ollama(content) if self.use_ollama and OllamaHealth.is_available() else None
+        self._add(content, metadata, vec)
+
+    async def asave(self, content:str, metadata=None):
+        """Async variant of save(): the embedding is awaited, the local Chroma write runs in a worker thread."""
+        vec = await aget_embedding_ollama(content) if self.use_ollama and await OllamaHealth.ais_available() else None
+        await asyncio.to_thread(self._add, content, metadata, vec)
+
+    def _add(self, content:str, metadata=None, vec:list[float] | None = None):
         unique_id = str(uuid.uuid4())
         cprint(f"Saved document with ID: {unique_id}. Content: {content}", "yellow")
 
+        # Numeric copies of created_at / importance so search can score without parsing strings
+        metadata = _with_numeric_fields(metadata)
+
         if self.use_ollama:
-            # Use Ollama embedding
-            vec = get_embedding_ollama(content)
             if vec is not None:
                 self.collection.add(
                     ids=[unique_id],
                     embeddings=np.array([vec], dtype="float32"),
                     documents=[content],
-                    metadatas=[metadata or {}]
+                    metadatas=[metadata]
                 )
             else:
                 # Ollama failed unexpectedly, fall back to ChromaDB default
                 self.collection.add(
                     ids=[unique_id],
                     documents=[content],
-                    metadatas=[metadata or {}]
+                    metadatas=[metadata]
                 )
         else:
             # Use ChromaDB's default embedding function (no embeddings provided)
             self.collection.add(
                 ids=[unique_id],
                 documents=[content],
-                metadatas=[metadata or {}]
+                metadatas=[metadata]
             )
 
+    def save_many(self, contents:list[str], metadatas:list | None = None, ids:list[str] | None = None, require_embeddings: bool = False):
+        """Save a batch of memories: one bulk embedding request and one upsert.
+
+        Upserting by id makes re-saving the same batch (journal replay) idempotent.
+        With require_embeddings, an Ollama store raises EmbeddingError while Ollama is down instead of
+        falling back to ChromaDB's default embeddings (which do not match the collection's dimension).
+        """
+        if not contents:
+            return
+        ids = ids or [str(uuid.uuid4()) for _ in contents]
+        metadatas = [_with_numeric_fields(m) for m in (metadatas or [None] * len(contents))]
+
+        vecs = None
+        if self.use_ollama and OllamaHealth.is_available():
+            try:
+                vecs = EmbeddingClient.embed(contents, model="nomic-embed-text")
+                OllamaHealth.record_success()
+            except EmbeddingError as e:
+                OllamaHealth.record_failure()
+                if require_embeddings:
+                    raise
+                cprint(f"Ollama embedding service not available: {e}. Using ChromaDB default embeddings.", "yellow")
+        elif self.use_ollama and require_embeddings:
+            raise EmbeddingError("Ollama embedding service not available")
+
+        if vecs is not None:
+            self.collection.upsert(
+                ids=ids,
+                embeddings=np.array(vecs, dtype="float32"),
+                documents=contents,
+                metadatas=metadatas
+            )
+        else:
+            self.collection.upsert(ids=ids, documents=contents, metadatas=metadatas)
+        cprint(f"Saved {len(contents)} documents with IDs: {ids}", "yellow")
+
     def search(self, query:str, k:int=3, include_tags:list=[]):
         # generate an embedding for the input and retrieve the most relevant doc
         cprint(f"Vector search for query: {query}", "yellow")
+        # Use Ollama embedding for query (skip the HTTP round trip while Ollama is known to be down)
+        q_vec = None
+        if self.use_ollama and self.count_all() > 0 and OllamaHealth.is_available():
+            q_vec = get_embedding_ollama(query)
+        return self._search(query, q_vec, k=k, include_tags=include_tags)
+
+    async def asearch(self, query:str, k:int=3, include_tags:list=[]):
+        """Async variant of search(): the embedding is awaited, the local Chroma query runs in a worker thread."""
+        cprint(f"Vector search for query: {query}", "yellow")
+        q_vec = None
+        if self.use_ollama and await asyncio.to_thread(self.count_all) > 0 and await OllamaHealth.ais_available():
+            q_vec = await aget_embedding_ollama(query)
+        return await asyncio.to_thread(self._search, query, q_vec, k, include_tags)
+
+    def _search(self, query:str, q_vec:list[float] | None, k:int=3, include_tags:list=[]):
         if self.count_all() == 0:
             cprint("No documents found in vector store.", "red")
             distances, unique_ids, metadatas, documents = [], [], [], []
@@ -121,8 +277,6 @@ class ChromaVectorMemoryStore:
             
             # Query the collection with filtering
             if self.use_ollama:
-                # Use Ollama embedding for query
-                q_vec = get_embedding_ollama(query)
                 if q_vec is not None:
                     results = self.collection.query(
                         query_embeddings=[np.array(q_vec, dtype="float32")],
@@ -148,12 +302,11 @@ class ChromaVectorMemoryStore:
             distances, unique_ids, metadatas, documents = results['distances'][0], results['ids'][0], results['metadatas'][0], results['documents'][0]
                 
 
-        distances = np.array(distances)  # Remove extra dimension
-        recencies = np.array([], dtype=float)
-        importances = np.array([], dtype=float)
-        for meta in metadatas:
-            recencies = np.append(recencies, (datetime.now() - datetime.strptime(meta.get("created_at", "1970-01-01 00:00:00"), "%Y-%m-%d %H:%M:%S")).total_seconds())
-            importances = np.append(importances, float(meta.get("importance", 1)))  # Default importance to 1 if not specified
+        distances = np.asarray(distances, dtype=float)
+        # Recency and importance as array operations over the numeric metadata fields
+        created_ts = np.fromiter((_created_at_epoch(meta) for meta in metadatas), dtype=float, count=len(metadatas))
+        importances = np.fromiter((_importance(meta) for meta in metadatas), dtype=float, count=len(metadatas))
+        recencies = time.time() - created_ts
 
         cosine_similarities = 1 - distances  # Convert distances to cosine similarities
         cprint(f"Vector search results (ordered by distance):", "yellow")
@@ -166,48 +319,86 @@ class ChromaVectorMemoryStore:
 
         return documents, distances, cosine_similarities, recencies, importances
     
-    def retrieve(self, query: str, alpha_importance:float =0.0, alpha_recency:float=0.0, alpha_similarity:float=1.0, num_results:int = 3):
-        # Vector search
-        contents, distances, cosine_similarities, recencies, importances = self.search(query, k=self.count_all(), include_tags=[])
+    def retrieve(self, query: str, alpha_importance:float =0.0, alpha_recency:float=0.0, alpha_similarity:float=1.0, num_results:int = 3, candidate_pool:int | None = None):
+        """
+        Two-stage retrieval: ANN search for a bounded candidate pool, then a vectorized re-rank
+        by importance, recency and similarity. The cost no longer grows with the collection size.
+        """
+        # Stage 1: vector search for the candidate pool
+        candidate_pool = max(candidate_pool or Settings.MEMORY_CANDIDATE_POOL, num_results)
+        k = min(candidate_pool, self.count_all())
+        search_results = self.search(query, k=k, include_tags=[])
+        return self._rerank(search_results, alpha_importance, alpha_recency, alpha_similarity, num_results)
+
+    async def aretrieve(self, query: str, alpha_importance:float =0.0, alpha_recency:float=0.0, alpha_similarity:float=1.0, num_results:int = 3, candidate_pool:int | None = None):
+        """Async variant of retrieve()."""
+        candidate_pool = max(candidate_pool or Settings.MEMORY_CANDIDATE_POOL, num_results)
+        k = min(candidate_pool, await asyncio.to_thread(self.count_all))
+        search_results = await self.asearch(query, k=k, include_tags=[])
+        return self._rerank(search_results, alpha_importance, alpha_recency, alpha_similarity, num_results)
 
-        # Calculate scores based on importance, recency, and similarity
+    def _rerank(self, search_results, alpha_importance:float, alpha_recency:float, alpha_similarity:float, num_results:int):
+        contents, distances, cosine_similarities, recencies, importances = search_results
+        if len(contents) == 0:
+            return []
+
+        # Stage 2: calculate scores based on importance, recency, and similarity
         cprint("\nContents reordered by SCORE:\nalpha_importance*importance + alpha_recency*0.995**recency + alpha_similarity*cosine_similarity", "yellow")
 
-        exp_recency = 0.995**recencies
+        exp_recency = np.power(0.995, recencies)
         scores = alpha_importance*importances + alpha_recency*exp_recency + alpha_similarity*cosine_similarities
 
-        # Sort documents by score
-        sorted_indices = np.argsort(scores)[::-1]  # Sort in descending order
+        # Keep the best num_results in descending score order
+        sorted_indices = np.argsort(scores)[::-1][:num_results]
         print(f"Sorted indices: {sorted_indices}")
-        sorted_contents = [contents[i] for i in sorted_indices]
-        sorted_distances = [distances[i] for i in sorted_indices]
-        sorted_cosine_similarities = [cosine_similarities[i] for i in sorted_indices]
-        sorted_recencies = [recencies[i] for i in sorted_indices]
-        sorted_exp_recency = [exp_recency[i] for i in sorted_indices]
-        sorted_importances = [importances[i] for i in sorted_indices]
 
         cprint(f"alpha_importance = {alpha_importance} | alpha_recency = {alpha_recency} | alpha_similarity = {alpha_similarity}", "yellow")
-        for i, content in enumerate(sorted_contents):
-            print(f"\n[{i}] Content: {content}")
-            print(f"     Distance: {sorted_distances[i]}")
-            print(f"     Cosine Similarity: {sorted_cosine_similarities[i]}")
-            print(f"     Recency: {sorted_recencies[i]}")
-            print(f"     Exp Recency: {sorted_exp_recency[i]}")
-            print(f"     Importance: {sorted_importances[i]}")
-            print(f"     SCORE: {scores[sorted_indices[i]]}")
+        for rank, i in enumerate(sorted_indices):
+            print(f"\n[{rank}] Content: {contents[i]}")
+            print(f"     Distance: {distances[i]}")
+            print(f"     Cosine Similarity: {cosine_similarities[i]}")
+            print(f"     Recency: {recencies[i]}")
+            print(f"     Exp Recency: {exp_recency[i]}")
+            print(f"     Importance: {importances[i]}")
+            print(f"     SCORE: {scores[i]}")
             print("-" * 40)
-            
-        results = sorted_contents[:num_results] if num_results < len(sorted_contents) else sorted_contents
+
+        results = [contents[i] for i in sorted_indices]
         return results
 
-    def reset(self):
-        # Get all document IDs from the collection
-        all_ids = self.collection.peek()["ids"]
-    
-        if all_ids:  # only delete if there are documents
-            self.collection.delete(ids=all_ids)
+    def reset(self, batch_size: int | None = None):
+        # Delete the collection page by page so arbitrarily large collections never have to fit in memory.
+        # Only IDs are fetched, and the first page is always the next one since deleted items disappear.
+        batch_size = batch_size or Settings.MEMORY_PAGE_SIZE
+        deleted = 0
+        while True:
+            ids = self.collection.get(limit=batch_size, include=[])["ids"]
+            if not ids:  # only delete if there are documents
+                break
+            self.collection.delete(ids=ids)
+            deleted += len(ids)
             
-        cprint("Vector store reset.", "yellow")
+        cprint(f"Vector store reset ({deleted} documents deleted).", "yellow")
+
+    def iter_all(self, page_size: int | None = None, include: list | None = None):
+        """
+        Iterate over every stored document page by page.
+        Yields (id, document, metadata) tuples; used for listing and export.
+        """
+        page_size = page_size or Settings.MEMORY_PAGE_SIZE
+        include = include or ["documents", "metadatas"]
+        offset = 0
+        while True:
+            page = self.collection.get(limit=page_size, offset=offset, include=include)
+            ids = page["ids"]
+            if not ids:
+                return
+            documents = page.get("documents") or [None] * len(ids)
+            metadatas = page.get("metadatas") or [None] * len(ids)
+            yield from zip(ids, documents, metadatas)
+            if len(ids) < page_size:
+                return
+            offset += len(ids)
         
     def show_all(self):
         cprint("Vector store contents:", "yellow")
@@ -215,17 +406,8 @@ class ChromaVectorMemoryStore:
             cprint("No documents found in vector store.", "red")
             return
 
-        # Retrieve all documents in the collection
-        # NOTE: Chroma currently requires you to know the IDs to fetch them all
-        # So we fetch all IDs first:
-        all_ids = self.collection.peek()["ids"]
-
-        results = self.collection.get(
-            ids=all_ids,
-            include=["documents", "metadatas"]
-        )
-        
-        for i, (doc, meta) in enumerate(zip(results["documents"], results["metadatas"])):
+        # Retrieve all documents in the collection, one page at a time
+        for i, (_, doc, meta) in enumerate(self.iter_all()):
             print(f"[{i}] Content: {doc}")
             print(f"     Metadata: {meta}")
             print("-" * 40)
@@ -233,5 +415,5 @@ class ChromaVectorMemoryStore:
         print(f"Total documents in vector store: {self.count_all()}")
                 
     def count_all(self):
-        return len(self.collection.peek()["ids"])
-
+        # O(1): served by Chroma without materializing any document
+        return self.collection.count()
@@ -0,0 +1,386 @@
+"""
+Write-behind queue for long-term memories.
+
+save_long_term_memory only appends the memory to a local journal and enqueues it, so the
+turn continues right away. A background worker collects queued memories into batches,
+embeds each batch with one bulk request and upserts it into Chroma, then marks it as
+committed in the journal. Memories that were journaled but never committed (crash, Ollama
+or Chroma failure at shutdown) are replayed on the next start. Upserts use the memory id,
+so a replayed memory that had in fact been written is not duplicated.
+
+Every process appends to its own journal file, held under an exclusive lock for as long as the
+process runs (memory_journal.jsonl, then memory_journal.1.jsonl, ... for concurrent workers).
+On start a process also adopts the journals of processes that are gone (unlocked files).
+
+Transient failures (Ollama unreachable, connection errors) keep the memories queued and in the
+journal, retried with a capped backoff for as long as it takes. Any other failure is retried one
+memory at a time so one bad memory does not hold back the others, and a memory that still fails
+after MEMORY_WRITE_MAX_ATTEMPTS is dead-lettered: marked as such in the journal, logged, and
+appended to the dead-letter file for inspection.
+
+Readers call wait_for() before searching so a thread always sees its own writes.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from termcolor import cprint
+
+from config import Settings
+from helpers import EmbeddingError, Metrics
+from services.memory.store_registry import VectorStoreRegistry
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# Failures that say nothing about the memory itself: retried until they clear
+TRANSIENT_ERRORS = (EmbeddingError, ConnectionError, TimeoutError)
+MAX_BACKOFF = 30.0  # seconds between retries of transient failures
+
+
+def _try_lock(journal) -> bool:
+    """Take the exclusive lock of an open journal without waiting. Held until the file is closed."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            journal.seek(0)
+            msvcrt.locking(journal.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+class MemoryWriteQueue:
+    """Process-wide journaled write-behind queue in front of the vector stores."""
+
+    _cond = threading.Condition()
+    _queue: list[dict] = []  # journaled, not yet picked up by the worker
+    _inflight: dict[str, dict] = {}  # id -> memory, until committed (queued or being written)
+    _attempts: dict[str, int] = {}  # id -> failed writes so far
+    _worker: Optional[threading.Thread] = None
+    _journal = None
+    _dead_letter_path: Optional[Path] = None
+    _stop = False
+    _flush_requested = False
+    stats = {"enqueued": 0, "committed": 0, "batches": 0, "failures": 0, "dead_lettered": 0, "replayed": 0}
+
+    # --------------------------
+    # LIFECYCLE
+    # --------------------------
+    @classmethod
+    def start(cls, journal_path: str = Settings.MEMORY_JOURNAL_PATH, dead_letter_path: str = Settings.MEMORY_DEAD_LETTER_PATH) -> None:
+        """Lock a journal of this process, replay uncommitted memories and start the worker (idempotent)."""
+        with cls._cond:
+            if cls._worker is not None:
+                return
+            path = Path(journal_path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            cls._dead_letter_path = Path(dead_letter_path)
+            cls._journal = cls._open_journal(path)
+            # Left by the previous owner of this journal: already in it, only queued again
+            replayed = cls._replay(cls._journal)
+            replayed += cls._adopt_orphans(path, {m["id"] for m in replayed})
+            cls._stop = False
+            cls._worker = threading.Thread(target=cls._run, name="memory-writer", daemon=True)
+            cls._worker.start()
+            if replayed:
+                cprint(f"Replaying {len(replayed)} uncommitted long-term memories from the journal.", "yellow")
+                cls._queue.extend(replayed)
+                cls._inflight.update((m["id"], m) for m in replayed)
+                cls.stats["replayed"] += len(replayed)
+                cls._cond.notify_all()
+
+    @classmethod
+    def shutdown(cls, timeout: float = 10.0) -> None:
+        """Flush what can be written within `timeout` and stop the worker. The rest stays in the journal."""
+        with cls._cond:
+            if cls._worker is None:
+                return
+            cls._stop = True
+            cls._cond.notify_all()
+        cls._worker.join(timeout)
+        with cls._cond:
+            if cls._inflight:
+                logger.warning(f"{len(cls._inflight)} long-term memories left in the journal for the next start")
+            cls._journal.close()
+            cls._journal = None
+            cls._worker = None
+            cls._queue = []
+            cls._inflight = {}
+            cls._attempts = {}
+
+    # --------------------------
+    # JOURNAL
+    # --------------------------
+    @staticmethod
+    def _journal_paths(path: Path) -> list[Path]:
+        """The journal files of every process: `path`, then `<stem>.1<suffix>`, `<stem>.2<suffix>`, ..."""
+        slot = re.compile(rf"{re.escape(path.stem)}\.(\d+){re.escape(path.suffix)}")
+        slots = {int(m.group(1)): p for p in path.parent.iterdir() if (m := slot.fullmatch(p.name))}
+        return [path, *(slots[n] for n in sorted(slots))]
+
+    @classmethod
+    def _open_journal(cls, path: Path):
+        """Open (append mode) and lock the first journal no other running process holds."""
+        slot = 0
+        while True:
+            candidate = path if slot == 0 else path.with_name(f"{path.stem}.{slot}{path.suffix}")
+            journal = open(candidate, "a+", encoding="utf-8")
+            if _try_lock(journal):
+                return journal
+            journal.close()
+            slot += 1
+
+    @classmethod
+    def _adopt_orphans(cls, path: Path, known: set[str]) -> list[dict]:
+        """Move the uncommitted memories of journals left by dead processes into ours. Caller holds the lock."""
+        adopted = []
+        for orphan_path in cls._journal_paths(path):
+            if orphan_path.resolve() == Path(cls._journal.name).resolve() or not orphan_path.exists():
+                continue
+            with open(orphan_path, "a+", encoding="utf-8") as orphan:
+                if not _try_lock(orphan):
+                    continue  # journal of a running process
+                memories = [m for m in cls._replay(orphan) if m["id"] not in known]
+                # Durable in our journal before the orphan is emptied
+                for memory in memories:
+                    cls._append({"op": "put", "memory": memory})
+                    known.add(memory["id"])
+                orphan.seek(0)
+                orphan.truncate()
+            if memories:
+                logger.info(f"Adopted {len(memories)} uncommitted long-term memories from {orphan_path}")
+            adopted += memories
+        return adopted
+
+    @staticmethod
+    def _replay(journal) -> list[dict]:
+        """Return the journaled memories that were neither committed nor dead-lettered, in journal order."""
+        journal.seek(0)
+        text = journal.read()
+        if text and not text.endswith("\n"):
+            # A torn last line from a crash in the middle of an append: keep the next appends on their own line
+            journal.write("\n")
+        pending: dict[str, dict] = {}
+        for line in text.splitlines():
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning("Skipping unreadable memory journal entry")
+                continue
+            if entry.get("op") == "put":
+                pending[entry["memory"]["id"]] = entry["memory"]
+            elif entry.get("op") in ("commit", "dead"):
+                for memory_id in entry["ids"]:
+                    pending.pop(memory_id, None)
+        return list(pending.values())
+
+    @classmethod
+    def _append(cls, entry: dict) -> None:
+        """Append one entry to the journal. Caller holds the lock."""
+        cls._journal.write(json.dumps(entry) + "\n")
+        cls._journal.flush()
+        if int(Settings.MEMORY_JOURNAL_FSYNC):
+            os.fsync(cls._journal.fileno())
+
+    @classmethod
+    def _compact(cls) -> None:
+        """Empty the journal once everything in it is committed. Caller holds the lock (the file lock is ours)."""
+        if not cls._inflight:
+            cls._journal.seek(0)
+            cls._journal.truncate()
+
+    # --------------------------
+    # PRODUCER / READER
+    # --------------------------
+    @classmethod
+    def enqueue(cls, content: str, metadata: dict, collection_name: str = "agent_memories", thread_id: Optional[str] = None) -> str:
+        """Journal a memory and queue it for writing. Returns its id as soon as it is durable in the journal."""
+        cls.start()
+        memory = {
+            "id": str(uuid.uuid4()),
+            "collection": collection_name,
+            "content": content,
+            "metadata": metadata,
+            "thread_id": thread_id,
+        }
+        with cls._cond:
+            cls._append({"op": "put", "memory": memory})
+            cls._queue.append(memory)
+            cls._inflight[memory["id"]] = memory
+            cls.stats["enqueued"] += 1
+            cls._cond.notify_all()
+        return memory["id"]
+
+    @classmethod
+    def pending(cls, thread_id: Optional[str], collection_name: str = "agent_memories") -> list[dict]:
+        """Memories of a thread not committed yet."""
+        with cls._cond:
+            return [
+                m for m in cls._inflight.values()
+                if m["thread_id"] == thread_id and m["collection"] == collection_name
+            ]
+
+    @classmethod
+    def wait_for(cls, thread_id: Optional[str], collection_name: str = "agent_memories", timeout: float = Settings.MEMORY_READ_WAIT) -> bool:
+        """Flush and wait until the thread's pending memories are committed. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        with cls._cond:
+            ids = [
+                memory_id for memory_id, m in cls._inflight.items()
+                if m["thread_id"] == thread_id and m["collection"] == collection_name
+            ]
+            if not ids:
+                return True
+            cls._flush_requested = True
+            cls._cond.notify_all()
+            while any(memory_id in cls._inflight for memory_id in ids):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                cls._cond.wait(remaining)
+        return True
+
+    # --------------------------
+    # WORKER
+    # --------------------------
+    @classmethod
+    def _run(cls) -> None:
+        backoff = Settings.MEMORY_WRITE_FLUSH_INTERVAL
+        while True:
+            with cls._cond:
+                while not cls._queue and not cls._stop:
+                    cls._cond.wait()
+                if not cls._queue:
+                    return
+                # Give the batch a moment to fill up, unless a reader or shutdown is waiting
+                deadline = time.monotonic() + Settings.MEMORY_WRITE_FLUSH_INTERVAL
+                while len(cls._queue) < Settings.MEMORY_WRITE_BATCH_SIZE and not (cls._flush_requested or cls._stop):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    cls._cond.wait(remaining)
+                batch = cls._queue[: Settings.MEMORY_WRITE_BATCH_SIZE]
+                del cls._queue[: Settings.MEMORY_WRITE_BATCH_SIZE]
+                if not cls._queue:
+                    cls._flush_requested = False
+
+            try:
+                cls._write_batch(batch)
+            except Exception as e:
+                with cls._cond:
+                    cls.stats["failures"] += 1
+                if isinstance(e, TRANSIENT_ERRORS):
+                    logger.warning(f"Long-term memory store unavailable, {len(batch)} memories kept in the journal, retrying in {backoff:.1f}s: {e}")
+                    with cls._cond:
+                        cls._queue[:0] = batch
+                    retry = True
+                else:
+                    logger.error(f"Long-term memory write of {len(batch)} memories failed: {e}")
+                    retry = cls._retry_one_by_one(batch, e)
+                if retry:
+                    with cls._cond:
+                        if cls._stop:
+                            return  # left in the journal for the next start
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, MAX_BACKOFF)
+                continue
+
+            backoff = Settings.MEMORY_WRITE_FLUSH_INTERVAL
+            cls._commit(batch)
+
+    @classmethod
+    def _commit(cls, memories: list[dict]) -> None:
+        with cls._cond:
+            ids = [m["id"] for m in memories]
+            cls._append({"op": "commit", "ids": ids})
+            for memory_id in ids:
+                cls._inflight.pop(memory_id, None)
+                cls._attempts.pop(memory_id, None)
+            cls.stats["committed"] += len(ids)
+            cls.stats["batches"] += 1
+            cls._compact()
+            cls._cond.notify_all()
+
+    @classmethod
+    def _retry_one_by_one(cls, batch: list[dict], error: Exception) -> bool:
+        """Write the memories of a failed batch individually. Returns True if any of them must be retried."""
+        failed = False
+        for memory in batch:
+            if len(batch) > 1:
+                try:
+                    cls._write_batch([memory])
+                except Exception as e:
+                    error = e
+                else:
+                    cls._commit([memory])
+                    continue
+            failed = True
+            cls._record_failure(memory, error)
+        return failed
+
+    @classmethod
+    def _record_failure(cls, memory: dict, error: Exception) -> None:
+        """Requeue a memory that failed to write (behind the others), or dead-letter it after too many attempts."""
+        with cls._cond:
+            if isinstance(error, TRANSIENT_ERRORS):
+                # Not the memory's fault: does not count as an attempt
+                cls._queue.append(memory)
+                return
+            attempts = cls._attempts.get(memory["id"], 0) + 1
+            if attempts < Settings.MEMORY_WRITE_MAX_ATTEMPTS:
+                cls._attempts[memory["id"]] = attempts
+                cls._queue.append(memory)
+                return
+
+            logger.error(
+                f"Dead-lettering long-term memory {memory['id']} after {attempts} failed writes "
+                f"(see {cls._dead_letter_path}): {error}"
+            )
+            try:
+                with open(cls._dead_letter_path, "a", encoding="utf-8") as dead_letters:
+                    dead_letters.write(json.dumps({"memory": memory, "attempts": attempts, "error": str(error)}) + "\n")
+            except OSError as e:
+                logger.error(f"Could not write the memory dead-letter file: {e}")
+            cls._append({"op": "dead", "ids": [memory["id"]]})
+            cls._inflight.pop(memory["id"], None)
+            cls._attempts.pop(memory["id"], None)
+            cls.stats["dead_lettered"] += 1
+            cls._compact()
+            cls._cond.notify_all()
+
+    @classmethod
+    @Metrics.timed("memory", "write_batch")
+    def _write_batch(cls, batch: list[dict]) -> None:
+        """Embed and upsert a batch, one bulk request per collection."""
+        collections: dict[str, list[dict]] = {}
+        for memory in batch:
+            collections.setdefault(memory["collection"], []).append(memory)
+        for collection_name, memories in collections.items():
+            VectorStoreRegistry.get_store(collection_name=collection_name).save_many(
+                contents=[m["content"] for m in memories],
+                metadatas=[m["metadata"] for m in memories],
+                ids=[m["id"] for m in memories],
+                require_embeddings=True,  # while Ollama is down, wait instead of writing mismatched default embeddings
+            )
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        with cls._cond:
+            return {**cls.stats, "pending": len(cls._inflight)}
+
+
+Metrics.register_collector("memory_write_queue", MemoryWriteQueue.get_stats)
@@ -0,0 +1,178 @@
+"""
+Production SQLite checkpointer for the agent graph.
+
+- WAL journal mode with synchronous=NORMAL.
+- A single writer connection guarded by the saver lock, and a pool of read-only
+  connections so concurrent conversations read checkpoints without waiting on it.
+- Periodic pruning of old checkpoints per thread plus incremental vacuum, so the
+  database does not grow unbounded.
+"""
+
+import asyncio
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from config import Settings
+
+logger = logging.getLogger(__name__)
+
+
+class PooledSqliteSaver(SqliteSaver):
+    """SqliteSaver with a dedicated writer connection, a read-only reader pool and pruning."""
+
+    def __init__(
+        self,
+        db_path: str,
+        keep_last: int = Settings.CHECKPOINT_KEEP_LAST,
+        prune_interval: float = Settings.CHECKPOINT_PRUNE_INTERVAL,
+        busy_timeout_ms: int = 5000,
+    ):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        self.keep_last = keep_last
+        self.busy_timeout_ms = busy_timeout_ms
+
+        # Writer: the only connection that modifies the database
+        writer = sqlite3.connect(db_path, check_same_thread=False)
+        writer.execute("PRAGMA auto_vacuum=INCREMENTAL")  # only effective on a new database
+        writer.execute("PRAGMA journal_mode=WAL")
+        writer.execute("PRAGMA synchronous=NORMAL")
+        writer.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+        super().__init__(writer)
+
+        # Readers: opened on demand, returned to the pool after each read
+        self._readers: queue.SimpleQueue[sqlite3.Connection] = queue.SimpleQueue()
+        self._all_readers: list[sqlite3.Connection] = []
+
+        # Periodic pruning
+        self._stop = threading.Event()
+        self._pruner = None
+        if prune_interval > 0 and keep_last > 0:
+            self._pruner = threading.Thread(
+                target=self._prune_loop, args=(prune_interval,), name="checkpoint-pruner", daemon=True
+            )
+            self._pruner.start()
+
+        atexit.register(self.close)
+
+    # --------------------------
+    # CONNECTIONS
+    # --------------------------
+    def _new_reader(self) -> sqlite3.Connection:
+        reader = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+        reader.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+        self._all_readers.append(reader)
+        return reader
+
+    @contextmanager
+    def cursor(self, transaction: bool = True) -> Iterator[sqlite3.Cursor]:
+        """Writes go through the locked writer connection, reads through a pooled reader."""
+        if transaction:
+            with super().cursor(transaction=True) as cur:
+                yield cur
+            return
+
+        if not self.is_setup:
+            with self.lock:
+                self.setup()
+
+        try:
+            reader = self._readers.get_nowait()
+        except queue.Empty:
+            reader = self._new_reader()
+        cur = reader.cursor()
+        try:
+            yield cur
+        finally:
+            cur.close()
+            self._readers.put(reader)
+
+    # --------------------------
+    # PRUNING
+    # --------------------------
+    def prune(self, keep_last: int | None = None) -> int:
+        """Keep only the latest `keep_last` checkpoints of every thread. Returns the number deleted."""
+        keep_last = keep_last or self.keep_last
+        with self.cursor() as cur:
+            cur.execute(
+                """
+                DELETE FROM checkpoints WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, ROW_NUMBER() OVER (
+                            PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+                        ) AS rn
+                        FROM checkpoints
+                    ) WHERE rn > ?
+                )
+                """,
+                (keep_last,),
+            )
+            deleted = cur.rowcount
+            if deleted:
+                cur.execute(
+                    """
+                    DELETE FROM writes WHERE NOT EXISTS (
+                        SELECT 1 FROM checkpoints c
+                        WHERE c.thread_id = writes.thread_id
+                          AND c.checkpoint_ns = writes.checkpoint_ns
+                          AND c.checkpoint_id = writes.checkpoint_id
+                    )
+                    """
+                )
+        if deleted:
+            self.compact()
+            logger.info(f"Checkpointer pruned {deleted} old checkpoints")
+        return deleted
+
+    def compact(self) -> None:
+        """Return freed pages to the OS and truncate the WAL file."""
+        with self.lock:
+            self.conn.execute("PRAGMA incremental_vacuum")
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def _prune_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.prune()
+            except Exception as e:
+                logger.error(f"Checkpoint pruning failed: {e}")
+
+    def close(self) -> None:
+        """Stop the pruner and close every connection."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        for reader in self._all_readers:
+            reader.close()
+        with self.lock:
+            self.conn.close()
+
+    # --------------------------
+    # ASYNC (run the sync implementation in a worker thread)
+    # --------------------------
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
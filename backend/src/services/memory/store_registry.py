@@ -0,0 +1,77 @@
+"""
+Process-wide registry of vector memory stores.
+
+Tools used to build a new ChromaVectorMemoryStore on every call, reopening the
+persistent client and probing Ollama each time. The registry builds each store
+lazily on first use and shares it (and its client) for the life of the process.
+"""
+
+import logging
+import threading
+from pathlib import Path
+
+import chromadb
+from termcolor import cprint
+
+from config import Settings
+from services.memory.chromadb_store import ChromaVectorMemoryStore, OllamaHealth
+
+logger = logging.getLogger(__name__)
+
+
+class VectorStoreRegistry:
+    """Lazily initialized ChromaVectorMemoryStore instances keyed by (path, collection)."""
+
+    _stores: dict[tuple[str, str], ChromaVectorMemoryStore] = {}
+    _clients: dict[str, "chromadb.ClientAPI"] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_store(cls, collection_name: str = "agent_memories", path: str = Settings.MEM_STORES_PATH) -> ChromaVectorMemoryStore:
+        """Return the shared store for a collection, creating it on first use."""
+        key = (str(Path(path).resolve()), collection_name)
+
+        store = cls._stores.get(key)
+        # A store built while Ollama was down uses Chroma's default embeddings. Rebuild it once Ollama is back.
+        if store is not None and (store.use_ollama or not OllamaHealth.is_available()):
+            return store
+
+        with cls._lock:
+            store = cls._stores.get(key)
+            if store is not None and (store.use_ollama or not OllamaHealth.is_available()):
+                return store
+
+            store = ChromaVectorMemoryStore(
+                collection_name=collection_name,
+                reset_on_init=False,
+                path=path,
+                client=cls._get_client(path),
+            )
+            cls._stores[key] = store
+            logger.info(f"Vector store registered: {key}")
+            return store
+
+    @classmethod
+    def _get_client(cls, path: str):
+        """Return one PersistentClient per storage path."""
+        client_path = Path(path + "chromadb_store")
+        client_key = str(client_path.resolve())
+        if client_key not in cls._clients:
+            client_path.mkdir(parents=True, exist_ok=True)
+            cls._clients[client_key] = chromadb.PersistentClient(
+                path=client_path, settings=chromadb.config.Settings(allow_reset=True)
+            )
+        return cls._clients[client_key]
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """Drop every store and release the underlying Chroma clients."""
+        with cls._lock:
+            cls._stores.clear()
+            cls._clients.clear()
+            try:
+                chromadb.api.client.SharedSystemClient.clear_system_cache()
+            except Exception as e:
+                logger.warning(f"Failed to clear Chroma system cache: {e}")
+            OllamaHealth.reset()
+        cprint("Vector store registry shut down.", "yellow")
@@ -1,4 +1,6 @@
 from .neo4j_service import Neo4jService
+from .cypher_cache import CypherCache
+from .query_registry import QueryRegistry
 from .prompts import CYPHER_GENERATION_PROMPT, CYPHER_GENERATION_TEMPLATE
 
-__all__ = ["Neo4jService", "CYPHER_GENERATION_PROMPT", "CYPHER_GENERATION_TEMPLATE"]
+__all__ = ["Neo4jService", "CypherCache", "QueryRegistry", "CYPHER_GENERATION_PROMPT", "CYPHER_GENERATION_TEMPLATE"]
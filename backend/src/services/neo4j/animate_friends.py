@@ -1,55 +1,100 @@
-import random
 import time
+
+import numpy as np
+from termcolor import cprint
+
+from config import Settings
 from services.neo4j import Neo4jService
+from services.neo4j.query_registry import QueryRegistry
+
+R = 6378137.0  # Earth's radius in meters
+
+GET_PEOPLE_QUERY = """
+MATCH (p:Person)
+WHERE p.location IS NOT NULL
+RETURN p.uuid AS uuid, p.location.latitude AS lat, p.location.longitude AS lon
+"""
+
+# One round trip per chunk: the new positions are computed client side.
+# Stamped with a new map version so map clients only fetch the people that moved.
+UPDATE_QUERY = QueryRegistry.template("set_locations", label="Person")
+
 
-def move_all_people_randomly(n_iterations, max_distance_meters=100):
+def random_offsets(lat: np.ndarray, lon: np.ndarray, max_distance_meters: float, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Move every position by a random offset of up to `max_distance_meters` east/west and north/south.
+    Returns the new (lat, lon) arrays.
+    """
+    dx = rng.uniform(-max_distance_meters, max_distance_meters, size=lat.shape)
+    dy = rng.uniform(-max_distance_meters, max_distance_meters, size=lat.shape)
+    new_lat = lat + np.degrees(dy / R)
+    new_lon = lon + np.degrees(dx / (R * np.cos(np.radians(lat))))
+    return new_lat, new_lon
+
+
+def move_all_people_randomly(
+    n_iterations,
+    max_distance_meters=100,
+    tick_seconds: float = Settings.ANIMATE_TICK_SECONDS,
+    chunk_size: int = Settings.NEO4J_BULK_CHUNK_SIZE,
+    seed: int | None = None,
+):
     """
     Move all people randomly for N iterations.
-    
+
+    Positions are read once and then kept in memory: every tick, the offsets of all people are
+    generated at once with NumPy and written back with one UNWIND query per chunk.
+
     Args:
         n_iterations: Number of times to move each person
         max_distance_meters: Maximum distance to move in any direction per iteration
+        tick_seconds: Time between the start of two iterations (the write time is included)
+        chunk_size: People updated per write transaction
+        seed: Seed of the random generator, for reproducible runs
     """
-    R = 6378137.0  # Earth's radius in meters
-    
-    # Get all person UUIDs
-    get_people_query = "MATCH (p:Person) RETURN p.uuid AS uuid"
-    people = Neo4jService.get_graph().query(get_people_query)
-    person_uuids = [person['uuid'] for person in people]
-    
-    print(f"Moving {len(person_uuids)} people for {n_iterations} iterations...")
-    
-    # Update query
-    update_query = """
-    MATCH (p:Person {uuid: $uuid})
-    WITH p, 
-         p.location.latitude AS lat,
-         p.location.longitude AS lon
-    SET p.location = point({
-        latitude: lat + degrees($dy / $R),
-        longitude: lon + degrees($dx / ($R * cos(radians(lat))))
-    })
-    RETURN p.location
-    """
-    
+    if not Neo4jService._initialized:
+        Neo4jService.initialize()
+    graph = Neo4jService.get_graph()
+    rng = np.random.default_rng(seed)
+
+    people = graph.query(GET_PEOPLE_QUERY)
+    uuids = [person["uuid"] for person in people]
+    lat = np.array([person["lat"] for person in people], dtype=np.float64)
+    lon = np.array([person["lon"] for person in people], dtype=np.float64)
+
+    print(f"Moving {len(uuids)} people for {n_iterations} iterations (tick {tick_seconds}s, chunks of {chunk_size})...")
+
+    total_updates = 0
+    total_write_time = 0.0
     for iteration in range(n_iterations):
-        print(f"Iteration {iteration + 1}/{n_iterations}")
-        for person_uuid in person_uuids:
-            # Generate random offset
-            dx = random.uniform(-max_distance_meters, max_distance_meters)
-            dy = random.uniform(-max_distance_meters, max_distance_meters)
-            
-            # Update location
-            Neo4jService.get_graph().query(
-                update_query, 
-                params={'uuid': person_uuid, 'dx': dx, 'dy': dy, 'R': R}
-            )
-        
-        time.sleep(2)
-    
-    print(f"Completed {n_iterations} iterations for {len(person_uuids)} people")
+        tick_started = time.perf_counter()
+        lat, lon = random_offsets(lat, lon, max_distance_meters, rng)
+
+        lat_list, lon_list = lat.tolist(), lon.tolist()
+        for i in range(0, len(uuids), chunk_size):
+            rows = [
+                {"uuid": u, "lat": la, "lon": lo}
+                for u, la, lo in zip(uuids[i:i + chunk_size], lat_list[i:i + chunk_size], lon_list[i:i + chunk_size])
+            ]
+            QueryRegistry.run(UPDATE_QUERY, {"rows": rows})
+
+        elapsed = time.perf_counter() - tick_started
+        total_updates += len(uuids)
+        total_write_time += elapsed
+        print(f"Iteration {iteration + 1}/{n_iterations}: {len(uuids)} updates in {elapsed:.3f}s ({len(uuids) / max(elapsed, 1e-9):.0f} updates/s)")
+
+        # Fixed tick rate: only sleep for what is left of the tick
+        if iteration < n_iterations - 1:
+            time.sleep(max(0.0, tick_seconds - elapsed))
+
+    cprint(
+        f"Completed {n_iterations} iterations for {len(uuids)} people: "
+        f"{total_updates / max(total_write_time, 1e-9):.0f} updates/s while writing",
+        "green",
+    )
+
 
 if __name__ == "__main__":
     # Example usage:
     Neo4jService.initialize()
-    move_all_people_randomly(n_iterations=100, max_distance_meters=300)
\ No newline at end of file
+    move_all_people_randomly(n_iterations=100, max_distance_meters=300)
@@ -0,0 +1,232 @@
+"""
+Semantic cache for text-to-Cypher generation.
+
+Stores the Cypher generated (and successfully executed) for a question, keyed by the
+question embedding. A new question whose embedding is similar enough to a cached one
+reuses its Cypher instead of paying a full LLM generation call.
+"""
+
+# === Dependencies
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+# === Local settings
+from config import Settings
+from helpers.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+# Values hard-coded in generated Cypher: string literals ({name:"Marta"} or 'Iria'), numbers
+# (p.age > 30, LIMIT 5) and bare identifiers compared or mapped as values (p.city = Madrid).
+# Strings come first in the alternation so nothing inside them is read as a number or identifier.
+_CYPHER_LITERAL = re.compile(
+    r"\"(?P<dq>[^\"]*)\"|'(?P<sq>[^']*)'"
+    r"|(?<![\w.$])(?P<num>-?\d+(?:\.\d+)?)(?![\w.])"
+    r"|(?:[=<>]|[{,]\s*\w+\s*:)\s*(?P<ident>[A-Za-z_]\w*)\b(?!\s*[.(\[])"
+)
+_CYPHER_KEYWORDS = {"true", "false", "null", "not", "and", "or", "xor", "in", "is", "starts", "ends", "contains"}
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_CYPHER_STRING = re.compile(r"\"[^\"]*\"|'[^']*'")
+# Labels of node patterns (p:Person) and types of relationship patterns [r:KNOWS|LIKES]
+_CYPHER_SCHEMA_NAME = re.compile(
+    r"(?P<open>[(\[])\s*`?\w*`?\s*:(?P<names>\s*`?\w+`?(?:\s*[|&:]\s*`?\w+`?)*)"
+)
+_NAME_WORD = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])")
+# Word forms the suffix stripping of _stem does not cover. "who" asks for people, so it names the Person label.
+_STEMS = {"people": "person", "who": "person", "whom": "person", "whose": "person", "knew": "know", "known": "know"}
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _literals(cypher: str) -> list[tuple[str, str]]:
+    """(kind, value) of every value hard-coded in a Cypher query."""
+    literals = []
+    for match in _CYPHER_LITERAL.finditer(cypher):
+        kind = match.lastgroup
+        value = match.group(kind)
+        if not value or (kind == "ident" and value.lower() in _CYPHER_KEYWORDS):
+            continue
+        literals.append(("num" if kind == "num" else "ident" if kind == "ident" else "str", value))
+    return literals
+
+
+def _mentions(question: str, kind: str, value: str) -> bool:
+    """Whether a normalized question mentions a literal of the cached Cypher."""
+    if kind == "num":
+        # Compare numbers as numbers: "30" matches "30" or "30.0", never "300" or "130"
+        return float(value) in {float(n) for n in _NUMBER.findall(question)}
+    if kind == "ident":
+        return re.search(rf"\b{re.escape(value.lower())}\b", question) is not None
+    return value.lower() in question
+
+
+def _stem(word: str) -> str:
+    """Crude singular/base form, enough to match "people" to Person or "knows" to KNOWS."""
+    word = word.lower()
+    if word in _STEMS:
+        return _STEMS[word]
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _schema_names(cypher: str) -> list[tuple[str, set[str]]]:
+    """(kind, word stems) of every node label ("label") and relationship type ("type") in a Cypher query."""
+    names = []
+    for match in _CYPHER_SCHEMA_NAME.finditer(_CYPHER_STRING.sub("''", cypher)):
+        kind = "label" if match.group("open") == "(" else "type"
+        for name in re.split(r"[|&:]", match.group("names")):
+            # WORKS_AT -> {"work"}: short words like "at" or "in" say nothing about the question
+            stems = {_stem(w) for w in _NAME_WORD.findall(name.strip(" `")) if len(w) > 2}
+            if stems and (kind, stems) not in names:
+                names.append((kind, stems))
+    return names
+
+
+def _structure(question: str, names: list[tuple[str, set[str]]], literals: list[tuple[str, str]]) -> tuple[set, set]:
+    """
+    How a normalized question refers to the labels, types and literals of a Cypher query.
+
+    Returns the indexes of the labels/types the question mentions, and for every mentioned
+    relationship type whether each mentioned literal comes before or after it. The word order
+    stands in for the arrow direction: "who does Alice know" puts Alice before "know", "who
+    knows Alice" after it.
+    """
+    words = [_stem(w) for w in re.findall(r"\w+", question)]
+    mentioned = {i for i, (_, stems) in enumerate(names) if stems.intersection(words)}
+    order = set()
+    for i in mentioned:
+        kind, stems = names[i]
+        if kind != "type":
+            continue
+        position = next(p for p, w in enumerate(words) if w in stems)
+        for j, (literal_kind, value) in enumerate(literals):
+            value_words = re.findall(r"\w+", value)
+            if literal_kind == "num" or not value_words or _stem(value_words[0]) not in words:
+                continue
+            order.add((i, j, words.index(_stem(value_words[0])) < position))
+    return mentioned, order
+
+
+class CypherCache:
+    """
+    LRU + TTL cache of question -> validated Cypher, matched by embedding similarity.
+
+    Entries are bound to the schema fingerprint they were generated for; the whole cache
+    is dropped as soon as a different fingerprint is seen.
+    """
+
+    def __init__(
+        self,
+        max_size: int = Settings.CYPHER_CACHE_SIZE,
+        ttl: float = Settings.CYPHER_CACHE_TTL,
+        threshold: float = Settings.CYPHER_CACHE_THRESHOLD,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._schema_fingerprint: Optional[str] = None
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+
+    def _check_schema(self, schema_fingerprint: str) -> None:
+        if self._schema_fingerprint != schema_fingerprint:
+            if self._entries:
+                logger.info("Cypher cache invalidated: graph schema changed")
+                self.stats["invalidations"] += 1
+            self._entries.clear()
+            self._schema_fingerprint = schema_fingerprint
+
+    def _expire(self) -> None:
+        if self.ttl <= 0:
+            return
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items() if now - e["created_at"] > self.ttl]:
+            del self._entries[key]
+            self.stats["evictions"] += 1
+
+    def lookup(self, question: str, embedding: Optional[list[float]], schema_fingerprint: str) -> Optional[str]:
+        """Return the cached Cypher for a similar question, or None on a miss."""
+        with self._lock:
+            self._check_schema(schema_fingerprint)
+            self._expire()
+
+            key = _normalize(question)
+            entry = self._entries.get(key)
+
+            # Semantic match: cosine similarity against every cached question at once
+            if entry is None and embedding is not None and self._entries:
+                keys = list(self._entries.keys())
+                matrix = np.stack([self._entries[k]["embedding"] for k in keys])
+                query = np.asarray(embedding, dtype="float32")
+                query = query / (np.linalg.norm(query) or 1.0)
+                similarities = matrix @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    candidate = self._entries[keys[best]]
+                    # The cached Cypher must not hard-code a value the new question does not mention
+                    # ("who does Alice know?" must not reuse the Cypher for Bob, "older than 40" the one for 30)
+                    if all(_mentions(key, kind, value) for kind, value in candidate["literals"]):
+                        # ...nor answer about other labels or the other direction of a relationship
+                        # ("companies in Madrid" vs "people in Madrid", "who knows Alice" vs "who does Alice know")
+                        mentioned, order = _structure(key, candidate["names"], candidate["literals"])
+                        if candidate["mentioned"] <= mentioned and candidate["order"] <= order:
+                            entry, key = candidate, keys[best]
+
+            if entry is None:
+                self.stats["misses"] += 1
+                Metrics.record_cache("cypher", misses=1)
+                return None
+
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            Metrics.record_cache("cypher", hits=1)
+            logger.info(f"Cypher cache hit for question: {question!r} (cached: {entry['question']!r})")
+            return entry["cypher"]
+
+    def store(self, question: str, embedding: Optional[list[float]], cypher: str, schema_fingerprint: str) -> None:
+        """Cache the Cypher generated for a question. Call only after it executed successfully."""
+        if embedding is None or not cypher:
+            return
+        vec = np.asarray(embedding, dtype="float32")
+        vec = vec / (np.linalg.norm(vec) or 1.0)
+        literals = _literals(cypher)
+        names = _schema_names(cypher)
+        key = _normalize(question)
+        mentioned, order = _structure(key, names, literals)
+
+        with self._lock:
+            self._check_schema(schema_fingerprint)
+            self._entries[key] = {
+                "question": question,
+                "embedding": vec,
+                "cypher": cypher,
+                "literals": literals,
+                "names": names,
+                "mentioned": mentioned,
+                "order": order,
+                "created_at": time.monotonic(),
+            }
+            self._entries.move_to_end(key)
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "size": len(self._entries)}
@@ -1,17 +1,25 @@
 # === Dependencies
 import asyncio
+import hashlib
 import logging
+import threading
+import time
 import traceback
+import weakref
+from contextlib import contextmanager
 from typing import Literal, Optional, Dict, Any
 from termcolor import cprint
 from pprint import pprint
 
 # === Neo4j / LangChain
 from langchain_neo4j import GraphCypherQAChain, Neo4jGraph
+from neo4j import AsyncDriver, AsyncGraphDatabase, Driver, GraphDatabase
 
 # === Local helpers
 from services.neo4j.prompts import CYPHER_GENERATION_PROMPT
-from helpers import helper_ollama
+from services.neo4j.cypher_cache import CypherCache
+from services.neo4j.query_registry import MAP_VERSION_LABEL, QueryRegistry, QueryTemplate
+from helpers import Metrics, helper_ollama
 
 # === Local settings
 from config import Settings
@@ -25,9 +33,31 @@ logger = logging.getLogger(__name__)
 NEO4J_URI = Settings.NEO4J_URI
 NEO4J_USER = Settings.NEO4J_USER
 NEO4J_PASSWORD = Settings.NEO4J_PASSWORD
+NEO4J_DATABASE = Settings.NEO4J_DATABASE
 EMB_PROPERTY =Settings.EMB_PROPERTY
 EMB_DIMENSION = Settings.EMB_DIMENSION
 EMB_SIMILARITY =Settings.EMB_SIMILARITY
+EMB_BATCH_SIZE = Settings.EMB_BATCH_SIZE
+NEO4J_BULK_CHUNK_SIZE = Settings.NEO4J_BULK_CHUNK_SIZE
+NEO4J_SCHEMA_TTL = Settings.NEO4J_SCHEMA_TTL
+CYPHER_CACHE_ENABLED = bool(int(Settings.CYPHER_CACHE_ENABLED))
+
+LOCATION_PROPERTY = "location"
+VECTOR_SIMILARITIES = ("cosine", "euclidean")
+
+# Columns of the map queries, turned into GeoJSON by _node_feature / _edge_feature
+MAP_NODE_COLUMNS = """
+RETURN n.uuid AS id, n.name AS name, labels(n) AS labels,
+    n.location.latitude AS lat, n.location.longitude AS lon,
+    coalesce(n.map_version, 0) AS version
+"""
+MAP_EDGE_COLUMNS = """
+RETURN elementId(r) AS id, a.uuid AS src_id, b.uuid AS dst_id, type(r) AS rel_type,
+    a.name AS src_name, b.name AS dst_name,
+    a.location.latitude AS a_lat, a.location.longitude AS a_lon,
+    b.location.latitude AS b_lat, b.location.longitude AS b_lon,
+    apoc.coll.max([coalesce(a.map_version, 0), coalesce(b.map_version, 0), coalesce(r.map_version, 0)]) AS version
+"""
 
 
 # -----------------------------------------------------------------------------
@@ -39,8 +69,33 @@ class Neo4jService:
 
     _initialized = False
     _graph: Neo4jGraph = None
+    _driver: Driver = None  # our own driver for the registry templates and the map reads
     _cypherChain: GraphCypherQAChain = None
     _llm: Any = None
+    _deferred_vectorization: Optional[dict] = None  # pending vectorize_property calls while deferred
+
+    # Cypher chain / schema cache
+    _schema_dirty: bool = True
+    _schema_refreshed_at: float = 0.0
+    _known_schema: Dict[tuple, set] = {}  # ("node", label) / ("relationship", type) -> property keys written so far
+    _chain_lock = threading.Lock()
+    _chain_cache_stats: Dict[str, int] = {"hits": 0, "misses": 0, "invalidations": 0}
+    _schema_fingerprint: str = ""
+
+    # Labels known to have a point index on their location
+    _point_indexed: set = set()
+    _located_labels: Optional[tuple[float, list[str]]] = None  # (read at, labels) of located_labels()
+    # Relationship types with a range index on map_version (stamped relationships between located labels)
+    _map_indexed_types: set = set()
+    _map_types: Optional[tuple[float, list[str]]] = None  # (read at, types) of map_relationship_types()
+    _cypher_cache: CypherCache = CypherCache()
+
+    # Last map snapshot, moved forward with deltas (see get_map_changes)
+    _map_snapshot: Optional[dict] = None
+    _map_lock = threading.Lock()
+
+    # Async driver, one per event loop and dropped with it (used by the a* methods)
+    _async_drivers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncDriver]" = weakref.WeakKeyDictionary()
 
     @classmethod
     def initialize(cls):
@@ -55,7 +110,10 @@ class Neo4jService:
                 url=NEO4J_URI,
                 username=NEO4J_USER,
                 password=NEO4J_PASSWORD,
+                database=NEO4J_DATABASE,
             )
+            cls._driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+            QueryRegistry.bind(cls._driver, NEO4J_DATABASE)
             cls._initialized = True
             cls.reset_graph()
 
@@ -66,24 +124,204 @@ class Neo4jService:
 
     @classmethod
     def get_cypher_chain(cls) -> GraphCypherQAChain:
-        """Get the Cypher QA chain for querying the Neo4j graph."""
+        """
+        Get the Cypher QA chain for querying the Neo4j graph.
+        
+        The chain and the graph schema it was built with are cached. Schema introspection only
+        runs again after invalidate_schema() (called by the schema commands, and by writes that
+        introduce a label, relationship type or property key) or once the cached schema is older
+        than Settings.NEO4J_SCHEMA_TTL seconds.
+        """
         if not cls._llm:
             raise ValueError("LLM not set for Cypher QA chain")
-        cls.get_graph().refresh_schema()
-        cls._cypherChain = GraphCypherQAChain.from_llm(
-            cls._llm,
-            graph=cls.get_graph(),
-            verbose=True,
-            cypher_prompt=CYPHER_GENERATION_PROMPT,
-            allow_dangerous_requests=True,
-            return_direct=True,
-            top_k=100,
-            return_intermediate_steps=False,
-        )
-        print("schema:", cls._cypherChain.graph_schema)
+
+        if cls._chain_is_fresh():
+            cls._chain_cache_stats["hits"] += 1
+            logger.debug(f"NEO4J: Cypher chain cache hit ({cls._chain_cache_stats})")
+            return cls._cypherChain
+
+        with cls._chain_lock:
+            # Another thread may have rebuilt the chain while we waited for the lock
+            if cls._chain_is_fresh():
+                cls._chain_cache_stats["hits"] += 1
+                return cls._cypherChain
+
+            cls._chain_cache_stats["misses"] += 1
+            # Clear the flag before introspecting so an invalidation racing with the refresh is kept
+            cls._schema_dirty = False
+            try:
+                cls.get_graph().refresh_schema()
+            except Exception:
+                cls._schema_dirty = True
+                raise
+            cls._schema_refreshed_at = time.monotonic()
+            cls._cypherChain = GraphCypherQAChain.from_llm(
+                cls._llm,
+                graph=cls.get_graph(),
+                verbose=True,
+                cypher_prompt=CYPHER_GENERATION_PROMPT,
+                allow_dangerous_requests=True,
+                return_direct=True,
+                top_k=100,
+                return_intermediate_steps=True,  # exposes the generated Cypher for the Cypher cache
+                exclude_types=[MAP_VERSION_LABEL],
+            )
+            cls._schema_fingerprint = hashlib.sha256(cls._cypherChain.graph_schema.encode("utf-8")).hexdigest()
+            print("schema:", cls._cypherChain.graph_schema)
 
         return cls._cypherChain
 
+    @classmethod
+    def _chain_is_fresh(cls) -> bool:
+        """Whether the cached chain can be reused without refreshing the schema."""
+        if cls._cypherChain is None or cls._schema_dirty:
+            return False
+        if NEO4J_SCHEMA_TTL > 0 and time.monotonic() - cls._schema_refreshed_at > NEO4J_SCHEMA_TTL:
+            return False
+        return True
+
+    @classmethod
+    def invalidate_schema(cls) -> None:
+        """Mark the cached schema (and the Cypher chain built on it) as stale."""
+        if not cls._schema_dirty:
+            cls._chain_cache_stats["invalidations"] += 1
+        cls._schema_dirty = True
+
+    @classmethod
+    def _note_schema(cls, element: Literal["node", "relationship"], name: str, properties) -> None:
+        """
+        Invalidate the schema only when a write introduces a label, relationship type or property key
+        not written before by this process. Other schema drift is picked up by the TTL.
+        """
+        known = cls._known_schema.get((element, name))
+        properties = set(properties)
+        if known is None or not properties <= known:
+            cls._known_schema[(element, name)] = (known or set()) | properties
+            cls.invalidate_schema()
+
+    @classmethod
+    def get_chain_cache_stats(cls) -> Dict[str, int]:
+        """Return hit/miss/invalidation counters of the Cypher chain cache."""
+        return dict(cls._chain_cache_stats)
+
+    @classmethod
+    @Metrics.timed("neo4j")
+    def query_social_data(cls, question: str) -> Dict[str, Any]:
+        """
+        Answer a natural language question with Cypher generated by the QA chain.
+        
+        The generated Cypher is cached by question embedding (see CypherCache). A similar enough
+        question reuses the cached Cypher and skips the LLM generation call. Only Cypher that
+        executed successfully is cached, and the cache is dropped when the schema fingerprint changes.
+        
+        Returns:
+            {"query": question, "result": list of records} (same shape as the chain output)
+        """
+        chain = cls.get_cypher_chain()  # keeps the schema fingerprint current
+
+        embedding = None
+        if CYPHER_CACHE_ENABLED:
+            try:
+                embedding = helper_ollama.create_embedding(input_text=question)
+            except Exception as e:
+                logger.warning(f"Cypher cache disabled for this question, embedding failed: {e}")
+
+            cypher = cls._cypher_cache.lookup(question, embedding, cls._schema_fingerprint)
+            if cypher is not None:
+                try:
+                    records = cls._graph.query(cypher)[: chain.top_k]
+                    return {"query": question, "result": records}
+                except Exception as e:
+                    logger.warning(f"Cached Cypher failed, regenerating: {e}")
+
+        output = chain.invoke(question)
+        steps = output.pop("intermediate_steps", None) or []
+        generated = next((step["query"] for step in steps if "query" in step), None)
+
+        if CYPHER_CACHE_ENABLED and generated:
+            cls._cypher_cache.store(question, embedding, generated, cls._schema_fingerprint)
+
+        return output
+
+    # --------------------------
+    # ASYNC
+    # --------------------------
+    @classmethod
+    def _get_async_driver(cls) -> AsyncDriver:
+        loop = asyncio.get_running_loop()
+        driver = cls._async_drivers.get(loop)
+        if driver is None:
+            driver = AsyncGraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+            cls._async_drivers[loop] = driver
+        return driver
+
+    @classmethod
+    async def aquery(cls, query: str, params: Optional[dict] = None) -> list[dict]:
+        """Run a read query on the async driver. Returns records as dicts, like Neo4jGraph.query."""
+        async def _read(tx):
+            result = await tx.run(query, params or {})
+            return await result.data()
+
+        async with cls._get_async_driver().session(database=NEO4J_DATABASE) as session:
+            return await session.execute_read(_read)
+
+    @classmethod
+    @Metrics.timed("neo4j")
+    async def aquery_social_data(cls, question: str) -> Dict[str, Any]:
+        """
+        Async variant of query_social_data.
+        
+        The embedding and a cached Cypher are awaited (async HTTP client and async Neo4j driver).
+        On a cache miss the chain runs through ainvoke, exactly like the sync path, and a stale
+        schema is refreshed in a worker thread, so the event loop is never blocked.
+        """
+        chain = cls.get_cypher_chain() if cls._chain_is_fresh() else await asyncio.to_thread(cls.get_cypher_chain)
+
+        embedding = None
+        if CYPHER_CACHE_ENABLED:
+            try:
+                embedding = await helper_ollama.acreate_embedding(input_text=question)
+            except Exception as e:
+                logger.warning(f"Cypher cache disabled for this question, embedding failed: {e}")
+
+            cypher = cls._cypher_cache.lookup(question, embedding, cls._schema_fingerprint)
+            if cypher is not None:
+                try:
+                    records = (await cls.aquery(cypher))[: chain.top_k]
+                    return {"query": question, "result": records}
+                except Exception as e:
+                    logger.warning(f"Cached Cypher failed, regenerating: {e}")
+
+        output = await chain.ainvoke(question)
+        steps = output.pop("intermediate_steps", None) or []
+        generated = next((step["query"] for step in steps if "query" in step), None)
+
+        if CYPHER_CACHE_ENABLED and generated:
+            cls._cypher_cache.store(question, embedding, generated, cls._schema_fingerprint)
+
+        return output
+
+    @classmethod
+    async def aclose(cls) -> None:
+        """Close the async drivers of every event loop."""
+        current = asyncio.get_running_loop()
+        drivers, cls._async_drivers = list(cls._async_drivers.items()), weakref.WeakKeyDictionary()
+        for loop, driver in drivers:
+            try:
+                if loop is current:
+                    await driver.close()
+                elif loop.is_running():
+                    # Bound to another loop: close it there
+                    await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(driver.close(), loop))
+                # A loop that is no longer running took its connections with it
+            except Exception as e:
+                logger.warning(f"Failed to close async Neo4j driver: {e}")
+
+    @classmethod
+    def get_cypher_cache_stats(cls) -> Dict[str, int]:
+        """Return the counters of the generated-Cypher cache."""
+        return cls._cypher_cache.get_stats()
+
     @classmethod
     def get_graph(cls):
         """Get the Neo4j graph instance."""
@@ -97,6 +335,7 @@ class Neo4jService:
         """Set the LLM for the Cypher QA chain."""
         cls._llm = llm
         cls._cypherChain = None
+        cls.invalidate_schema()
         
         
     @classmethod
@@ -105,11 +344,21 @@ class Neo4jService:
         try:
             cls._graph.query("CALL apoc.schema.assert({}, {})")
             cls._graph.query("MATCH (n) DETACH DELETE n")
+            cls._known_schema.clear()
             cprint(f"Graph reset", "green")
             cls.create_constraint("Person", "uuid")
             cls.create_constraint("Company", "uuid")
+            cls.create_constraint(MAP_VERSION_LABEL, "key")
+            cls._point_indexed.clear()  # apoc.schema.assert dropped them
+            cls._located_labels = None
+            cls._map_indexed_types.clear()
+            cls._map_types = None
+            cls.create_point_index("Person")
+            cls.create_point_index("Company")
         except Exception as e:
             cprint(f"An error occurred restoring graph: {e}.", "red")
+        finally:
+            cls.invalidate_schema()
             
     @classmethod
     def show_schema(cls) -> None:
@@ -122,24 +371,163 @@ class Neo4jService:
     def create_constraint(cls, node_label:str="", node_unique_key:str=""):
         
         try:
-            
+            QueryRegistry.check_identifier(node_label)
+            QueryRegistry.check_identifier(node_unique_key)
             constraint_name = node_label.lower() + "_unique"
             query = f"""
             CREATE CONSTRAINT {constraint_name} IF NOT EXISTS
             FOR (p:{node_label}) REQUIRE p.{node_unique_key} IS UNIQUE
             """
             cls._graph.query(query)
+            cls.invalidate_schema()
         
         except Exception as e:
             cprint(f"An error occurred creating constraint: {e}.", "red")    
+
+    @classmethod
+    def create_point_index(cls, node_label: str, property: str = LOCATION_PROPERTY) -> None:
+        """
+        Point index on a label's location, used by nearby() and the viewport queries (idempotent).
+        Also indexes the label's map_version, so the map delta reads of located nodes are index range scans.
+        """
+        try:
+            QueryRegistry.check_identifier(node_label)
+            QueryRegistry.check_identifier(property)
+            index_name = f"{node_label.lower()}_{property}_point"
+            cls._graph.query(f"""
+            CREATE POINT INDEX {index_name} IF NOT EXISTS
+            FOR (n:{node_label}) ON (n.{property})
+            """)
+            cls._graph.query(f"""
+            CREATE INDEX {node_label.lower()}_map_version IF NOT EXISTS
+            FOR (n:{node_label}) ON (n.map_version)
+            """)
+            cls._point_indexed.add(node_label)
+            cls._located_labels = None
+        except Exception as e:
+            cprint(f"An error occurred creating point index: {e}.", "red")
+
+    @classmethod
+    def _ensure_point_index(cls, node_label: str) -> None:
+        if node_label not in cls._point_indexed:
+            cls.create_point_index(node_label)
+
+    @classmethod
+    def located_labels(cls) -> list[str]:
+        """
+        Labels with a point index on their location.
+        Read from the database (indexes created by other processes included) at most every NEO4J_SCHEMA_TTL seconds.
+        """
+        cached = cls._located_labels
+        if cached is not None and (NEO4J_SCHEMA_TTL <= 0 or time.monotonic() - cached[0] < NEO4J_SCHEMA_TTL):
+            return cached[1]
+        if not cls._initialized or not cls._graph:
+            cls.initialize()
+        rows = cls._graph.query(
+            "SHOW POINT INDEXES YIELD entityType, labelsOrTypes, properties "
+            "WHERE entityType = 'NODE' AND properties = [$property] RETURN labelsOrTypes[0] AS label",
+            params={"property": LOCATION_PROPERTY},
+        )
+        labels = sorted(row["label"] for row in rows)
+        cls._point_indexed.update(labels)
+        cls._located_labels = (time.monotonic(), labels)
+        return labels
+
+    @classmethod
+    def create_map_version_index(cls, rel_type: str) -> None:
+        """Range index on a relationship type's map_version, used by the map delta reads (idempotent)."""
+        try:
+            QueryRegistry.check_identifier(rel_type)
+            cls._graph.query(f"""
+            CREATE INDEX {rel_type.lower()}_rel_map_version IF NOT EXISTS
+            FOR ()-[r:{rel_type}]-() ON (r.map_version)
+            """)
+            cls._map_indexed_types.add(rel_type)
+            cls._map_types = None
+        except Exception as e:
+            cprint(f"An error occurred creating map version index: {e}.", "red")
+
+    @classmethod
+    def _ensure_map_version_index(cls, rel_type: str) -> None:
+        if rel_type not in cls._map_indexed_types:
+            cls.create_map_version_index(rel_type)
+
+    @classmethod
+    def _map_tracked(cls, label: str, end_label: Optional[str] = None) -> bool:
+        """
+        Whether writes of `label` nodes (or of relationships from `label` to `end_label` nodes) can show up
+        on the map: only those bump the map version and get stamped, every other write skips the counter node.
+        """
+        labels = cls.located_labels()
+        return label in labels and (end_label is None or end_label in labels)
+
+    @classmethod
+    def map_relationship_types(cls) -> list[str]:
+        """
+        Relationship types with a range index on map_version, the ones the map delta reads look up by version.
+        Read from the database at most every NEO4J_SCHEMA_TTL seconds, like located_labels().
+        """
+        cached = cls._map_types
+        if cached is not None and (NEO4J_SCHEMA_TTL <= 0 or time.monotonic() - cached[0] < NEO4J_SCHEMA_TTL):
+            return cached[1]
+        if not cls._initialized or not cls._graph:
+            cls.initialize()
+        rows = cls._graph.query(
+            "SHOW RANGE INDEXES YIELD entityType, labelsOrTypes, properties "
+            "WHERE entityType = 'RELATIONSHIP' AND properties = ['map_version'] RETURN labelsOrTypes[0] AS rel_type"
+        )
+        types = sorted(row["rel_type"] for row in rows)
+        cls._map_indexed_types.update(types)
+        cls._map_types = (time.monotonic(), types)
+        return types
     
-    @classmethod  
+    @classmethod
+    @contextmanager
+    def deferred_vectorization(cls):
+        """
+        Defer the vectorization requested by create_node/create_relationship until the block exits.
+        
+        During an ingest every insert would otherwise rescan the whole label for pending embeddings.
+        Inside this context the requested (element, label/type, property) targets are only recorded
+        and each one is vectorized once, in batches, at the end.
+        
+        Usage:
+            with Neo4jService.deferred_vectorization():
+                for p in people:
+                    Neo4jService.create_node(label="Person", props=p, vectorize=True)
+        """
+        if cls._deferred_vectorization is not None:
+            # Nested contexts share the outermost queue
+            yield
+            return
+
+        cls._deferred_vectorization = {}
+        try:
+            yield
+        finally:
+            pending = cls._deferred_vectorization
+            cls._deferred_vectorization = None
+            for kwargs in pending.values():
+                cls.vectorize_property(**kwargs)
+
+    @classmethod
+    def _request_vectorization(cls, **kwargs) -> None:
+        """Run vectorize_property now, or queue it when vectorization is deferred."""
+        if cls._deferred_vectorization is not None:
+            key = tuple(sorted(kwargs.items()))
+            cls._deferred_vectorization[key] = kwargs
+            return
+        cls.vectorize_property(**kwargs)
+
+    @classmethod
+    @Metrics.timed("neo4j")
     def vectorize_property(
         cls,
         element: Literal["node", "relationship"]="node",
         node_label: Optional[str]="",
         rel_type: Optional[str]="",
-        source_property: str=""
+        source_property: str="",
+        batch_size: Optional[int]=None,
     ) -> None:
         """
         Generate and store vector embeddings for specified property of nodes or relationships.
@@ -148,15 +536,20 @@ class Neo4jService:
         non-empty values for the specified property and generates embeddings for them.
         Only processes items that don't already have embeddings.
         
+        Pending items are fetched in pages of `batch_size`, each page is embedded with a single
+        multi-input Ollama request and written back with a single UNWIND query.
+        
         Args:
             element: Type of graph element - either "node" or "relationship"
             node_label: Label of the node to process
             rel_type: Type of the relationship to process
             source_property: Name of the property to vectorize
+            batch_size: Items embedded and written per round trip (defaults to Settings.EMB_BATCH_SIZE)
             
         Note:
             Only one of 'node_label' or 'rel_type' must be provided.
         """
+        batch_size = batch_size or EMB_BATCH_SIZE
         
         # Input control
         try:
@@ -169,77 +562,47 @@ class Neo4jService:
 
             # Vectorize node property
             if element == "node":
-
                 cprint(f"\nGenerating embeddings for (n:{node_label}) on n.{source_property}", "green")
-                
-                # Query for nodes without embeddings
-                query = f"""
-                    MATCH (n:{node_label})
-                    WHERE 
-                        n.{source_property} IS NOT NULL AND 
-                        n.{source_property} <> '' AND 
-                        n.embedding IS NULL
-                    RETURN 
-                        n.uuid AS uuid,
-                        n.{source_property} AS txt
-                """
-                
-                records = list(cls._graph.query(query))
-                
-                # Set embedding property for each record
-                count = 0
-                for record in records:
-                    
-                    # Create embedding vector
-                    vec = helper_ollama.create_embedding(input_text=record["txt"])
-                    
-                    # Update node with embedding
-                    update_query = f"""
-                        MATCH (n:{node_label} {{uuid: $uuid}})
-                        SET n.embedding = $vec
-                    """
-                    cls._graph.query(update_query, {"uuid": record["uuid"], "vec": vec})
-                    
-                    # Debug output
-                    count+=1
-                    print(f" Updated {count} embeddings")
+                # Pages of nodes without embeddings, updated a whole page at a time
+                query = QueryRegistry.template("pending_node_embeddings", label=node_label, property=source_property)
+                update_query = QueryRegistry.template("set_node_embeddings", label=node_label)
 
             # Vectorize relationship property 
             elif element == "relationship":
-
                 cprint(f"\nGenerating embeddings for [r:{rel_type}] on r.{source_property}", "green")
+                # Pages of relationships without embeddings, updated a whole page at a time
+                query = QueryRegistry.template("pending_relationship_embeddings", rel_type=rel_type, property=source_property)
+                update_query = QueryRegistry.template("set_relationship_embeddings", rel_type=rel_type)
+
+            # Embed and write back page by page. Updated items leave the pending set,
+            # so the first page is always the next one to process.
+            count = 0
+            seen = set()
+            while True:
+                records = QueryRegistry.run(query, {"batch_size": batch_size})
+                # Stop when nothing is pending or a page could not be written back (the pending queries skip null uuids)
+                if not records or any(record["uuid"] in seen for record in records):
+                    break
+                seen.update(record["uuid"] for record in records)
                 
-                # Query for relationships without embeddings
-                query = f"""
-                    MATCH ()-[r:{rel_type}]-()
-                    WHERE 
-                        r.{source_property} IS NOT NULL AND 
-                        r.{source_property} <> '' AND 
-                        r.embedding IS NULL
-                    RETURN 
-                        r.uuid AS uuid, 
-                        r.{source_property} AS txt
-                """
+                # Create embedding vectors for the whole page in one request
+                vecs = helper_ollama.create_embeddings([record["txt"] for record in records])
+                rows = [{"uuid": record["uuid"], "vec": vec} for record, vec in zip(records, vecs)]
+                if not rows:
+                    break
                 
-                records = list(cls._graph.query(query))
+                QueryRegistry.run(update_query, {"rows": rows})
+                if element == "node":
+                    cls._note_schema("node", node_label, ["embedding"])
+                else:
+                    cls._note_schema("relationship", rel_type, ["embedding"])
                 
-                # Set embedding property for each record
-                count = 0
-                for record in records:
-                    
-                    # Create embedding vector
-                    vec = helper_ollama.create_embedding(input_text=record["txt"])
-                    
-                    # Update relationship with embedding
-                    update_query = f"""
-                        MATCH ()-[r:{rel_type} {{uuid: $uuid}}]-()
-                        SET r.embedding = $vec
-                    """
-                    cls._graph.query(update_query, {"uuid": record["uuid"], "vec": vec})
-                    
-                    # Debug output
-                    count+=1
-                    print(f" Updated {count} embeddings")
+                # Debug output
+                count += len(rows)
+                print(f" Updated {count} embeddings")
+                
+                if len(records) < batch_size:
+                    break
         
         except Exception as e:
             cprint(f"An error occurred vectorizing properties {e}.", "red")
@@ -253,7 +616,15 @@ class Neo4jService:
                             similarity: Optional[str] = EMB_SIMILARITY):
 
         try:
+            # Schema commands take no parameters: every interpolated value is checked first
+            QueryRegistry.check_identifier(index_name)
+            QueryRegistry.check_identifier(emb_property)
+            dim = int(dim)
+            if similarity not in VECTOR_SIMILARITIES:
+                raise ValueError(f"Invalid similarity {similarity!r}, expected one of {VECTOR_SIMILARITIES}")
+
             if relation_type:
+                QueryRegistry.check_identifier(relation_type)
                 # For relationship index
                 query = f"""
                 CREATE VECTOR INDEX {index_name} IF NOT EXISTS
@@ -261,6 +632,7 @@ class Neo4jService:
                 OPTIONS {{ indexConfig: {{ `vector.dimensions`: {dim}, `vector.similarity_function`: '{similarity}' }} }}
                 """
             elif node_label:
+                QueryRegistry.check_identifier(node_label)
                 # For node index
                 query = f"""
                 CREATE VECTOR INDEX {index_name} IF NOT EXISTS
@@ -271,6 +643,7 @@ class Neo4jService:
                 raise ValueError("Either node_label or relation_type must be provided")
             
             cls._graph.query(query)
+            cls.invalidate_schema()
             print(f"Successfully created index {index_name}.")
             
         except Exception as e:
@@ -328,34 +701,22 @@ class Neo4jService:
                     "longitude": computed_props.pop(lon_key),
                 }
 
-        # 3) Build Cypher
-        cypher_lines = [
-            f"CREATE (n:{label})",
-            "SET n += $props",
-            f"SET n.{uuid_key} = coalesce(n.{uuid_key}, randomUUID())",
-        ]
-        if location_param is not None:
-            cypher_lines.append("SET n.location = point($location)")
-        cypher_lines.append("RETURN n")
-
-        query = "\n".join(cypher_lines)
-
-        # 4) Params
-        params = {"props": computed_props}
-        if location_param is not None:
-            params["location"] = location_param
-
-        # 5) Execute
+        # 3) Execute (same template as create_nodes_bulk, with a single row)
         try:
-            cls._graph.query(query, params)
+            if location_param is not None:
+                cls._ensure_point_index(label)
+            tracked = cls._map_tracked(label)
+            query = QueryRegistry.template("create_nodes" if tracked else "create_nodes_untracked", label=label, uuid_key=uuid_key)
+            QueryRegistry.run(query, {"rows": [{"props": computed_props, "location": location_param}]})
+            cls._note_schema("node", label, cls._node_keys([computed_props], uuid_key, location_param is not None, tracked))
             print(f"Successfully created {label}: {computed_props}")
         except Exception as e:
             cprint(f"An error occurred creating node: {e}.", "red")
             return
 
-        # 6) Optional vectorization
+        # 4) Optional vectorization (queued when inside deferred_vectorization())
         if vectorize:
-            cls.vectorize_property(
+            cls._request_vectorization(
                 element="node",      # "node"
                 node_label= label,
                 source_property=source_property,
@@ -384,144 +745,502 @@ class Neo4jService:
         - Optional embedding/vectorization for relationship text, etc.
         """
 
-        query_lines = [
-            f"MATCH (a:{start_label} {{{start_key}: $start_value}})",
-            f"MATCH (b:{end_label} {{{end_key}: $end_value}})",
-            f"MERGE (a)-[r:{rel_type}]->(b)",
-            f"ON CREATE SET r.{uuid_key} = coalesce(r.{uuid_key}, randomUUID())",
-        ]
-        if rel_props:
-            query_lines.append("ON CREATE SET r += $rel_props")
-        
-        query_lines.append("RETURN a, r, b")
-
-        params = {
-            "start_value": start_value,
-            "end_value": end_value,
-        }
-        if rel_props:
-            params["rel_props"] = rel_props
-
         try:
-            cls._graph.query("\n".join(query_lines), params)
+            # Same template as create_relationships_bulk, with a single row
+            tracked = cls._map_tracked(start_label, end_label)
+            query = QueryRegistry.template(
+                "merge_relationships" if tracked else "merge_relationships_untracked",
+                start_label=start_label, start_key=start_key,
+                end_label=end_label, end_key=end_key,
+                rel_type=rel_type, uuid_key=uuid_key,
+            )
+            if tracked:
+                cls._ensure_map_version_index(rel_type)
+            QueryRegistry.run(query, {"rows": [{"start_value": start_value, "end_value": end_value, "rel_props": rel_props or {}}]})
+            cls._note_schema("relationship", rel_type, cls._relationship_keys([rel_props or {}], uuid_key, tracked))
             print(f"Successfully created {rel_type}: {{start: {start_value}, end: {end_value}, rel_props: {rel_props or {}}}}")
         except Exception as e:
             cprint(f"An error occurred creatin relationship: {e}.", "red")
             return
 
         if vectorize:
-            # Generic embedding over relationships
-            cls.vectorize_property(
+            # Generic embedding over relationships (queued when inside deferred_vectorization())
+            cls._request_vectorization(
+                element="relationship",
+                rel_type=rel_type,
+                source_property=source_property,
+            )
+
+    @staticmethod
+    def _node_keys(props_rows: list[dict], uuid_key: str, located: bool, tracked: bool) -> set:
+        """Property keys written by the create_nodes templates."""
+        keys = {uuid_key} | {key for props in props_rows for key in props}
+        keys |= {"map_version", "updated_at"} if tracked else set()
+        return keys | {LOCATION_PROPERTY} if located else keys
+
+    @staticmethod
+    def _relationship_keys(props_rows: list[dict], uuid_key: str, tracked: bool) -> set:
+        """Property keys written by the merge_relationships templates."""
+        keys = {uuid_key} | {key for props in props_rows for key in props}
+        return keys | {"map_version", "updated_at"} if tracked else keys
+
+    @classmethod
+    @Metrics.timed("neo4j")
+    def _write_in_chunks(cls, query: QueryTemplate, rows: list[dict], chunk_size: int, description: str) -> int:
+        """
+        Run an UNWIND $rows write template chunk by chunk, one write transaction per chunk.
+        Prints the throughput of every chunk and returns the number of rows written.
+        """
+        if not cls._initialized or not cls._graph:
+            cls.initialize()
+
+        total = 0
+        started = time.perf_counter()
+        for i in range(0, len(rows), chunk_size):
+            chunk = rows[i:i + chunk_size]
+            chunk_started = time.perf_counter()
+            QueryRegistry.run(query, {"rows": chunk})
+            elapsed = time.perf_counter() - chunk_started
+            total += len(chunk)
+            print(f" {description}: chunk {i // chunk_size + 1} wrote {len(chunk)} rows in {elapsed:.3f}s ({len(chunk) / max(elapsed, 1e-9):.0f} rows/s)")
+
+        elapsed = time.perf_counter() - started
+        cprint(f"Successfully wrote {total} {description} in {elapsed:.3f}s ({total / max(elapsed, 1e-9):.0f} rows/s)", "green")
+        return total
+
+    @classmethod
+    def create_nodes_bulk(
+        cls,
+        label: str,
+        rows: list[dict],
+        text_template: str | None = None,
+        text_key: str = "text",
+        location_keys: tuple[str, str] | None = None,
+        uuid_key: str = "uuid",
+        vectorize: bool = True,
+        source_property: str = "text",
+        chunk_size: int | None = None,
+    ) -> int:
+        """
+        Bulk version of create_node: creates one node per dict in `rows` with UNWIND, in chunks.
+        - rows: list of property dicts (same shape as create_node's props).
+        - text_template / text_key / location_keys / uuid_key: same meaning as in create_node.
+        - vectorize: vectorize `source_property` once after all chunks are written.
+        - chunk_size: rows per write transaction (defaults to Settings.NEO4J_BULK_CHUNK_SIZE).
+        Returns the number of nodes written.
+        """
+        # 1) Compute derived 'text' and location per row, like create_node does
+        prepared = []
+        for props in rows:
+            computed_props = dict(props)  # shallow copy
+            if text_template:
+                try:
+                    computed_props[text_key] = text_template.format(**props)
+                except KeyError as e:
+                    missing = e.args[0]
+                    raise KeyError(f"Missing key {missing!r} required by text_template") from e
+
+            location_param = None
+            if location_keys:
+                lat_key, lon_key = location_keys
+                if lat_key in computed_props and lon_key in computed_props:
+                    location_param = {
+                        "latitude": computed_props.pop(lat_key),
+                        "longitude": computed_props.pop(lon_key),
+                    }
+            prepared.append({"props": computed_props, "location": location_param})
+
+        # 2) Execute
+        try:
+            if location_keys:
+                cls._ensure_point_index(label)
+            tracked = cls._map_tracked(label)
+            query = QueryRegistry.template("create_nodes" if tracked else "create_nodes_untracked", label=label, uuid_key=uuid_key)
+            total = cls._write_in_chunks(query, prepared, chunk_size or NEO4J_BULK_CHUNK_SIZE, f"{label} nodes")
+            cls._note_schema(
+                "node", label,
+                cls._node_keys([row["props"] for row in prepared], uuid_key, any(row["location"] for row in prepared), tracked),
+            )
+        except Exception as e:
+            cprint(f"An error occurred creating nodes in bulk: {e}.", "red")
+            return 0
+
+        # 3) Optional vectorization (queued when inside deferred_vectorization())
+        if vectorize:
+            cls._request_vectorization(
+                element="node",
+                node_label=label,
+                source_property=source_property,
+            )
+        return total
+
+    @classmethod
+    def create_relationships_bulk(
+        cls,
+        start_label: str,
+        end_label: str,
+        rel_type: str,
+        rows: list[dict],
+        start_key: str = "name",
+        end_key: str = "name",
+        uuid_key: str = "uuid",
+        vectorize: bool = False,
+        source_property: str = "text",
+        chunk_size: int | None = None,
+    ) -> int:
+        """
+        Bulk version of create_relationship: idempotent MERGE of one relationship per dict in `rows`.
+        - rows: list of {"start_value": ..., "end_value": ..., "rel_props": {...}} dicts.
+        - vectorize: vectorize `source_property` once after all chunks are written.
+        - chunk_size: rows per write transaction (defaults to Settings.NEO4J_BULK_CHUNK_SIZE).
+        Returns the number of rows written.
+        """
+        prepared = [
+            {
+                "start_value": r.get("start_value"),
+                "end_value": r.get("end_value"),
+                "rel_props": r.get("rel_props") or {},
+            }
+            for r in rows
+        ]
+
+        try:
+            tracked = cls._map_tracked(start_label, end_label)
+            query = QueryRegistry.template(
+                "merge_relationships" if tracked else "merge_relationships_untracked",
+                start_label=start_label, start_key=start_key,
+                end_label=end_label, end_key=end_key,
+                rel_type=rel_type, uuid_key=uuid_key,
+            )
+            if tracked:
+                cls._ensure_map_version_index(rel_type)
+            total = cls._write_in_chunks(query, prepared, chunk_size or NEO4J_BULK_CHUNK_SIZE, f"{rel_type} relationships")
+            cls._note_schema("relationship", rel_type, cls._relationship_keys([row["rel_props"] for row in prepared], uuid_key, tracked))
+        except Exception as e:
+            cprint(f"An error occurred creating relationships in bulk: {e}.", "red")
+            return 0
+
+        if vectorize:
+            # Generic embedding over relationships (queued when inside deferred_vectorization())
+            cls._request_vectorization(
                 element="relationship",
                 rel_type=rel_type,
                 source_property=source_property,
             )
+        return total
+
+    @classmethod
+    def delete_nodes(cls, label: str, uuids: list[str]) -> int:
+        """
+        Delete the `label` nodes with these uuids (and their relationships).
+        Recorded as a map deletion (located labels only), so map snapshots and clients drop them.
+        Returns the number of nodes deleted.
+        """
+        try:
+            name = "delete_nodes" if cls._map_tracked(label) else "delete_nodes_untracked"
+            records = QueryRegistry.run(QueryRegistry.template(name, label=label), {"uuids": list(uuids)})
+        except Exception as e:
+            cprint(f"An error occurred deleting {label} nodes: {e}.", "red")
+            return 0
+        return records[0]["deleted"] if records else 0
+
+    @classmethod
+    def delete_relationships(cls, rel_type: str, uuids: list[str]) -> int:
+        """
+        Delete the `rel_type` relationships with these uuids.
+        Recorded as a map deletion (map relationship types only), so map snapshots and clients drop them.
+        Returns the number of relationships deleted.
+        """
+        try:
+            tracked = rel_type in cls.map_relationship_types()
+            name = "delete_relationships" if tracked else "delete_relationships_untracked"
+            records = QueryRegistry.run(QueryRegistry.template(name, rel_type=rel_type), {"uuids": list(uuids)})
+        except Exception as e:
+            cprint(f"An error occurred deleting {rel_type} relationships: {e}.", "red")
+            return 0
+        return records[0]["deleted"] if records else 0
         
         
-    @classmethod 
-    def get_map_features_sync(cls):
-                
+    @classmethod
+    def get_map_features_sync(cls, bbox: tuple[float, float, float, float] | None = None):
+        """
+        Map as (node_features, edge_features) GeoJSON lists.
+
+        - bbox: (south, west, north, east) viewport in degrees. Only the located nodes inside it (and their
+          relationships) are read, through the point indexes. Without it the full map is served from the
+          cached snapshot.
+        """
+        if bbox is None:
+            snapshot = cls.get_map_snapshot()
+            return list(snapshot["nodes"].values()), list(snapshot["edges"].values())
+
         if not cls._initialized or not cls._graph:
             cls.initialize()
-                
-        count_query = """
-        MATCH (n) RETURN count(n) as count
+        labels = cls.located_labels()
+        if not labels:
+            return [], []
+        with cls._driver.session(database=NEO4J_DATABASE) as session:
+            return session.execute_read(cls._read_map_features_in_bbox, labels, bbox)
+
+    @classmethod
+    def get_map_changes(cls, since_version: int | None = None, epoch: str | None = None) -> dict:
         """
-        node_count = cls._graph.query(count_query)[0]["count"]  # -> list[dict]
+        Incremental map feed.
 
-        print(f"{node_count} nodes")
-        
-        node_features = []
-        edge_features = []
-        if node_count != 0:
-            # --- Query your Neo4j (adapt to your driver) ---
-            # Nodes with coordinates
-            node_query = """
-            MATCH (n)
-            WHERE n.uuid IS NOT NULL
-                AND n.location IS NOT NULL 
-                AND n.location.latitude IS NOT NULL 
-                AND n.location.longitude IS NOT NULL
-            RETURN n.uuid AS id, n.name AS name, labels(n) AS labels,
-                n.location.latitude AS lat, n.location.longitude AS lon
+        Returns {"epoch", "version", "full", "nodes", "edges"}: the features changed after `since_version`,
+        or every feature (full=True) when no version is given, `epoch` is not the current one (the graph
+        was reset) or something was deleted after `since_version`: deletions can not be expressed as changes,
+        so clients replace their map on full answers. Clients pass back the returned version and epoch on
+        the next call and upsert the features by their "id".
+        Only deletions made through delete_nodes / delete_relationships (or a reset) are tracked.
+        """
+        return cls.map_changes(cls.get_map_snapshot(), since_version, epoch)
+
+    @staticmethod
+    def map_changes(snapshot: dict, since_version: int | None = None, epoch: str | None = None) -> dict:
+        """The get_map_changes() answer for a given snapshot."""
+        full = since_version is None or epoch != snapshot["epoch"] or since_version < snapshot["deleted_version"]
+        if full:
+            nodes, edges = list(snapshot["nodes"].values()), list(snapshot["edges"].values())
+        elif since_version >= snapshot["version"]:
+            nodes, edges = [], []
+        else:
+            nodes = [f for f in snapshot["nodes"].values() if f["properties"]["version"] > since_version]
+            edges = [f for f in snapshot["edges"].values() if f["properties"]["version"] > since_version]
+        return {
+            "epoch": snapshot["epoch"],
+            "version": snapshot["version"],
+            "full": full,
+            "nodes": nodes,
+            "edges": edges,
+        }
+
+    @classmethod
+    def get_map_snapshot(cls) -> dict:
+        """
+        Current map snapshot {"epoch", "version", "deleted_version", "nodes": {id: feature}, "edges": {id: feature}}
+        (read-only).
+
+        Brings the cached snapshot up to the current map version: unchanged -> one tiny query,
+        changed -> only the changed features are read and merged in, new epoch or deletions -> full rebuild.
+        """
+        if not cls._initialized or not cls._graph:
+            cls.initialize()
+        labels, rel_types = cls.located_labels(), cls.map_relationship_types()
+
+        with cls._map_lock:
+            snapshot = cls._map_snapshot
+            with cls._driver.session(database=NEO4J_DATABASE) as session:
+                epoch, version, deleted_version = session.execute_read(cls._read_map_version)
+                if snapshot is not None and snapshot["epoch"] == epoch and snapshot["version"] >= version:
+                    return snapshot
+
+                # Deleted features can not be found by version, so deletions rebuild the snapshot
+                rebuild = snapshot is None or snapshot["epoch"] != epoch or snapshot["deleted_version"] != deleted_version
+                since = -1 if rebuild else snapshot["version"]
+                epoch, version, deleted_version, nodes, edges = session.execute_read(
+                    cls._read_map_features, since, labels, rel_types
+                )
+
+            # Snapshots are never mutated once published, so readers can use them without the lock
+            snapshot = {
+                "epoch": epoch,
+                "version": version,
+                "deleted_version": deleted_version,
+                "nodes": ({} if rebuild else dict(snapshot["nodes"])) | {f["id"]: f for f in nodes},
+                "edges": ({} if rebuild else dict(snapshot["edges"])) | {f["id"]: f for f in edges},
+            }
+            cls._map_snapshot = snapshot
+            logger.info(f"Map snapshot v{version}: {len(nodes)} nodes and {len(edges)} edges {'loaded' if rebuild else 'changed'}")
+            return snapshot
+
+    @staticmethod
+    def _read_map_version(tx) -> tuple[Optional[str], int, int]:
+        """(epoch, version, version of the last deletion) of the map."""
+        record = tx.run(
+            f"MATCH (mv:{MAP_VERSION_LABEL} {{key: 'map'}}) "
+            "RETURN mv.epoch AS epoch, mv.value AS version, coalesce(mv.deleted_version, 0) AS deleted_version"
+        ).single()
+        return (record["epoch"], record["version"], record["deleted_version"]) if record else (None, 0, 0)
+
+    @classmethod
+    @Metrics.timed("neo4j", "get_map_features")
+    def _read_map_features(
+        cls, tx, since: int, labels: list[str], rel_types: list[str]
+    ) -> tuple[Optional[str], int, int, list[dict], list[dict]]:
+        """
+        Version and GeoJSON features stamped after `since` (everything when `since` < 0), read in one
+        transaction so they match.
+
+        Only the located labels are scanned, one labelled branch each: a rebuild reads their nodes, a
+        delta is one map_version range index lookup per located label and per map relationship type.
+        """
+        epoch, version, deleted_version = cls._read_map_version(tx)
+        if not labels:
+            return epoch, version, deleted_version, [], []
+        changed = "" if since < 0 else "AND n.map_version > $since"
+
+        # Nodes with coordinates
+        nodes = "\nUNION\n".join(
+            f"""
+            MATCH (n:{label})
+            WHERE n.uuid IS NOT NULL AND n.location IS NOT NULL {changed}
+            RETURN n
             """
+            for label in labels
+        )
+        node_query = f"""
+        CALL () {{ {nodes} }}
+        {MAP_NODE_COLUMNS}
+        """
+
+        # Relationships where both ends have coordinates, one row per relationship (directed). A rebuild
+        # reaches every one from its start node; a delta takes the ones of changed nodes (either end moved)
+        # and the relationships stamped after `since` (new ones between unchanged nodes).
+        if since < 0:
+            branches = [
+                f"""
+                MATCH (n:{label})-[r]->()
+                WHERE n.uuid IS NOT NULL AND n.location IS NOT NULL
+                RETURN r
+                """
+                for label in labels
+            ]
+        else:
+            branches = [
+                f"""
+                MATCH (n:{label})-[r]-()
+                WHERE n.uuid IS NOT NULL AND n.location IS NOT NULL AND n.map_version > $since
+                RETURN r
+                """
+                for label in labels
+            ] + [
+                f"""
+                MATCH ()-[r:{rel_type}]->()
+                WHERE r.map_version > $since
+                RETURN r
+                """
+                for rel_type in rel_types
+            ]
+        relationships = "\nUNION\n".join(branches)
+        rel_query = f"""
+        CALL () {{ {relationships} }}
+        WITH r, startNode(r) AS a, endNode(r) AS b
+        WHERE a.uuid IS NOT NULL AND b.uuid IS NOT NULL
+            AND a.location IS NOT NULL
+            AND b.location IS NOT NULL
+        {MAP_EDGE_COLUMNS}
+        """
+
+        node_features = [f for f in map(cls._node_feature, tx.run(node_query, since=since)) if f]
+        edge_features = [f for f in map(cls._edge_feature, tx.run(rel_query, since=since)) if f]
+        return epoch, version, deleted_version, node_features, edge_features
 
-            # Relationships where both ends have coordinates
-            rel_query = """
-            MATCH (a)-[r]-(b)
-            WHERE a.uuid IS NOT NULL AND b.uuid IS NOT NULL
-                AND a.location IS NOT NULL
-                AND b.location IS NOT NULL
-                AND a.location.latitude IS NOT NULL 
-                AND a.location.longitude IS NOT NULL
-                AND b.location.latitude IS NOT NULL 
-                AND b.location.longitude IS NOT NULL
-            RETURN a.uuid AS src_id, b.uuid AS dst_id, type(r) AS rel_type,
-                a.location.latitude AS a_lat, a.location.longitude AS a_lon,
-                b.location.latitude AS b_lat, b.location.longitude AS b_lon
+    @classmethod
+    @Metrics.timed("neo4j", "get_map_features_bbox")
+    def _read_map_features_in_bbox(cls, tx, labels: list[str], bbox: tuple[float, float, float, float]) -> tuple[list[dict], list[dict]]:
+        """GeoJSON features of the located nodes inside `bbox` and of their relationships (point index lookups)."""
+        south, west, north, east = bbox
+        params = {
+            "lower_left": {"latitude": south, "longitude": west},
+            "upper_right": {"latitude": north, "longitude": east},
+        }
+        # One index-backed branch per located label (an unlabelled MATCH can not use a point index)
+        in_bbox = "\nUNION\n".join(
+            f"""
+            MATCH (n:{label})
+            WHERE point.withinBBox(n.location, point($lower_left), point($upper_right)) AND n.uuid IS NOT NULL
+            RETURN n
             """
+            for label in labels
+        )
 
-            # Replace `graph.query` with your actual execution:
-            nodes = cls._graph.query(node_query)  # -> list[dict]
-            rels  = cls._graph.query(rel_query)   # -> list[dict]
-
-            # --- Build GeoJSON for nodes ---
-            node_index = {}  # id -> feature props (or entire feature)
-            for n in nodes:
-                nid = n.get("id")
-                lat, lon = n.get("lat"), n.get("lon")
-                if lat is None or lon is None:
-                    continue
-                props = {
-                    "id": nid,
-                    "name": n.get("name") or "Unknown",
-                    "labels": n.get("labels") or [],
-                }
-                feat = {
-                    "type": "Feature",
-                    "geometry": {"type": "Point", "coordinates": [lon, lat]},
-                    "properties": props,
-                }
-                node_features.append(feat)
-                node_index[nid] = props
+        node_query = f"""
+        CALL () {{ {in_bbox} }}
+        {MAP_NODE_COLUMNS}
+        """
 
-            # --- Build GeoJSON for edges (dedupe) ---
-            seen = set()
-            for e in rels:
-                src, dst = e.get("src_id"), e.get("dst_id")
-                # dedupe (undirected); include rel_type in key so parallel types show
-                key = (min(src, dst), max(src, dst), e.get("rel_type"))
-                if key in seen:
-                    continue
-                seen.add(key)
-
-                a_lat, a_lon = e.get("a_lat"), e.get("a_lon")
-                b_lat, b_lon = e.get("b_lat"), e.get("b_lon")
-                if None in (a_lat, a_lon, b_lat, b_lon):
-                    continue
-                
-                rel_props = {
-                        "src_id": src,
-                        "dst_id": dst,
-                        "rel_type": e.get("rel_type", "RELATED"),
-                        "src_name": node_index.get(src, {}).get("name", str(src)),
-                        "dst_name": node_index.get(dst, {}).get("name", str(dst)),
-                    }
-                
-                feat = {
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "LineString",
-                        "coordinates": [[a_lon, a_lat], [b_lon, b_lat]],
-                    },
-                    "properties": rel_props,
-                }
-                edge_features.append(feat)
-        
-        
+        # Relationships with at least one end in the viewport (the other end may be outside)
+        rel_query = f"""
+        CALL () {{ {in_bbox} }}
+        MATCH (n)-[r]-(m)
+        WHERE m.uuid IS NOT NULL AND m.location IS NOT NULL
+        WITH DISTINCT r
+        WITH r, startNode(r) AS a, endNode(r) AS b
+        {MAP_EDGE_COLUMNS}
+        """
+
+        node_features = [f for f in map(cls._node_feature, tx.run(node_query, **params)) if f]
+        edge_features = [f for f in map(cls._edge_feature, tx.run(rel_query, **params)) if f]
         return node_features, edge_features
-    
+
+    @staticmethod
+    def _node_feature(n) -> Optional[dict]:
+        """GeoJSON Point feature of a MAP_NODE_COLUMNS record."""
+        lat, lon = n["lat"], n["lon"]
+        if lat is None or lon is None:
+            return None
+        return {
+            "type": "Feature",
+            "id": n["id"],
+            "geometry": {"type": "Point", "coordinates": [lon, lat]},
+            "properties": {
+                "id": n["id"],
+                "name": n["name"] or "Unknown",
+                "labels": n["labels"] or [],
+                "version": n["version"],
+            },
+        }
+
+    @staticmethod
+    def _edge_feature(e) -> Optional[dict]:
+        """GeoJSON LineString feature of a MAP_EDGE_COLUMNS record."""
+        a_lat, a_lon = e["a_lat"], e["a_lon"]
+        b_lat, b_lon = e["b_lat"], e["b_lon"]
+        if None in (a_lat, a_lon, b_lat, b_lon):
+            return None
+        return {
+            "type": "Feature",
+            "id": e["id"],
+            "geometry": {
+                "type": "LineString",
+                "coordinates": [[a_lon, a_lat], [b_lon, b_lat]],
+            },
+            "properties": {
+                "id": e["id"],
+                "src_id": e["src_id"],
+                "dst_id": e["dst_id"],
+                "rel_type": e["rel_type"] or "RELATED",
+                "src_name": e["src_name"] or str(e["src_id"]),
+                "dst_name": e["dst_name"] or str(e["dst_id"]),
+                "version": e["version"],
+            },
+        }
+
     @classmethod
+    @Metrics.timed("neo4j")
+    def nearby(cls, label: str, lat: float, lon: float, radius_m: float, limit: int = 10) -> list[dict]:
+        """
+        Nodes of `label` within `radius_m` meters of (lat, lon), closest first, answered from the point index.
+        Returns [{"id", "name", "labels", "lat", "lon", "distance_m"}].
+        """
+        query = QueryRegistry.template("nearby", label=label)  # validates the label
+        if not cls._initialized or not cls._graph:
+            cls.initialize()
+        cls._ensure_point_index(label)
+        return QueryRegistry.run(query, {"lat": lat, "lon": lon, "radius_m": radius_m, "limit": limit})
+
+    @classmethod
+    def locate(cls, label: str, name: str) -> Optional[dict]:
+        """The located `label` node named `name` (case insensitive) as {"id", "name", "lat", "lon"}, or None."""
+        query = QueryRegistry.template("locate", label=label)  # validates the label
+        if not cls._initialized or not cls._graph:
+            cls.initialize()
+        records = QueryRegistry.run(query, {"name": name})
+        return records[0] if records else None
+
+    @classmethod
+    @Metrics.timed("neo4j")
     def neo4j_KGRAG_search(
         cls,
         query: str,
@@ -718,6 +1437,11 @@ class Neo4jService:
         return output
 
 
+Metrics.register_collector("cypher_cache", Neo4jService.get_cypher_cache_stats)
+Metrics.register_collector("cypher_chain", Neo4jService.get_chain_cache_stats)
+Metrics.register_collector("neo4j_templates", QueryRegistry.get_flat_stats)
+
+
 async def main() -> None:
 
     await Neo4jService.initialize()
@@ -730,4 +1454,5 @@ async def main() -> None:
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
+
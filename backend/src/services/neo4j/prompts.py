@@ -54,6 +54,13 @@ MATCH (p:Person {{name:"Iria"}}), (other:Person)
 WITH p, other, point.distance(p.location, other.location) AS distance_m
 RETURN p.name, other.name, round(distance_m/1000, 2) + " km" AS distance_km
 
+# Show who is within 2 km of Iria (filter on the distance so the location index is used)
+MATCH (p:Person {{name:"Iria"}})
+MATCH (other:Person)
+WHERE other <> p AND point.distance(other.location, p.location) <= 2000
+RETURN other.name, round(point.distance(other.location, p.location)) AS distance_m
+ORDER BY distance_m
+
 The question is:
 {question}"""
 
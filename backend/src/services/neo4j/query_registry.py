@@ -0,0 +1,251 @@
+"""
+Registry of the Cypher templates used by Neo4jService.
+
+Labels, relationship types and property keys can not be query parameters, so each template is
+rendered once per combination of identifiers (validated first) and the rendered text is reused,
+which keeps one query text per (template, label, property) and lets Neo4j reuse its cached plan.
+Every value goes in as a parameter.
+
+Queries run in managed transactions routed by the template's mode (execute_read / execute_write),
+each in a short-lived session over the driver's connection pool. Every execution is timed per
+template and exported through Metrics.
+"""
+
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Literal, Optional
+
+from neo4j import Driver
+
+from helpers import Metrics
+
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# Map change tracking: every write touching located entities bumps one counter node (once per
+# transaction) and stamps what it writes with the new value, so map clients can ask for the
+# features changed since the last version they saw. The counter node is locked until commit,
+# so versions become visible in order. The epoch changes when the graph is reset.
+MAP_VERSION_LABEL = "MapVersion"
+MAP_VERSION_BUMP = f"""
+MERGE (mv:{MAP_VERSION_LABEL} {{key: 'map'}})
+ON CREATE SET mv.epoch = randomUUID()
+SET mv.value = coalesce(mv.value, 0) + 1
+WITH mv.value AS map_version
+"""
+MAP_VERSION_STAMP = "{var}.map_version = map_version, {var}.updated_at = datetime()"
+# Deletions leave nothing to stamp: they bump the counter and record the new value as the last
+# deletion, so cached snapshots are rebuilt and clients that saw an older version get the full map.
+MAP_VERSION_DELETE = f"""
+MERGE (mv:{MAP_VERSION_LABEL} {{key: 'map'}})
+ON CREATE SET mv.epoch = randomUUID()
+SET mv.value = coalesce(mv.value, 0) + 1
+SET mv.deleted_version = mv.value
+WITH mv.value AS map_version
+"""
+
+
+def _literal(cypher: str) -> str:
+    """Escape a finished Cypher fragment for use in a template."""
+    return cypher.replace("{", "{{").replace("}", "}}")
+
+
+@dataclass(frozen=True)
+class QueryTemplate:
+    name: str
+    mode: Literal["read", "write"]
+    text: str
+
+
+# name -> (mode, text). {placeholders} are identifiers, $parameters are values.
+TEMPLATES: dict[str, tuple[str, str]] = {
+    "pending_node_embeddings": ("read", """
+        MATCH (n:{label})
+        // Items without uuid can not be written back, they would stall the paging
+        WHERE n.uuid IS NOT NULL AND n.{property} IS NOT NULL AND n.{property} <> '' AND n.embedding IS NULL
+        RETURN n.uuid AS uuid, n.{property} AS txt
+        LIMIT $batch_size
+    """),
+    "set_node_embeddings": ("write", """
+        UNWIND $rows AS row
+        MATCH (n:{label} {{uuid: row.uuid}})
+        SET n.embedding = row.vec
+    """),
+    "pending_relationship_embeddings": ("read", """
+        MATCH ()-[r:{rel_type}]->()
+        WHERE r.uuid IS NOT NULL AND r.{property} IS NOT NULL AND r.{property} <> '' AND r.embedding IS NULL
+        RETURN r.uuid AS uuid, r.{property} AS txt
+        LIMIT $batch_size
+    """),
+    "set_relationship_embeddings": ("write", """
+        UNWIND $rows AS row
+        MATCH ()-[r:{rel_type} {{uuid: row.uuid}}]->()
+        SET r.embedding = row.vec
+    """),
+    "create_nodes": ("write", _literal(MAP_VERSION_BUMP) + """
+        UNWIND $rows AS row
+        CREATE (n:{label})
+        SET n += row.props
+        SET n.{uuid_key} = coalesce(n.{uuid_key}, randomUUID())
+        SET """ + _literal(MAP_VERSION_STAMP.format(var="n")) + """
+        FOREACH (_ IN CASE WHEN row.location IS NULL THEN [] ELSE [1] END | SET n.location = point(row.location))
+    """),
+    "merge_relationships": ("write", _literal(MAP_VERSION_BUMP) + """
+        UNWIND $rows AS row
+        MATCH (a:{start_label} {{{start_key}: row.start_value}})
+        MATCH (b:{end_label} {{{end_key}: row.end_value}})
+        MERGE (a)-[r:{rel_type}]->(b)
+        ON CREATE SET r.{uuid_key} = coalesce(r.{uuid_key}, randomUUID()), """ + _literal(MAP_VERSION_STAMP.format(var="r")) + """
+        ON CREATE SET r += row.rel_props
+    """),
+    # Variants for writes that can not show up on the map (labels without a point index, relationships
+    # not between two located labels): they skip the counter node, which would otherwise lock every
+    # write transaction of the graph against each other.
+    "create_nodes_untracked": ("write", """
+        UNWIND $rows AS row
+        CREATE (n:{label})
+        SET n += row.props
+        SET n.{uuid_key} = coalesce(n.{uuid_key}, randomUUID())
+    """),
+    "merge_relationships_untracked": ("write", """
+        UNWIND $rows AS row
+        MATCH (a:{start_label} {{{start_key}: row.start_value}})
+        MATCH (b:{end_label} {{{end_key}: row.end_value}})
+        MERGE (a)-[r:{rel_type}]->(b)
+        ON CREATE SET r.{uuid_key} = coalesce(r.{uuid_key}, randomUUID())
+        ON CREATE SET r += row.rel_props
+    """),
+    "set_locations": ("write", _literal(MAP_VERSION_BUMP) + """
+        UNWIND $rows AS row
+        MATCH (n:{label} {{uuid: row.uuid}})
+        SET n.location = point({{latitude: row.lat, longitude: row.lon}}), """ + _literal(MAP_VERSION_STAMP.format(var="n")) + """
+    """),
+    "delete_nodes": ("write", _literal(MAP_VERSION_DELETE) + """
+        MATCH (n:{label})
+        WHERE n.uuid IN $uuids
+        DETACH DELETE n
+        RETURN count(*) AS deleted
+    """),
+    "delete_relationships": ("write", _literal(MAP_VERSION_DELETE) + """
+        MATCH ()-[r:{rel_type}]->()
+        WHERE r.uuid IN $uuids
+        DELETE r
+        RETURN count(*) AS deleted
+    """),
+    "delete_nodes_untracked": ("write", """
+        MATCH (n:{label})
+        WHERE n.uuid IN $uuids
+        DETACH DELETE n
+        RETURN count(*) AS deleted
+    """),
+    "delete_relationships_untracked": ("write", """
+        MATCH ()-[r:{rel_type}]->()
+        WHERE r.uuid IN $uuids
+        DELETE r
+        RETURN count(*) AS deleted
+    """),
+    "locate": ("read", """
+        MATCH (n:{label})
+        WHERE toLower(n.name) = toLower($name) AND n.location IS NOT NULL
+        RETURN n.uuid AS id, n.name AS name, n.location.latitude AS lat, n.location.longitude AS lon
+        LIMIT 1
+    """),
+    "nearby": ("read", """
+        MATCH (n:{label})
+        WHERE point.distance(n.location, point({{latitude: $lat, longitude: $lon}})) <= $radius_m
+        WITH n, point.distance(n.location, point({{latitude: $lat, longitude: $lon}})) AS distance_m
+        RETURN n.uuid AS id, n.name AS name, labels(n) AS labels,
+            n.location.latitude AS lat, n.location.longitude AS lon, distance_m
+        ORDER BY distance_m
+        LIMIT $limit
+    """),
+}
+
+
+class QueryRegistry:
+    """Rendered templates and per-template timings."""
+
+    _driver: Optional[Driver] = None
+    _database: Optional[str] = None
+    _rendered: dict[tuple, QueryTemplate] = {}
+    _lock = threading.Lock()
+    _stats: dict[str, dict[str, float]] = {}
+
+    @classmethod
+    def bind(cls, driver: Driver, database: Optional[str] = None) -> None:
+        """Use this driver (owned by Neo4jService) for every query."""
+        cls._driver = driver
+        cls._database = database
+
+    # --------------------------
+    # TEMPLATES
+    # --------------------------
+    @staticmethod
+    def check_identifier(value: str) -> str:
+        """Return `value` if it can be used as a label, relationship type or property key."""
+        if not isinstance(value, str) or not IDENTIFIER.match(value):
+            raise ValueError(f"Invalid Cypher identifier: {value!r}")
+        return value
+
+    @classmethod
+    def template(cls, name: str, **identifiers: str) -> QueryTemplate:
+        """The template rendered for these identifiers (rendered and validated on first use only)."""
+        key = (name, *sorted(identifiers.items()))
+        template = cls._rendered.get(key)
+        if template is None:
+            mode, text = TEMPLATES[name]
+            for value in identifiers.values():
+                cls.check_identifier(value)
+            template = QueryTemplate(name=name, mode=mode, text=text.format(**identifiers))
+            with cls._lock:
+                cls._rendered[key] = template
+        return template
+
+    # --------------------------
+    # EXECUTION
+    # --------------------------
+    @classmethod
+    def run(cls, template: QueryTemplate, params: Optional[dict[str, Any]] = None) -> list[dict]:
+        """Run a template in a read or write transaction, per its mode. Returns the records as dicts."""
+        def _work(tx):
+            return tx.run(template.text, params or {}).data()
+
+        if cls._driver is None:
+            raise RuntimeError("QueryRegistry is not bound to a driver, initialize Neo4jService first")
+        started = time.perf_counter()
+        failed = False
+        try:
+            # Sessions are cheap and not thread safe: one per call, the connection goes back to the pool on exit
+            with cls._driver.session(database=cls._database) as session:
+                execute = session.execute_read if template.mode == "read" else session.execute_write
+                return execute(_work)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            cls.record(template.name, time.perf_counter() - started, failed)
+
+    @classmethod
+    def record(cls, name: str, seconds: float, failed: bool = False) -> None:
+        with cls._lock:
+            stats = cls._stats.setdefault(name, {"count": 0, "errors": 0, "total_s": 0.0, "max_s": 0.0})
+            stats["count"] += 1
+            stats["errors"] += int(failed)
+            stats["total_s"] += seconds
+            stats["max_s"] = max(stats["max_s"], seconds)
+        Metrics.observe("neo4j_template", name, seconds)
+
+    @classmethod
+    def get_stats(cls) -> dict[str, dict[str, float]]:
+        """Per-template executions, errors, total and max seconds, and mean milliseconds."""
+        with cls._lock:
+            return {
+                name: {**stats, "mean_ms": round(stats["total_s"] / stats["count"] * 1000, 2) if stats["count"] else 0.0}
+                for name, stats in cls._stats.items()
+            }
+
+    @classmethod
+    def get_flat_stats(cls) -> dict[str, float]:
+        """get_stats() as flat `<template>_<stat>` values, for the metrics collector."""
+        return {f"{name}_{key}": value for name, stats in cls.get_stats().items() for key, value in stats.items()}
@@ -0,0 +1,17 @@
+import importlib
+import sys
+import types
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+try:
+    importlib.import_module("services.neo4j")
+except ImportError:
+    # Without the Neo4j driver stack the package __init__ cannot run. Register the package bare so
+    # its dependency-free modules (cypher_cache, query_registry) can still be imported and tested.
+    for name in [n for n in sys.modules if n == "services.neo4j" or n.startswith("services.neo4j.")]:
+        del sys.modules[name]
+    package = types.ModuleType("services.neo4j")
+    package.__path__ = [str(SRC / "services" / "neo4j")]
+    sys.modules["services.neo4j"] = package
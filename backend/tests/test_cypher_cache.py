@@ -0,0 +1,55 @@
+from services.neo4j.cypher_cache import CypherCache
+
+SCHEMA = "schema-v1"
+EMBEDDING = [0.1, 0.2, 0.3]
+
+
+def make_cache(question: str, cypher: str) -> CypherCache:
+    cache = CypherCache(max_size=8, ttl=0, threshold=0.9)
+    cache.store(question, EMBEDDING, cypher, SCHEMA)
+    return cache
+
+
+def test_numeric_literal_must_appear_in_question():
+    cache = make_cache("people older than 30", "MATCH (p:Person) WHERE p.age > 30 RETURN p.name")
+
+    assert cache.lookup("people older than 40", EMBEDDING, SCHEMA) is None
+    assert cache.lookup("people older than 300", EMBEDDING, SCHEMA) is None
+    assert cache.lookup("which people are older than 30", EMBEDDING, SCHEMA) is not None
+
+
+def test_string_literal_must_appear_in_question():
+    cache = make_cache("who does Alice know?", "MATCH (:Person {name: 'Alice'})-[:KNOWS]->(f) RETURN f.name")
+
+    assert cache.lookup("who does Bob know?", EMBEDDING, SCHEMA) is None
+    assert cache.lookup("who does alice know", EMBEDDING, SCHEMA) is not None
+
+
+def test_bare_identifier_literal_must_appear_in_question():
+    cache = make_cache("people living in Madrid", "MATCH (p:Person) WHERE p.city = Madrid RETURN p.name")
+
+    assert cache.lookup("people living in Paris", EMBEDDING, SCHEMA) is None
+    assert cache.lookup("who lives in madrid", EMBEDDING, SCHEMA) is not None
+
+
+def test_path_lengths_and_property_lookups_are_not_literals():
+    cache = make_cache(
+        "friends of friends of Alice",
+        "MATCH (:Person {name: 'Alice'})-[:KNOWS*1..2]->(f:Person) RETURN f {.name, uuid: f.uuid}",
+    )
+
+    assert cache.lookup("who are the friends of friends of Alice", EMBEDDING, SCHEMA) is not None
+
+
+def test_relationship_direction_must_match():
+    cache = make_cache("who does Alice know?", "MATCH (:Person {name: 'Alice'})-[:KNOWS]->(f:Person) RETURN f.name")
+
+    assert cache.lookup("who knows Alice?", EMBEDDING, SCHEMA) is None
+    assert cache.lookup("who does alice know", EMBEDDING, SCHEMA) is not None
+
+
+def test_labels_mentioned_in_question_must_match():
+    cache = make_cache("people in Madrid", "MATCH (p:Person) WHERE p.city = 'Madrid' RETURN p.name")
+
+    assert cache.lookup("companies in Madrid", EMBEDDING, SCHEMA) is None
+    assert cache.lookup("which people are in madrid", EMBEDDING, SCHEMA) is not None
@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("langchain_neo4j")
+pytest.importorskip("langgraph.types")
+
+from services.neo4j import neo4j_service
+from services.neo4j.cypher_cache import CypherCache
+from services.neo4j.neo4j_service import Neo4jService
+
+CYPHER = "MATCH (:Person {name: 'Alice'})-[:KNOWS]->(f:Person) RETURN f.name AS name"
+
+
+class FakeChain:
+    """Stands in for GraphCypherQAChain(return_direct=True, return_intermediate_steps=True)."""
+
+    top_k = 10
+
+    def __init__(self):
+        self.questions = []
+
+    async def ainvoke(self, question):
+        self.questions.append(question)
+        return {"query": question, "result": [{"name": "Bob"}], "intermediate_steps": [{"query": CYPHER}]}
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    chain = FakeChain()
+    executed = []
+
+    async def fake_embedding(input_text):
+        return [0.1, 0.2, 0.3]
+
+    async def fake_aquery(cls, query, params=None):
+        executed.append(query)
+        return [{"name": "Bob"}]
+
+    monkeypatch.setattr(Neo4jService, "get_cypher_chain", classmethod(lambda cls: chain))
+    monkeypatch.setattr(Neo4jService, "_chain_is_fresh", classmethod(lambda cls: True))
+    monkeypatch.setattr(Neo4jService, "aquery", classmethod(fake_aquery))
+    monkeypatch.setattr(Neo4jService, "_cypher_cache", CypherCache(max_size=8, ttl=0, threshold=0.9))
+    monkeypatch.setattr(neo4j_service, "CYPHER_CACHE_ENABLED", True)
+    monkeypatch.setattr(neo4j_service.helper_ollama, "acreate_embedding", fake_embedding)
+    chain.executed = executed
+    return chain
+
+
+def test_async_query_generates_then_reuses_the_cached_cypher(chain):
+    first = asyncio.run(Neo4jService.aquery_social_data("who does Alice know?"))
+    second = asyncio.run(Neo4jService.aquery_social_data("who does alice know"))
+
+    assert first == {"query": "who does Alice know?", "result": [{"name": "Bob"}]}
+    assert second == {"query": "who does alice know", "result": [{"name": "Bob"}]}
+    assert chain.questions == ["who does Alice know?"]  # the second question skipped generation
+    assert chain.executed == [CYPHER]
+
+
+def test_get_social_data_tool_runs_the_async_path(chain):
+    from langgraph.types import Command
+
+    from agent.tools.get_social_data import get_social_data
+
+    call = {"type": "tool_call", "name": "get_social_data", "args": {"question": "who does Alice know?"}, "id": "call-1"}
+    command = asyncio.run(get_social_data.ainvoke(call))
+
+    assert isinstance(command, Command)
+    message = command.update["messages"][0]
+    assert message.tool_call_id == "call-1"
+    assert json.loads(message.content)["result"] == [{"name": "Bob"}]
+    assert chain.questions == ["who does Alice know?"]